@@ -0,0 +1,260 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Iterable, List, Union
+
+import certificate_element
+import certificate_parsing
+import certificate_verification
+import common_utils
+import direction
+import verification_messages
+from certificate_element import SteelPlate, Thickness
+from certificate_parsing import IncrementalCertificateParser
+from certificate_table_archive import ArchivedCertificate
+from certificate_verification import ChemicalCompositionLimitsForHighStrengthSteel, HullStructureSteelPlateLimits, \
+    MechanicalLimits, MissingChemicalElements
+from common_utils import CommonUtils
+
+_PASSED = 'passed'
+_FAILED = 'failed'
+_ERROR = 'error'
+# every module the verdicts of a certificate depend on, from parsing the archived tables to the limits
+_VERDICT_MODULES = (certificate_parsing, certificate_element, common_utils, direction, certificate_verification,
+                    verification_messages)
+
+
+class CertificateJob:
+
+    def __init__(
+        self,
+        certificate_key: str,
+        steel_plant: str,
+        specification: str,
+        delivery_condition: str,
+        thickness: Union[float, int],
+        load_plates: Callable[[], List[SteelPlate]]
+    ):
+        # The plates are only loaded (e.g. parsed from the archive) when the certificate has to be verified.
+        self.certificate_key = certificate_key
+        self.steel_plant = steel_plant
+        self.specification = specification
+        self.delivery_condition = delivery_condition
+        self.thickness = thickness
+        self.load_plates = load_plates
+
+    def __repr__(self):
+        return f"CertificateJob: {self.certificate_key} [{self.steel_plant}, {self.specification}]"
+
+    @staticmethod
+    def from_archive(archived_certificate: ArchivedCertificate, specification: str, delivery_condition: str,
+                     thickness: Union[float, int]) -> 'CertificateJob':
+        return CertificateJob(
+            certificate_key=archived_certificate.pdf_path,
+            steel_plant=archived_certificate.steel_plant,
+            specification=specification,
+            delivery_condition=delivery_condition,
+            thickness=thickness,
+            load_plates=lambda: list(IncrementalCertificateParser().parse(archived_certificate.tables()))
+        )
+
+
+class BatchProgress:
+
+    def __init__(self, total: Union[int, None]):
+        self.total = total
+        self.start_time = time.perf_counter()
+        self.skipped_count = 0
+        self.verified_count = 0
+        self.passed_count = 0
+        self.failed_count = 0
+        self.error_count = 0
+
+    def __repr__(self):
+        done = self.skipped_count + self.verified_count + self.error_count
+        total = '?' if self.total is None else self.total
+        eta = self.eta()
+        return (
+            f"{done}/{total} certificates [verified: {self.verified_count}, passed: {self.passed_count}, "
+            f"failed: {self.failed_count}, errors: {self.error_count}, skipped: {self.skipped_count}] "
+            f"{self.throughput():.2f} certificates/s, ETA: {'?' if eta is None else f'{eta:.0f} s'}"
+        )
+
+    def throughput(self) -> float:
+        # skipped certificates cost nearly nothing, they are left out of the throughput
+        elapsed = time.perf_counter() - self.start_time
+        return (self.verified_count + self.error_count) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Union[float, None]:
+        throughput = self.throughput()
+        if self.total is None or throughput == 0:
+            return None
+        remaining = self.total - self.skipped_count - self.verified_count - self.error_count
+        return remaining / throughput
+
+
+class BatchVerificationRun:
+
+    def __init__(
+        self,
+        checkpoint_path: str,
+        limits_version: str = None,
+        commit_interval: int = 50,
+        report_interval: float = 5.0,
+        progress_callback: Callable[[BatchProgress], None] = None,
+        quiet: bool = True
+    ):
+        # Checkpoints are only valid for the limit tables they were verified with, by default the hash of the modules
+        # deciding the verdicts.
+        self.limits_version = BatchVerificationRun.limits_fingerprint() if limits_version is None else limits_version
+        self.commit_interval = commit_interval
+        self.report_interval = report_interval
+        self.progress_callback = progress_callback
+        self.quiet = quiet
+        self.connection = sqlite3.connect(checkpoint_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'certificate_key TEXT PRIMARY KEY, limits_version TEXT NOT NULL, status TEXT NOT NULL, '
+            'plate_count INTEGER, error TEXT, finished_at REAL NOT NULL)'
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def limits_fingerprint() -> str:
+        digest = hashlib.sha256()
+        for module in _VERDICT_MODULES:
+            with open(module.__file__, 'rb') as file:
+                digest.update(file.read())
+        return digest.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def is_finished(self, certificate_key: str) -> bool:
+        # certificates that raised an error are verified again, so are those checked against other limit tables
+        row = self.connection.execute(
+            'SELECT status FROM checkpoints WHERE certificate_key = ? AND limits_version = ?',
+            (certificate_key, self.limits_version)
+        ).fetchone()
+        return row is not None and row[0] != _ERROR
+
+    def checkpoint(self, certificate_key: str, status: str, plate_count: Union[int, None], error: str = None):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)',
+            (certificate_key, self.limits_version, status, plate_count, error, time.time())
+        )
+
+    @staticmethod
+    def verify_certificate(job: CertificateJob, steel_plates: List[SteelPlate]) -> bool:
+        # The verify entry points used for a single certificate, chemical composition first (the mandatory elements,
+        # then the fine grain elements of the steel plant), then mechanical.
+        chemical_composition_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        missing_elements = MissingChemicalElements(job.certificate_key)
+        mandatory_results = [
+            chemical_composition_limits.verify(
+                specification=job.specification,
+                thickness=job.thickness,
+                chemical_compositions=steel_plate.chemical_compositions,
+                pdf_path=job.certificate_key,
+                serial_number=steel_plate.serial_number,
+                missing_elements=missing_elements
+            )
+            for steel_plate in steel_plates
+        ]
+        steel_plant_limits = HullStructureSteelPlateLimits.get_singleton().get_limits_by_steel_plant(job.steel_plant)
+        thickness = Thickness(None, None, None, job.thickness)
+        chemical_results = steel_plant_limits.verify_plates(
+            specification=job.specification,
+            delivery_condition=job.delivery_condition,
+            thickness=thickness,
+            steel_plates=steel_plates,
+            pdf_path=job.certificate_key,
+            missing_elements=missing_elements
+        )
+        mechanical_limits = MechanicalLimits.get_singleton()
+        for steel_plate in steel_plates:
+            if steel_plate.position_direction_impact is None:
+                raise ValueError(f"The impact test direction of plate {steel_plate.serial_number} is unknown.")
+        directions = CommonUtils.translate_to_vl_directions(
+            [steel_plate.position_direction_impact.value for steel_plate in steel_plates])
+        mechanical_results = [
+            mechanical_limits.verify(
+                grade=job.specification,
+                thickness=job.thickness,
+                direction=plate_direction,
+                yield_strength=steel_plate.yield_strength,
+                tensile_strength=steel_plate.tensile_strength,
+                elongation=steel_plate.elongation,
+                temperature=steel_plate.temperature,
+                impact_energy_list=steel_plate.impact_energy_list,
+                pdf_path=job.certificate_key,
+                serial_number=steel_plate.serial_number
+            )
+            for steel_plate, plate_direction in zip(steel_plates, directions)
+        ]
+        return all(mandatory_results) and all(chemical_results) and all(mechanical_results)
+
+    def run(
+        self,
+        jobs: Iterable[CertificateJob],
+        verify: Callable[[CertificateJob, List[SteelPlate]], bool] = None
+    ) -> BatchProgress:
+        verify = BatchVerificationRun.verify_certificate if verify is None else verify
+        progress = BatchProgress(len(jobs) if hasattr(jobs, '__len__') else None)
+        uncommitted_count = 0
+        last_report_time = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            for job in jobs:
+                if self.is_finished(job.certificate_key):
+                    progress.skipped_count += 1
+                    continue
+                steel_plates = None
+                try:
+                    steel_plates = job.load_plates()
+                    if self.quiet:
+                        with redirect_stdout(devnull):
+                            passed = verify(job, steel_plates)
+                    else:
+                        passed = verify(job, steel_plates)
+                except Exception as error:
+                    # one broken certificate must not stop the night run, it is retried on the next run
+                    self.checkpoint(job.certificate_key, _ERROR, None if steel_plates is None else len(steel_plates),
+                                    f"{type(error).__name__}: {error}")
+                    progress.error_count += 1
+                else:
+                    self.checkpoint(job.certificate_key, _PASSED if passed else _FAILED, len(steel_plates))
+                    progress.verified_count += 1
+                    if passed:
+                        progress.passed_count += 1
+                    else:
+                        progress.failed_count += 1
+                uncommitted_count += 1
+                if uncommitted_count >= self.commit_interval:
+                    self.connection.commit()
+                    uncommitted_count = 0
+                if self.progress_callback is not None and \
+                        time.perf_counter() - last_report_time >= self.report_interval:
+                    self.progress_callback(progress)
+                    last_report_time = time.perf_counter()
+        self.connection.commit()
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+        return progress
+
+    def summary(self):
+        # status -> certificate count for the current limit tables
+        return dict(self.connection.execute(
+            'SELECT status, COUNT(*) FROM checkpoints WHERE limits_version = ? GROUP BY status', (self.limits_version,)
+        ).fetchall())
@@ -0,0 +1,239 @@
+from typing import Dict, List, Tuple, Union
+
+from certificate_element import SerialNumber, Specification, Thickness, DeliveryCondition
+from certificate_verification import ImpactEnergyLimits, MechanicalLimits
+from plate_batch import PlateBatch
+
+_SERIAL_NUMBER = 'serial_number'
+_THICKNESS = 'thickness'
+_DELIVERY_CONDITION = 'delivery_condition'
+_IMPACT_TEST_COUNT = 'impact_test_count'
+
+
+class ConsistencyIssue:
+
+    def __init__(self, check: str, message: str, serial_numbers: List[int], rows: List[Tuple[int, int, int]] = None):
+        self.check = check
+        self.message = message
+        # the plates concerned, in certificate order, and their (table_index, row_index, line_index), empty for
+        # serial numbers without a plate row
+        self.serial_numbers = serial_numbers
+        self.rows = [] if rows is None else rows
+
+    def __repr__(self):
+        return f"ConsistencyIssue: {self.check}: {self.message}"
+
+
+class ConsistencyReport:
+
+    def __init__(self, plate_count: int, issues: List[ConsistencyIssue]):
+        self.plate_count = plate_count
+        self.issues = issues
+
+    def __repr__(self):
+        return f"ConsistencyReport: plates: {self.plate_count}, issues: {len(self.issues)}"
+
+    def is_consistent(self) -> bool:
+        return not self.issues
+
+    def by_check(self) -> Dict[str, List[ConsistencyIssue]]:
+        checks: Dict[str, List[ConsistencyIssue]] = dict()
+        for issue in self.issues:
+            checks.setdefault(issue.check, []).append(issue)
+        return checks
+
+
+class CertificateConsistencyChecker:
+
+    def __init__(self, test_count: int = 3):
+        # number of impact tests every plate is expected to have, where its grade and thickness require them
+        self.test_count = test_count
+
+    def required_impact_test_count(self, grade: Union[str, None],
+                                   thickness: Union[int, float, None]) -> Union[int, None]:
+        # None when it can not be told, 0 when the grade has no impact energy limit at the thickness
+        if grade is None or thickness is None:
+            return None
+        mechanical_limit = MechanicalLimits.get_singleton().grade_mechanical_limits_map.get(grade)
+        if mechanical_limit is None or mechanical_limit.impact_energy_limits is None:
+            return 0
+        try:
+            thickness_range = ImpactEnergyLimits.get_thickness_range(thickness)
+        except ValueError:
+            return None
+        direction_limits = mechanical_limit.impact_energy_limits.thickness_direction_map[thickness_range]
+        return self.test_count if any(limit is not None for limit in direction_limits.values()) else 0
+
+    def check(
+        self,
+        batch: PlateBatch,
+        serial_number: SerialNumber = None,
+        thickness: Thickness = None,
+        delivery_condition: DeliveryCondition = None,
+        plate_thicknesses: List[Union[int, float, None]] = None,
+        specification: Specification = None
+    ) -> ConsistencyReport:
+        # All checks share a single pass over the plate columns, which groups the plate indexes by serial number,
+        # thickness, delivery condition and impact test count. The issues are then read from the groups, so the cost
+        # is linear in the number of plates. The plate thicknesses default to the thickness column of the batch, if it
+        # has one. The required impact test count follows from the grade of the specification and the thickness of
+        # the plate, or of the certificate.
+        serial_numbers = batch.serial_numbers
+        if plate_thicknesses is None:
+            plate_thicknesses = batch.values.get(_THICKNESS)
+        delivery_conditions = batch.values.get(_DELIVERY_CONDITION)
+        grade = None if specification is None else specification.value
+        certificate_thickness = None if thickness is None else thickness.value
+        required_test_counts: Dict[Union[int, float, None], Union[int, None]] = dict()
+        plates_by_serial_number: Dict[int, List[int]] = dict()
+        plates_by_thickness: Dict[Union[int, float], List[int]] = dict()
+        plates_by_delivery_condition: Dict[str, List[int]] = dict()
+        plates_by_test_count: Dict[Tuple[int, int], List[int]] = dict()
+        for plate_index in range(len(batch)):
+            plates_by_serial_number.setdefault(serial_numbers[plate_index], []).append(plate_index)
+            plate_thickness = None if plate_thicknesses is None else plate_thicknesses[plate_index]
+            if plate_thickness is not None:
+                plates_by_thickness.setdefault(plate_thickness, []).append(plate_index)
+            if delivery_conditions is not None and delivery_conditions[plate_index] is not None:
+                plate_delivery_condition = str(delivery_conditions[plate_index]).strip()
+                if plate_delivery_condition:
+                    plates_by_delivery_condition.setdefault(plate_delivery_condition, []).append(plate_index)
+            test_thickness = certificate_thickness if plate_thickness is None else plate_thickness
+            if test_thickness not in required_test_counts:
+                required_test_counts[test_thickness] = self.required_impact_test_count(grade, test_thickness)
+            required_test_count = required_test_counts[test_thickness]
+            if required_test_count:
+                plates_by_test_count.setdefault(
+                    (len(batch.impact_energies[plate_index]), required_test_count), []).append(plate_index)
+        issues: List[ConsistencyIssue] = []
+        issues.extend(CertificateConsistencyChecker.check_serial_numbers(batch, plates_by_serial_number, serial_number))
+        if thickness is not None:
+            issues.extend(CertificateConsistencyChecker.check_thickness(batch, plates_by_thickness, thickness))
+        issues.extend(CertificateConsistencyChecker.check_delivery_condition(
+            batch, plates_by_delivery_condition, delivery_condition))
+        issues.extend(CertificateConsistencyChecker.check_impact_test_counts(batch, plates_by_test_count))
+        return ConsistencyReport(len(batch), issues)
+
+    @staticmethod
+    def issue(check: str, message: str, batch: PlateBatch, plate_indexes: List[int]) -> ConsistencyIssue:
+        return ConsistencyIssue(
+            check,
+            message,
+            [batch.serial_numbers[plate_index] for plate_index in plate_indexes],
+            [CertificateConsistencyChecker.row(batch, plate_index) for plate_index in plate_indexes]
+        )
+
+    @staticmethod
+    def row(batch: PlateBatch, plate_index: int) -> Tuple[int, int, int]:
+        return batch.table_indexes[plate_index], batch.row_indexes[plate_index], batch.line_indexes[plate_index]
+
+    @staticmethod
+    def check_serial_numbers(batch: PlateBatch, plates_by_serial_number: Dict[int, List[int]],
+                             serial_number: SerialNumber = None) -> List[ConsistencyIssue]:
+        issues = []
+        for plate_serial_number, plate_indexes in plates_by_serial_number.items():
+            if len(plate_indexes) > 1:
+                rows = [CertificateConsistencyChecker.row(batch, plate_index) for plate_index in plate_indexes]
+                issues.append(ConsistencyIssue(
+                    _SERIAL_NUMBER,
+                    f"[FAIL] Serial number {plate_serial_number} is given to {len(plate_indexes)} plate rows {rows}.",
+                    [plate_serial_number],
+                    rows
+                ))
+        if serial_number is None:
+            return issues
+        listed: Dict[int, int] = dict()
+        for listed_serial_number in serial_number.value:
+            listed_serial_number = int(listed_serial_number)
+            listed[listed_serial_number] = listed.get(listed_serial_number, 0) + 1
+        duplicates = [listed_serial_number for listed_serial_number, count in listed.items() if count > 1]
+        if duplicates:
+            issues.append(ConsistencyIssue(
+                _SERIAL_NUMBER,
+                f"[FAIL] Serial numbers {duplicates} are listed more than once in the serial number sequence.",
+                duplicates
+            ))
+        not_listed = [
+            plate_index for plate_serial_number, plate_indexes in plates_by_serial_number.items()
+            if plate_serial_number not in listed for plate_index in plate_indexes
+        ]
+        if not_listed:
+            issues.append(CertificateConsistencyChecker.issue(
+                _SERIAL_NUMBER,
+                f"[FAIL] Plates {list(dict.fromkeys(batch.serial_numbers[plate_index] for plate_index in not_listed))}"
+                f" are not listed in the serial number sequence.",
+                batch,
+                not_listed
+            ))
+        without_plate = [
+            listed_serial_number for listed_serial_number in listed
+            if listed_serial_number not in plates_by_serial_number
+        ]
+        if without_plate:
+            issues.append(ConsistencyIssue(
+                _SERIAL_NUMBER,
+                f"[FAIL] Serial numbers {without_plate} are listed, but have no plate row.",
+                without_plate
+            ))
+        return issues
+
+    @staticmethod
+    def check_thickness(batch: PlateBatch, plates_by_thickness: Dict[Union[int, float], List[int]],
+                        thickness: Thickness) -> List[ConsistencyIssue]:
+        return [
+            CertificateConsistencyChecker.issue(
+                _THICKNESS,
+                f"[FAIL] Plates {[batch.serial_numbers[plate_index] for plate_index in plate_indexes]} have the "
+                f"thickness {plate_thickness}, but the certificate gives {thickness.value}.",
+                batch,
+                plate_indexes
+            )
+            for plate_thickness, plate_indexes in plates_by_thickness.items() if plate_thickness != thickness.value
+        ]
+
+    @staticmethod
+    def check_delivery_condition(batch: PlateBatch, plates_by_delivery_condition: Dict[str, List[int]],
+                                 delivery_condition: DeliveryCondition = None) -> List[ConsistencyIssue]:
+        # Plates without their own delivery condition take the one of the certificate. Without a certificate wide
+        # delivery condition, all plates have to agree on the same one. Surrounding spaces are not significant.
+        if delivery_condition is not None:
+            certificate_delivery_condition = str(delivery_condition.value).strip()
+            return [
+                CertificateConsistencyChecker.issue(
+                    _DELIVERY_CONDITION,
+                    f"[FAIL] Plates {[batch.serial_numbers[plate_index] for plate_index in plate_indexes]} have the "
+                    f"delivery condition {plate_delivery_condition}, but the certificate gives "
+                    f"{certificate_delivery_condition}.",
+                    batch,
+                    plate_indexes
+                )
+                for plate_delivery_condition, plate_indexes in plates_by_delivery_condition.items()
+                if plate_delivery_condition != certificate_delivery_condition
+            ]
+        if len(plates_by_delivery_condition) > 1:
+            return [CertificateConsistencyChecker.issue(
+                _DELIVERY_CONDITION,
+                f"[FAIL] The plates have the delivery conditions {list(plates_by_delivery_condition)}, only one is "
+                f"expected per certificate.",
+                batch,
+                sorted(
+                    plate_index for plate_indexes in plates_by_delivery_condition.values()
+                    for plate_index in plate_indexes
+                )
+            )]
+        return []
+
+    @staticmethod
+    def check_impact_test_counts(batch: PlateBatch,
+                                 plates_by_test_count: Dict[Tuple[int, int], List[int]]) -> List[ConsistencyIssue]:
+        return [
+            CertificateConsistencyChecker.issue(
+                _IMPACT_TEST_COUNT,
+                f"[FAIL] Plates {[batch.serial_numbers[plate_index] for plate_index in plate_indexes]} have "
+                f"{test_count} impact tests, {required_test_count} are required.",
+                batch,
+                plate_indexes
+            )
+            for (test_count, required_test_count), plate_indexes in sorted(plates_by_test_count.items())
+            if test_count != required_test_count
+        ]
@@ -0,0 +1,267 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from certificate_element import SteelPlate, ChemicalElementValue, DeliveryCondition, YieldStrength, TensileStrength, \
+    Elongation, PositionDirectionImpact, Temperature, ImpactEnergy
+from common_utils import CommonUtils, TableSearchType, TableNgramIndex, NormalisedCell, NormalisedTable
+
+Table = Union[List[List[Union[str, None]]], NormalisedTable]
+Cell = Union[str, NormalisedCell, None]
+
+# Multiplier written in a chemical element header, e.g. 'C\nx100' or 'Nb ×1000' or 'N 10^-4'.
+_MULTIPLIER_PATTERN = re.compile(r'[xX×*]\s*1(0+)|10\s*\^?\s*-\s*(\d+)')
+_MAXIMUM_IMPACT_TESTS = 3
+# cell texts certificates use for a value that was not measured
+_NOT_MEASURED = frozenset(('-', '--', '–', '—'))
+
+
+class CertificateTableLayout:
+
+    # field -> (keyword, search type) of its header cell, all of them can be overridden per steel plant
+    default_header_keywords: Dict[str, Tuple[str, TableSearchType]] = {
+        'serial_number': ('No.', TableSearchType.SPLIT_LINE_BREAK_START),
+        'delivery_condition': ('DeliveryCondition', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'yield_strength': ('YieldStrength', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'tensile_strength': ('TensileStrength', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'elongation': ('Elongation', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'position_direction_impact': ('Direction', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'temperature': ('Temperature', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        'impact_energy': ('ImpactEnergy', TableSearchType.REMOVE_LINE_BREAK_CONTAIN),
+        **{element: (element, TableSearchType.SPLIT_LINE_BREAK_START)
+           for element in CommonUtils.chemical_elements_table}
+    }
+
+    def __init__(self, table_index: int, columns: Dict[str, List[int]], first_data_row: int,
+                 precisions: Dict[str, int]):
+        self.table_index = table_index
+        # field -> column indexes, only impact energy may span several columns (one per test)
+        self.columns = columns
+        self.first_data_row = first_data_row
+        # chemical element -> precision given by the multiplier in its header
+        self.precisions = precisions
+
+    def __repr__(self):
+        return (
+            f"CertificateTableLayout: table_index: {self.table_index}, first_data_row: {self.first_data_row}, "
+            f"columns: {self.columns}"
+        )
+
+    @staticmethod
+    def header_precision(header: Union[str, NormalisedCell]) -> Union[int, None]:
+        match = _MULTIPLIER_PATTERN.search(header.text if isinstance(header, NormalisedCell) else header)
+        if match is None:
+            return None
+        return len(match.group(1)) if match.group(1) is not None else int(match.group(2))
+
+    @staticmethod
+    def locate(
+        table: Table,
+        table_index: int,
+        header_keywords: Dict[str, Tuple[str, TableSearchType]] = None,
+        fuzzy: bool = False
+    ) -> Union['CertificateTableLayout', None]:
+        # Returns None when the table has no header, i.e. it continues the table of the previous page. With fuzzy,
+        # headers missed by their search type are searched again in an n-gram index of the table, built once.
+        header_keywords = CertificateTableLayout.default_header_keywords if header_keywords is None \
+            else header_keywords
+        ngram_index: Union[TableNgramIndex, None] = None
+
+        def search(field_keyword: str, field_search_type: TableSearchType,
+                   row_index: int = None) -> Union[Tuple[int, int], None]:
+            nonlocal ngram_index
+            field_coordinates = CommonUtils.search_table(table, field_keyword, field_search_type,
+                                                         confirmed_row=row_index)
+            if field_coordinates is None and fuzzy and field_search_type != TableSearchType.SPLIT_LINE_BREAK_ALL_DIGIT:
+                ngram_index = TableNgramIndex(table) if ngram_index is None else ngram_index
+                field_coordinates = CommonUtils.search_table(table, field_keyword, TableSearchType.FUZZY_NGRAM,
+                                                             confirmed_row=row_index, ngram_index=ngram_index)
+            return field_coordinates
+
+        keyword, search_type = header_keywords['serial_number']
+        serial_number_coordinates = search(keyword, search_type)
+        if serial_number_coordinates is None:
+            return None
+        serial_number_row, serial_number_col = serial_number_coordinates
+        # sub header rows (e.g. units) have no digits in the serial number column
+        first_data_row = serial_number_row + 1
+        while first_data_row < len(table) and not CertificateTableLayout.is_data_row(
+                table[first_data_row], serial_number_col):
+            first_data_row += 1
+        columns = {'serial_number': [serial_number_col]}
+        precisions = dict()
+        for field, (keyword, search_type) in header_keywords.items():
+            if field == 'serial_number':
+                continue
+            # the other headers are only searched in the header rows, data cells such as the delivery condition 'N'
+            # must not be taken for a header
+            coordinates = None
+            for header_row in range(serial_number_row, first_data_row):
+                coordinates = search(keyword, search_type, header_row)
+                if coordinates is not None:
+                    break
+            if coordinates is None:
+                continue
+            row_index, col_index = coordinates
+            columns[field] = [col_index]
+            if field == 'impact_energy':
+                # merged header cells are extracted as None, the following columns hold the other tests
+                header_row = table[row_index]
+                next_col_index = col_index + 1
+                while next_col_index < len(header_row) and header_row[next_col_index] is None \
+                        and len(columns[field]) < _MAXIMUM_IMPACT_TESTS:
+                    columns[field].append(next_col_index)
+                    next_col_index += 1
+            elif field in CommonUtils.chemical_element_bits:
+                precision = CertificateTableLayout.header_precision(table[row_index][col_index])
+                if precision is not None:
+                    precisions[field] = precision
+        return CertificateTableLayout(table_index, columns, first_data_row, precisions)
+
+    @staticmethod
+    def is_data_row(row: List[Cell], serial_number_col: int) -> bool:
+        cell = row[serial_number_col] if serial_number_col < len(row) else None
+        if isinstance(cell, NormalisedCell):
+            return cell.joined != '' and cell.all_digit
+        return cell is not None and cell.strip() != '' and all(
+            map(lambda x: x.strip().isdigit(), cell.split('\n')))
+
+    def continued_by(self, table_index: int) -> 'CertificateTableLayout':
+        # Continuation tables reuse the columns found on the header table and have data from their first row.
+        return CertificateTableLayout(table_index, self.columns, 0, self.precisions)
+
+
+class CertificateValueParser:
+
+    @staticmethod
+    def split_cell(cell: Cell) -> List[str]:
+        if cell is None:
+            return []
+        if isinstance(cell, NormalisedCell):
+            return list(cell.lines)
+        return [line.strip() for line in cell.split('\n')]
+
+    @staticmethod
+    def line_value(lines: List[str], line_index: int, line_count: int) -> Union[str, None]:
+        # a cell with a single line holds the value shared by all plates of the row
+        if len(lines) == line_count:
+            return lines[line_index]
+        if len(lines) == 1:
+            return lines[0]
+        return None
+
+    @staticmethod
+    def is_missing(text: Union[str, None]) -> bool:
+        return text is None or text == '' or text in _NOT_MEASURED
+
+    @staticmethod
+    def parse_number(text: str) -> Union[int, float, None]:
+        if CertificateValueParser.is_missing(text):
+            return None
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+
+    @staticmethod
+    def parse_chemical_value(text: str, header_precision: Union[int, None]) -> Union[Tuple[int, int], None]:
+        # '0.15' -> (15, 2), '15' with header multiplier x100 -> (15, 2)
+        if CertificateValueParser.is_missing(text):
+            return None
+        if '.' in text:
+            integer_part, decimal_part = text.split('.', 1)
+            return int(integer_part + decimal_part), len(decimal_part)
+        return int(text), header_precision if header_precision is not None else 0
+
+
+class IncrementalCertificateParser:
+
+    single_value_fields = {
+        'delivery_condition': DeliveryCondition,
+        'yield_strength': YieldStrength,
+        'tensile_strength': TensileStrength,
+        'elongation': Elongation,
+        'position_direction_impact': PositionDirectionImpact,
+        'temperature': Temperature
+    }
+    text_fields = {'delivery_condition', 'position_direction_impact'}
+
+    def __init__(self, header_keywords: Dict[str, Tuple[str, TableSearchType]] = None, fuzzy_headers: bool = False):
+        self.header_keywords = header_keywords
+        self.fuzzy_headers = fuzzy_headers
+        self.layout: Union[CertificateTableLayout, None] = None
+        # the last plate may continue on the next page, so it is only emitted once another plate starts
+        self.pending_plate: Union[SteelPlate, None] = None
+
+    def fill_plate(self, steel_plate: SteelPlate, table_index: int, row_index: int, row: List[Cell],
+                   line_index: int, line_count: int):
+        layout = self.layout
+        for field, col_indexes in layout.columns.items():
+            if field == 'serial_number':
+                continue
+            if field == 'impact_energy':
+                for col_index in col_indexes:
+                    lines = CertificateValueParser.split_cell(row[col_index] if col_index < len(row) else None)
+                    value = CertificateValueParser.parse_number(
+                        CertificateValueParser.line_value(lines, line_index, line_count))
+                    if value is not None:
+                        # tests are numbered in reading order, across columns and continuation rows
+                        steel_plate.impact_energy_list.append(ImpactEnergy(
+                            table_index, row_index, col_index, line_index, len(steel_plate.impact_energy_list) + 1,
+                            value))
+                continue
+            col_index = col_indexes[0]
+            lines = CertificateValueParser.split_cell(row[col_index] if col_index < len(row) else None)
+            text = CertificateValueParser.line_value(lines, line_index, line_count)
+            if CertificateValueParser.is_missing(text):
+                continue
+            if field in CommonUtils.chemical_element_bits:
+                value, precision = CertificateValueParser.parse_chemical_value(text, layout.precisions.get(field))
+                steel_plate.chemical_compositions[field] = ChemicalElementValue(
+                    table_index, row_index, col_index, value, line_index, field, precision)
+            else:
+                element_class = IncrementalCertificateParser.single_value_fields[field]
+                value = text if field in IncrementalCertificateParser.text_fields \
+                    else CertificateValueParser.parse_number(text)
+                setattr(steel_plate, field, element_class(table_index, row_index, col_index, line_index, value))
+
+    def feed(self, table_index: int, table: Table) -> Iterator[SteelPlate]:
+        # the table is normalised once, the header search and every value below read the interned lines
+        table = NormalisedTable.normalise(table)
+        layout = CertificateTableLayout.locate(table, table_index, self.header_keywords, self.fuzzy_headers)
+        if layout is not None:
+            self.layout = layout
+        elif self.layout is None:
+            # tables before the first header table (e.g. the certificate heading) carry no plate rows
+            return
+        else:
+            self.layout = self.layout.continued_by(table_index)
+        serial_number_col = self.layout.columns['serial_number'][0]
+        for row_index in range(self.layout.first_data_row, len(table)):
+            row = table[row_index]
+            serial_number_lines = CertificateValueParser.split_cell(
+                row[serial_number_col] if serial_number_col < len(row) else None)
+            serial_number_lines = [line for line in serial_number_lines if line != '']
+            if not serial_number_lines:
+                # rows without serial number continue the current plate, e.g. further impact tests
+                if self.pending_plate is not None:
+                    self.fill_plate(self.pending_plate, table_index, row_index, row, 0, 1)
+                continue
+            if not all(line.isdigit() for line in serial_number_lines):
+                continue
+            for line_index, serial_number in enumerate(serial_number_lines):
+                if self.pending_plate is not None:
+                    yield self.pending_plate
+                self.pending_plate = SteelPlate(serial_number=int(serial_number))
+                self.fill_plate(self.pending_plate, table_index, row_index, row, line_index,
+                                len(serial_number_lines))
+
+    def finish(self) -> Iterator[SteelPlate]:
+        if self.pending_plate is not None:
+            yield self.pending_plate
+            self.pending_plate = None
+
+    def parse(self, tables: Iterable[Table]) -> Iterator[SteelPlate]:
+        # tables can be any iterator, e.g. one extracted page at a time, only the current table is kept in memory
+        for table_index, table in enumerate(tables):
+            yield from self.feed(table_index, table)
+        yield from self.finish()
@@ -0,0 +1,199 @@
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, Iterator, List, Union
+
+
+# Data file: magic followed by blocks, every block starts with its kind and its payload length.
+#   string block (b'S'):      count | (length | utf-8 bytes) * count
+#   certificate block (b'C'): plant id | pdf path id | table count | table offsets | tables
+#   table:                    row count | (cell count | cell ids) * row count, cell id 0 means None
+# Index file: one (kind, offset) entry per block, the archive is only ever appended to.
+_MAGIC = b'CMCTARC1'
+_BLOCK_HEADER = struct.Struct('<cQ')
+_INDEX_ENTRY = struct.Struct('<cQ')
+_U32 = struct.Struct('<I')
+_CERTIFICATE_HEADER = struct.Struct('<III')
+_STRING_BLOCK = b'S'
+_CERTIFICATE_BLOCK = b'C'
+_NONE_CELL = 0
+
+
+class ArchivedCertificate:
+
+    def __init__(self, archive: 'CertificateTableArchive', index: int, offset: int):
+        self.archive = archive
+        self.index = index
+        self.offset = offset
+        plant_id, pdf_path_id, self.table_count = _CERTIFICATE_HEADER.unpack_from(archive.data, offset)
+        self.steel_plant = archive.get_string(plant_id)
+        self.pdf_path = archive.get_string(pdf_path_id)
+
+    def __repr__(self):
+        return f"ArchivedCertificate: {self.pdf_path} [steel_plant: {self.steel_plant}, tables: {self.table_count}]"
+
+    def table(self, table_index: int) -> List[List[Union[str, None]]]:
+        if not 0 <= table_index < self.table_count:
+            raise IndexError(f"The table index {table_index} is out of range for certificate {self.pdf_path}.")
+        data = self.archive.data
+        table_offsets_start = self.offset + _CERTIFICATE_HEADER.size
+        position = self.offset + struct.unpack_from('<Q', data, table_offsets_start + table_index * 8)[0]
+        row_count = _U32.unpack_from(data, position)[0]
+        position += _U32.size
+        table = []
+        for _ in range(row_count):
+            cell_count = _U32.unpack_from(data, position)[0]
+            position += _U32.size
+            cell_ids = struct.unpack_from(f'<{cell_count}I', data, position)
+            position += cell_count * _U32.size
+            table.append([None if cell_id == _NONE_CELL else self.archive.get_string(cell_id - 1)
+                          for cell_id in cell_ids])
+        return table
+
+    def tables(self) -> Iterator[List[List[Union[str, None]]]]:
+        for table_index in range(self.table_count):
+            yield self.table(table_index)
+
+
+class CertificateTableArchive:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data_file = open(path, 'rb')
+        self.index_file = open(path + '.idx', 'rb')
+        self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"The file {path} is not a certificate table archive.")
+        index_size = os.fstat(self.index_file.fileno()).st_size
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ) if index_size else b''
+        self.certificate_offsets = array('Q')
+        # Position of every interned string, strings are only decoded when a table refers to them.
+        self.string_offsets = array('Q')
+        self.string_cache: Dict[int, str] = dict()
+        for entry_offset in range(0, len(self.index) - len(self.index) % _INDEX_ENTRY.size, _INDEX_ENTRY.size):
+            kind, block_offset = _INDEX_ENTRY.unpack_from(self.index, entry_offset)
+            payload_offset = block_offset + _BLOCK_HEADER.size
+            if kind == _CERTIFICATE_BLOCK:
+                self.certificate_offsets.append(payload_offset)
+            elif kind == _STRING_BLOCK:
+                count = _U32.unpack_from(self.data, payload_offset)[0]
+                position = payload_offset + _U32.size
+                for _ in range(count):
+                    self.string_offsets.append(position)
+                    position += _U32.size + _U32.unpack_from(self.data, position)[0]
+            else:
+                raise ValueError(f"Unknown block kind {kind} in the index of archive {path}.")
+
+    def __len__(self):
+        return len(self.certificate_offsets)
+
+    def __getitem__(self, index: int) -> ArchivedCertificate:
+        return ArchivedCertificate(archive=self, index=index, offset=self.certificate_offsets[index])
+
+    def __iter__(self) -> Iterator[ArchivedCertificate]:
+        for index in range(len(self.certificate_offsets)):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_string(self, string_id: int) -> str:
+        string = self.string_cache.get(string_id)
+        if string is None:
+            position = self.string_offsets[string_id]
+            length = _U32.unpack_from(self.data, position)[0]
+            start = position + _U32.size
+            string = self.data[start:start + length].decode('utf-8')
+            self.string_cache[string_id] = string
+        return string
+
+    def strings(self) -> List[str]:
+        return [self.get_string(string_id) for string_id in range(len(self.string_offsets))]
+
+    def close(self):
+        if isinstance(self.index, mmap.mmap):
+            self.index.close()
+        self.data.close()
+        self.index_file.close()
+        self.data_file.close()
+
+
+class CertificateTableArchiveWriter:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.string_ids: Dict[str, int] = dict()
+        if os.path.exists(path):
+            with CertificateTableArchive(path) as archive:
+                for string_id, string in enumerate(archive.strings()):
+                    self.string_ids[string] = string_id
+            self.data_file = open(path, 'ab')
+        else:
+            self.data_file = open(path, 'wb')
+            self.data_file.write(_MAGIC)
+        self.index_file = open(path + '.idx', 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def intern(self, string: str, new_strings: List[str]) -> int:
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = len(self.string_ids)
+            self.string_ids[string] = string_id
+            new_strings.append(string)
+        return string_id
+
+    def write_block(self, kind: bytes, payload: bytes) -> int:
+        offset = self.data_file.tell()
+        self.data_file.write(_BLOCK_HEADER.pack(kind, len(payload)))
+        self.data_file.write(payload)
+        # The data is flushed before its index entry so that a reader never sees a partially written block.
+        self.data_file.flush()
+        self.index_file.write(_INDEX_ENTRY.pack(kind, offset))
+        self.index_file.flush()
+        return offset
+
+    def append(self, steel_plant: str, pdf_path: str, tables: List[List[List[Union[str, None]]]]) -> int:
+        new_strings: List[str] = []
+        plant_id = self.intern(steel_plant, new_strings)
+        pdf_path_id = self.intern(pdf_path, new_strings)
+        encoded_tables = []
+        for table in tables:
+            encoded_table = bytearray(_U32.pack(len(table)))
+            for row in table:
+                cell_ids = [_NONE_CELL if cell is None else self.intern(cell, new_strings) + 1 for cell in row]
+                encoded_table += _U32.pack(len(cell_ids))
+                encoded_table += struct.pack(f'<{len(cell_ids)}I', *cell_ids)
+            encoded_tables.append(encoded_table)
+
+        if new_strings:
+            string_payload = bytearray(_U32.pack(len(new_strings)))
+            for string in new_strings:
+                encoded_string = string.encode('utf-8')
+                string_payload += _U32.pack(len(encoded_string))
+                string_payload += encoded_string
+            self.write_block(_STRING_BLOCK, bytes(string_payload))
+
+        # table offsets are relative to the start of the certificate payload
+        table_offsets = []
+        position = _CERTIFICATE_HEADER.size + 8 * len(encoded_tables)
+        for encoded_table in encoded_tables:
+            table_offsets.append(position)
+            position += len(encoded_table)
+        certificate_payload = b''.join(
+            [_CERTIFICATE_HEADER.pack(plant_id, pdf_path_id, len(encoded_tables)),
+             struct.pack(f'<{len(table_offsets)}Q', *table_offsets)] + encoded_tables
+        )
+        return self.write_block(_CERTIFICATE_BLOCK, certificate_payload)
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
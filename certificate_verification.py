@@ -1,9 +1,17 @@
+import os
+import re
+from copy import copy
 from enum import Enum, unique
 from collections import defaultdict
-from typing import Tuple, Union, List, Dict
+from functools import partial
+from typing import Tuple, Union, List, Dict, Callable, Iterable
 
 from certificate_element import Thickness, ChemicalElementValue, YieldStrength, TensileStrength, Elongation, \
-    Temperature, ImpactEnergy
+    Temperature, ImpactEnergy, SteelPlate
+from common_utils import CommonUtils
+from direction import Direction
+from verification_audit import VerificationAuditLog
+from verification_messages import MessageTemplates, TemplatedMessage
 
 
 @unique
@@ -14,6 +22,77 @@ class LimitType(Enum):
     UNIQUE = 4
 
 
+class CheckFailureStatistics:
+
+    # ################################ Singleton ################################ #
+    _singleton = None
+
+    @classmethod
+    def get_singleton(cls):
+        if not isinstance(cls._singleton, cls):
+            cls._singleton = cls()
+        return cls._singleton
+    # ################################ Singleton ################################ #
+
+    # check name of every chemical element, built once instead of per checked element
+    chemical_check_names: Dict[str, str] = {
+        element: f"chemical {element}" for element in CommonUtils.chemical_elements_table
+    }
+
+    def __init__(self, sample_interval: int = 16):
+        # check name -> [evaluated count, failed count]
+        self.check_counts: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        # Only every sample_interval-th short circuit verification evaluates and records all of its checks. Recording
+        # the others would only count the checks before the first failure and bias the order.
+        self.sample_interval = sample_interval
+        self.short_circuit_count = 0
+
+    @staticmethod
+    def chemical_check_name(element: str) -> str:
+        check_name = CheckFailureStatistics.chemical_check_names.get(element)
+        return f"chemical {element}" if check_name is None else check_name
+
+    def sample(self) -> bool:
+        self.short_circuit_count += 1
+        return (self.short_circuit_count - 1) % self.sample_interval == 0
+
+    def save(self, path: str):
+        # the failure probabilities are kept across processes, the file is replaced atomically
+        import json
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(self.check_counts, file)
+        os.replace(temporary_path, path)
+
+    def load(self, path: str) -> bool:
+        # Replaces the counts of the checks saved in the file, returns False when there is no file yet.
+        import json
+        if not os.path.exists(path):
+            return False
+        with open(path, encoding='utf-8') as file:
+            check_counts = json.load(file)
+        for check, (evaluated_count, failed_count) in check_counts.items():
+            self.check_counts[check] = [evaluated_count, failed_count]
+        return True
+
+    def record(self, check: str, valid_flag: bool):
+        counts = self.check_counts[check]
+        counts[0] += 1
+        if not valid_flag:
+            counts[1] += 1
+
+    def failure_probability(self, check: str) -> float:
+        # Laplace smoothing, so checks that were never evaluated are neither first nor last.
+        counts = self.check_counts.get(check)
+        if counts is None:
+            return 0.5
+        return (counts[1] + 1) / (counts[0] + 2)
+
+    def order_by_failure_probability(self, checks: list, check_name=lambda check: check[0]) -> list:
+        # sorted() is stable, so checks with the same probability keep their normal order.
+        return sorted(checks, key=lambda check: -self.failure_probability(check_name(check)))
+
+
 class ChemicalCompositionLimit:
 
     def __init__(
@@ -30,6 +109,7 @@ class ChemicalCompositionLimit:
         self.minimum = minimum
         self.mandatory = mandatory
         self.self_inspection()
+        self.pass_template_id, self.fail_template_id = self.register_message_templates()
 
     def self_inspection(self):
         if self.limit_type == LimitType.MAXIMUM:
@@ -62,6 +142,29 @@ class ChemicalCompositionLimit:
         else:
             return False
 
+    def register_message_templates(self) -> Tuple[int, int]:
+        message_templates = MessageTemplates.get_singleton()
+        prefix = f"The value of chemical element {self.chemical_element} is {{}}, "
+        if self.limit_type == LimitType.MAXIMUM:
+            suffix = f"the maximum limit {self.maximum}."
+        elif self.limit_type == LimitType.MINIMUM:
+            suffix = f"the minimum limit {self.minimum}."
+        else:
+            suffix = f"the valid range [{self.minimum}, {self.maximum}]."
+        return (
+            message_templates.register(f"[PASS] {prefix}meets {suffix}"),
+            message_templates.register(f"[FAIL] {prefix}violates {suffix}")
+        )
+
+    def verify_compact(self, value: float) -> Tuple[bool, TemplatedMessage]:
+        if self.limit_type == LimitType.MAXIMUM:
+            valid_flag = value <= self.maximum
+        elif self.limit_type == LimitType.MINIMUM:
+            valid_flag = value >= self.minimum
+        else:
+            valid_flag = self.minimum <= value <= self.maximum
+        return valid_flag, TemplatedMessage(self.pass_template_id if valid_flag else self.fail_template_id, value)
+
     def verify(self, value: float) -> Tuple[bool, str]:
         if self.limit_type == LimitType.MAXIMUM:
             if value <= self.maximum:
@@ -69,14 +172,14 @@ class ChemicalCompositionLimit:
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the maximum "
                     f"limit {self.maximum}."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return True, message
             else:
                 message = (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the maximum "
                     f"limit {self.maximum}."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return False, message
         elif self.limit_type == LimitType.MINIMUM:
             if value >= self.minimum:
@@ -84,32 +187,93 @@ class ChemicalCompositionLimit:
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the minimum "
                     f"limit {self.minimum}."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return True, message
             else:
                 message = (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the minimum "
                     f"limit {self.minimum}."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return False, message
-        elif self.limit_type == LimitType.RANGE:
+        else:
             if self.minimum <= value <= self.maximum:
                 message = (
                     f"[PASS] The value of chemical element {self.chemical_element} is {value}, meets the valid "
                     f"range [{self.minimum}, {self.maximum}]."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return True, message
             else:
                 message = (
                     f"[FAIL] The value of chemical element {self.chemical_element} is {value}, violates the valid "
                     f"range [{self.minimum}, {self.maximum}]."
                 )
-                print(message)
+                VerificationAuditLog.echo(message)
                 return False, message
 
 
+class AlternativeChemicalCompositionLimit:
+
+    def __init__(self, limit: ChemicalCompositionLimit, thickness_maximum: float = None, required_element: str = None):
+        # The limit replaces the normal one of its element for plates up to thickness_maximum and / or reporting the
+        # required element.
+        self.limit = limit
+        self.thickness_maximum = thickness_maximum
+        self.required_element = required_element
+
+    def __repr__(self):
+        return (
+            f"AlternativeChemicalCompositionLimit: {self.limit.chemical_element} [thickness_maximum: "
+            f"{self.thickness_maximum}, required_element: {self.required_element}]"
+        )
+
+    def applies(self, thickness: float, chemical_compositions: Iterable[str]) -> bool:
+        return (self.thickness_maximum is None or thickness <= self.thickness_maximum) and \
+            (self.required_element is None or self.required_element in chemical_compositions)
+
+
+class MissingChemicalElements:
+
+    def __init__(self, pdf_path: str):
+        # The missing element records of one certificate, one per element and shared by all of its plates. Pass the
+        # same object to the verification of every plate of the certificate.
+        self.pdf_path = pdf_path
+        self.records: Dict[str, ChemicalElementValue] = dict()
+        # element -> serial numbers of the plates not reporting it, in order and without repetitions
+        self.serial_numbers: Dict[str, Dict[int, None]] = dict()
+
+    def __repr__(self):
+        return f"MissingChemicalElements: {self.pdf_path} {list(self.records)}"
+
+    def record(self, element: str, serial_number: int = None) -> ChemicalElementValue:
+        missing_chemical_element = self.records.get(element)
+        if missing_chemical_element is None:
+            missing_chemical_element = ChemicalElementValue(
+                table_index=None,
+                x_coordinate=None,
+                y_coordinate=None,
+                value=None,
+                index=None,
+                element=element,
+                precision=None,
+            )
+            missing_chemical_element.valid_flag = False
+            missing_chemical_element.message = (
+                f"[FAIL] Chemical element {element} is required to be checked, but is not present in the given "
+                f"PDF file {self.pdf_path}"
+            )
+            VerificationAuditLog.echo(missing_chemical_element.message)
+            self.records[element] = missing_chemical_element
+            self.serial_numbers[element] = dict()
+        self.serial_numbers[element][serial_number] = None
+        return missing_chemical_element
+
+    def summary(self) -> Dict[str, List[int]]:
+        # element -> serial numbers of the plates of the certificate not reporting it
+        return {element: list(serial_numbers) for element, serial_numbers in self.serial_numbers.items()}
+
+
 class ChemicalCompositionLimitsForHighStrengthSteel:
 
     # ################################ Singleton ################################ #
@@ -124,6 +288,9 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
 
     def __init__(self):
         self.grade_chemical_element_normal_limit_map = defaultdict(dict)
+        # grade -> element -> alternative limits, in the order they are tried
+        self.grade_chemical_element_alternative_limit_map: Dict[str, Dict[str, List[
+            AlternativeChemicalCompositionLimit]]] = defaultdict(partial(defaultdict, list))
         self.grade_clusters = [
             [
                 'VL A27S',
@@ -149,6 +316,7 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
             ]
         ]
         self.compose_map()
+        self.compose_alternative_map()
 
     def map_grade_and_limit(self, grade_cluster_list: list, limit: ChemicalCompositionLimit):
         for index in grade_cluster_list:
@@ -301,6 +469,37 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
         )
         self.map_grade_and_limit(grade_cluster_list=[2], limit=limit)
 
+    def map_grade_and_alternative_limit(self, grade_cluster_list: list,
+                                        alternative_limit: AlternativeChemicalCompositionLimit):
+        for index in grade_cluster_list:
+            for grade in self.grade_clusters[index]:
+                self.grade_chemical_element_alternative_limit_map[grade][
+                    alternative_limit.limit.chemical_element].append(alternative_limit)
+
+    def compose_alternative_map(self):
+        # Table 9 Chemical composition limits for high strength steel - annotation 2
+        alternative_limit = AlternativeChemicalCompositionLimit(
+            limit=ChemicalCompositionLimit(
+                chemical_element='Mn',
+                limit_type=LimitType.RANGE,
+                minimum=0.70,
+                maximum=1.60
+            ),
+            thickness_maximum=12.5
+        )
+        self.map_grade_and_alternative_limit(grade_cluster_list=[1], alternative_limit=alternative_limit)
+        # Table 9 Chemical composition limits for high strength steel - annotation 6
+        alternative_limit = AlternativeChemicalCompositionLimit(
+            limit=ChemicalCompositionLimit(
+                chemical_element='N',
+                limit_type=LimitType.MAXIMUM,
+                maximum=0.012,
+                mandatory=False
+            ),
+            required_element='Al'
+        )
+        self.map_grade_and_alternative_limit(grade_cluster_list=[2], alternative_limit=alternative_limit)
+
     def get_limits_by_specification(self, specification: str) -> Dict[str, ChemicalCompositionLimit]:
         if specification in self.grade_chemical_element_normal_limit_map:
             return self.grade_chemical_element_normal_limit_map[specification]
@@ -311,26 +510,13 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
 
     def find_alternative_limit(self, specification: str, chemical_element: str, thickness: float,
                                chemical_compositions: dict) -> ChemicalCompositionLimit:
-
-        # Table 9 Chemical composition limits for high strength steel - annotation 2
-        if specification in self.grade_clusters[1] and chemical_element == 'Mn':
-            if thickness <= 12.5:
-                return ChemicalCompositionLimit(
-                    chemical_element='Mn',
-                    limit_type=LimitType.RANGE,
-                    minimum=0.70,
-                    maximum=1.60
-                )
-
-        # Table 9 Chemical composition limits for high strength steel - annotation 6
-        if specification in self.grade_clusters[2] and chemical_element == 'N':
-            if 'Al' in chemical_compositions:
-                return ChemicalCompositionLimit(
-                    chemical_element='N',
-                    limit_type=LimitType.MAXIMUM,
-                    maximum=0.012,
-                    mandatory=False
-                )
+        element_alternative_limits = self.grade_chemical_element_alternative_limit_map.get(specification)
+        if element_alternative_limits is None:
+            return None
+        for alternative_limit in element_alternative_limits.get(chemical_element, ()):
+            if alternative_limit.applies(thickness, chemical_compositions):
+                return alternative_limit.limit
+        return None
 
     def locate(self, grade: str, chemical_element: str) -> ChemicalCompositionLimit:
         if self.grade_chemical_element_normal_limit_map[grade][chemical_element] is None:
@@ -352,20 +538,38 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
         return limits
 
     def verify(self, specification: str, thickness: float, chemical_compositions: dict, pdf_path: str,
-               limits=None, only_mandatory=True) -> bool:
+               limits=None, only_mandatory=True, serial_number: int = None, compact_messages=False,
+               short_circuit=False, missing_elements: MissingChemicalElements = None) -> bool:
         all_pass_flag = True
+        if missing_elements is None:
+            missing_elements = MissingChemicalElements(pdf_path)
         if limits is None:
             limits = self.get_limits_by_specification(specification)
-        for element in limits:
+        failure_statistics = CheckFailureStatistics.get_singleton()
+        elements = list(limits)
+        # short circuit stops at the first failing element, the most likely failures are checked first; sampled
+        # verifications evaluate every element and are the only ones feeding the failure statistics
+        record_checks = short_circuit and failure_statistics.sample()
+        if record_checks:
+            short_circuit = False
+        elif short_circuit:
+            elements = failure_statistics.order_by_failure_probability(
+                elements, check_name=CheckFailureStatistics.chemical_check_name)
+        for element in elements:
+            if short_circuit and not all_pass_flag:
+                break
             normal_limit = limits[element]
             # skip non-mandatory limits when check only mandatory flag is True
             if only_mandatory and not normal_limit.is_mandatory():
                 continue
-            if element in chemical_compositions:
-                chemical_element_value = chemical_compositions[element]
+            chemical_element_value = chemical_compositions.get(element)
+            # a plate verified again still holds the missing element record of its certificate
+            if chemical_element_value is not None and chemical_element_value.value is not None:
                 element_calculated_value = chemical_element_value.calculated_value()
-                chemical_element_value.valid_flag, chemical_element_value.message = normal_limit.verify(
-                    element_calculated_value)
+                # compact messages keep only the template id and the value, and are not printed
+                chemical_element_value.valid_flag, chemical_element_value.message = normal_limit.verify_compact(
+                    element_calculated_value) if compact_messages else normal_limit.verify(element_calculated_value)
+                applied_limit = normal_limit
                 if not chemical_element_value.is_valid():
                     alternative_limit = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton() \
                         .find_alternative_limit(
@@ -378,26 +582,35 @@ class ChemicalCompositionLimitsForHighStrengthSteel:
                         all_pass_flag = False
                     else:
                         chemical_element_value.valid_flag, chemical_element_value.message = \
-                            alternative_limit.verify(element_calculated_value)
-                        if not chemical_element_value.is_valid:
+                            alternative_limit.verify_compact(element_calculated_value) if compact_messages \
+                            else alternative_limit.verify(element_calculated_value)
+                        applied_limit = alternative_limit
+                        if not chemical_element_value.is_valid():
                             all_pass_flag = False
-            else:
-                missing_chemical_element = ChemicalElementValue(
-                    table_index=None,
-                    x_coordinate=None,
-                    y_coordinate=None,
-                    value=None,
-                    index=None,
+                VerificationAuditLog.submit(
+                    pdf_path=pdf_path,
+                    serial_number=serial_number,
                     element=element,
-                    precision=None,
+                    limit=applied_limit,
+                    outcome=chemical_element_value.valid_flag,
+                    message=chemical_element_value.message
                 )
-                missing_chemical_element.valid_flag = False
-                missing_chemical_element.message = (
-                    f"[FAIL] Chemical element {element} is required to be checked, but is not present in the given "
-                    f"PDF file {pdf_path}"
+                if record_checks:
+                    failure_statistics.record(CheckFailureStatistics.chemical_check_name(element),
+                                              chemical_element_value.valid_flag)
+            else:
+                missing_chemical_element = missing_elements.record(element, serial_number)
+                VerificationAuditLog.submit(
+                    pdf_path=pdf_path,
+                    serial_number=serial_number,
+                    element=element,
+                    limit=normal_limit,
+                    outcome=False,
+                    message=missing_chemical_element.message
                 )
-                print(missing_chemical_element.message)
                 chemical_compositions[element] = missing_chemical_element
+                if record_checks:
+                    failure_statistics.record(CheckFailureStatistics.chemical_check_name(element), False)
                 all_pass_flag = False
         return all_pass_flag
 
@@ -412,11 +625,11 @@ class ThicknessLimit:
     def verify(self, value: Union[float, int]) -> Tuple[bool, str]:
         if value <= self.maximum:
             message = f"[PASS] Thickness value is {value}, meets the maximum limit {self.maximum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = f"[FAIL] Thickness value is {value}, violates the maximum limit {self.maximum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
@@ -441,17 +654,31 @@ class HullStructureSteelPlateLimit:
         specification: str,
         thickness: Thickness,
         chemical_compositions: Dict[str, ChemicalElementValue],
-        pdf_path: str
+        pdf_path: str,
+        serial_number: int = None,
+        short_circuit: bool = False,
+        missing_elements: MissingChemicalElements = None
     ) -> bool:
         # if the limit is an alternative one, its reset element list isn't None, then we need to reset those elements.
         if self.reset_elements is not None:
             for element in self.reset_elements:
                 if element in chemical_compositions:
                     chemical_element_value = chemical_compositions[element]
+                    if chemical_element_value.value is None:
+                        # missing element records are shared by the plates of a certificate, reset a copy of it
+                        chemical_element_value = chemical_compositions[element] = copy(chemical_element_value)
                     chemical_element_value.valid_flag = True
                     chemical_element_value.message = None
         all_pass_flag = True
         thickness.valid_flag, thickness.message = self.thickness_limit.verify(thickness.value)
+        VerificationAuditLog.submit(
+            pdf_path=pdf_path,
+            serial_number=serial_number,
+            element=thickness.name,
+            limit=self.thickness_limit,
+            outcome=thickness.valid_flag,
+            message=thickness.message
+        )
         if thickness.is_valid():
             chemical_composition_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
             limits = chemical_composition_limits.locate_multiple_limits(grade=specification,
@@ -462,7 +689,10 @@ class HullStructureSteelPlateLimit:
                 chemical_compositions=chemical_compositions,
                 pdf_path=pdf_path,
                 limits=limits,
-                only_mandatory=False
+                only_mandatory=False,
+                serial_number=serial_number,
+                short_circuit=short_circuit,
+                missing_elements=missing_elements
             ):
                 all_pass_flag = False
         else:
@@ -481,6 +711,95 @@ class HullStructureSteelPlateLimitsForSteelPlant:
         self.steel_plant = steel_plant
         self.limits = limits
         # self.alternative_limits = alternative_limits
+        # (grade, delivery condition) -> (combination masks sorted from the largest combination, minimum combination)
+        self.combination_masks: Dict[Tuple[str, str], Tuple[List[Tuple[int, Tuple[str, ...]]], Tuple[str, ...]]] = \
+            dict()
+        # (grade, delivery condition) -> (bit of every element of its combinations, their mask, selected limit per
+        # mask of the present elements)
+        self.combination_selections: Dict[Tuple[str, str], Tuple[Tuple[Tuple[str, int], ...], int, Dict[
+            int, HullStructureSteelPlateLimit]]] = dict()
+
+    def get_combination_masks(
+        self,
+        specification: str,
+        delivery_condition: str
+    ) -> Tuple[List[Tuple[int, Tuple[str, ...]]], Tuple[str, ...]]:
+        key = (specification, delivery_condition)
+        if key not in self.combination_masks:
+            element_combinations = self.limits[specification][delivery_condition]
+            if not element_combinations:
+                raise ValueError(
+                    f"Could not find fine grain element combinations for grade {specification} and delivery "
+                    f"condition {delivery_condition} of steel plant {self.steel_plant}."
+                )
+            # sorted() is stable, so combinations of the same size keep their composition order.
+            sorted_masks = sorted(
+                [(CommonUtils.chemical_element_mask(combination, strict=True), combination)
+                 for combination in element_combinations],
+                key=lambda mask_combination: -len(mask_combination[1])
+            )
+            minimum_standard_combination = min(element_combinations, key=len)
+            self.combination_masks[key] = (sorted_masks, minimum_standard_combination)
+        return self.combination_masks[key]
+
+    def get_combination_selection(
+        self,
+        specification: str,
+        delivery_condition: str
+    ) -> Tuple[Tuple[Tuple[str, int], ...], int, Dict[int, HullStructureSteelPlateLimit]]:
+        key = (specification, delivery_condition)
+        if key not in self.combination_selections:
+            sorted_masks, _ = self.get_combination_masks(specification, delivery_condition)
+            elements = {element for _, combination in sorted_masks for element in combination}
+            element_bits = tuple(sorted((element, CommonUtils.chemical_element_bits[element]) for element in elements))
+            combination_elements_mask = 0
+            for _, bit in element_bits:
+                combination_elements_mask |= bit
+            self.combination_selections[key] = (element_bits, combination_elements_mask, dict())
+        return self.combination_selections[key]
+
+    def select_limit(
+        self,
+        specification: str,
+        delivery_condition: str,
+        chemical_mask: int
+    ) -> HullStructureSteelPlateLimit:
+        # The largest combination whose elements are all present, otherwise the smallest combination. Only the
+        # elements of the combinations decide, so the selection is kept per mask of those elements.
+        _, combination_elements_mask, selected_limits = self.get_combination_selection(
+            specification, delivery_condition)
+        chemical_mask &= combination_elements_mask
+        limit = selected_limits.get(chemical_mask)
+        if limit is None:
+            sorted_masks, minimum_standard_combination = self.get_combination_masks(specification, delivery_condition)
+            element_combinations = self.limits[specification][delivery_condition]
+            limit = element_combinations[minimum_standard_combination]
+            for combination_mask, combination in sorted_masks:
+                if combination_mask & chemical_mask == combination_mask:
+                    limit = element_combinations[combination]
+                    break
+            selected_limits[chemical_mask] = limit
+        return limit
+
+    def select_limits(
+        self,
+        specification: str,
+        delivery_condition: str,
+        chemical_compositions_list: List[Dict[str, ChemicalElementValue]]
+    ) -> List[HullStructureSteelPlateLimit]:
+        # The mask of a plate is built from the elements of the combinations only, a handful of lookups per plate.
+        element_bits, _, selected_limits = self.get_combination_selection(specification, delivery_condition)
+        limits = []
+        for chemical_compositions in chemical_compositions_list:
+            chemical_mask = 0
+            for element, bit in element_bits:
+                if element in chemical_compositions:
+                    chemical_mask |= bit
+            limit = selected_limits.get(chemical_mask)
+            if limit is None:
+                limit = self.select_limit(specification, delivery_condition, chemical_mask)
+            limits.append(limit)
+        return limits
 
     def verify(
         self,
@@ -488,39 +807,68 @@ class HullStructureSteelPlateLimitsForSteelPlant:
         delivery_condition: str,
         thickness: Thickness,
         chemical_compositions: Dict[str, ChemicalElementValue],
-        pdf_path: str
+        pdf_path: str,
+        serial_number: int = None,
+        limit: HullStructureSteelPlateLimit = None,
+        short_circuit: bool = False,
+        missing_elements: MissingChemicalElements = None
     ) -> bool:
-        print(f"Delivery Condition: {delivery_condition}\n")
+        VerificationAuditLog.echo(f"Delivery Condition: {delivery_condition}\n")
         # Find out the combination of fine grained elements that fit the certificate best
-        element_combinations = self.limits[specification][delivery_condition]
-        best_combination = None
-        minimum_standard_combination = None
-        for combination in element_combinations:
-            if minimum_standard_combination is None:
-                minimum_standard_combination = combination
-            else:
-                if len(combination) < len(minimum_standard_combination):
-                    minimum_standard_combination = combination
-            if all(map(lambda x: x in chemical_compositions, combination)):
-                if best_combination is None:
-                    best_combination = combination
-                else:
-                    if len(combination) > len(best_combination):
-                        best_combination = combination
-        if best_combination is None:
-            limit = element_combinations[minimum_standard_combination]
-        else:
-            limit = element_combinations[best_combination]
+        if limit is None:
+            limit = self.select_limits(specification, delivery_condition, [chemical_compositions])[0]
         if limit.verify(
             specification=specification,
             thickness=thickness,
             chemical_compositions=chemical_compositions,
-            pdf_path=pdf_path
+            pdf_path=pdf_path,
+            serial_number=serial_number,
+            short_circuit=short_circuit,
+            missing_elements=missing_elements
         ):
             return True
         else:
             return False
 
+    def verify_plates(
+        self,
+        specification: str,
+        delivery_condition: str,
+        thickness: Thickness,
+        steel_plates: List[SteelPlate],
+        pdf_path: str,
+        short_circuit: bool = False,
+        missing_elements: MissingChemicalElements = None
+    ) -> List[bool]:
+        # Select the fine grain combination of every plate of the certificate at once, plates with their own delivery
+        # condition are grouped by it.
+        if missing_elements is None:
+            missing_elements = MissingChemicalElements(pdf_path)
+        plates_by_delivery_condition: Dict[str, List[int]] = defaultdict(list)
+        for plate_index, steel_plate in enumerate(steel_plates):
+            plate_delivery_condition = delivery_condition if steel_plate.delivery_condition is None \
+                else steel_plate.delivery_condition.value
+            plates_by_delivery_condition[plate_delivery_condition].append(plate_index)
+        results = [False] * len(steel_plates)
+        for plate_delivery_condition, plate_indexes in plates_by_delivery_condition.items():
+            limits = self.select_limits(
+                specification,
+                plate_delivery_condition,
+                [steel_plates[plate_index].chemical_compositions for plate_index in plate_indexes]
+            )
+            VerificationAuditLog.echo(f"Delivery Condition: {plate_delivery_condition}\n")
+            for plate_index, limit in zip(plate_indexes, limits):
+                results[plate_index] = limit.verify(
+                    specification=specification,
+                    thickness=thickness,
+                    chemical_compositions=steel_plates[plate_index].chemical_compositions,
+                    pdf_path=pdf_path,
+                    serial_number=steel_plates[plate_index].serial_number,
+                    short_circuit=short_circuit,
+                    missing_elements=missing_elements
+                )
+        return results
+
 
 class HullStructureSteelPlateLimits:
 
@@ -534,12 +882,58 @@ class HullStructureSteelPlateLimits:
         return cls._singleton
     # ################################ Singleton ################################ #
 
+    # words dropped from the end of a steel plant name when it is normalised, e.g. "CO., LTD."
+    steel_plant_suffix_words = {'CO', 'COMPANY', 'LTD', 'LIMITED', 'CORP', 'CORPORATION', 'INC'}
+
     def __init__(self):
-        self.steel_plant_map = dict()
-        self.compose_bao_steel_limits()
+        # Limits of a steel plant are only composed on its first lookup.
+        self.steel_plant_map: Dict[str, HullStructureSteelPlateLimitsForSteelPlant] = dict()
+        self.steel_plant_composers: Dict[str, Callable[[], None]] = dict()
+        self.normalised_steel_plant_index: Dict[str, str] = dict()
+        self.register_steel_plant(
+            steel_plant='BAOSHAN IRON & STEEL CO., LTD.',
+            composer=self.compose_bao_steel_limits,
+            aliases=['BAOSTEEL', 'BAO STEEL']
+        )
+
+    @staticmethod
+    def normalise_steel_plant_name(steel_plant: str) -> str:
+        words = re.sub(r'[\W_]+', ' ', steel_plant.upper().replace('&', ' AND ')).split()
+        while words and words[-1] in HullStructureSteelPlateLimits.steel_plant_suffix_words:
+            words.pop()
+        return ' '.join(words)
+
+    def register_steel_plant(self, steel_plant: str, composer: Callable[[], None], aliases: Iterable[str] = ()):
+        # The composer has to put the limits of the steel plant into steel_plant_map under the given name.
+        self.steel_plant_composers[steel_plant] = composer
+        for name in [steel_plant, *aliases]:
+            normalised_name = HullStructureSteelPlateLimits.normalise_steel_plant_name(name)
+            registered_steel_plant = self.normalised_steel_plant_index.get(normalised_name)
+            if registered_steel_plant is not None and registered_steel_plant != steel_plant:
+                raise ValueError(
+                    f"The steel plant name {name} of {steel_plant} is already registered for {registered_steel_plant}."
+                )
+            self.normalised_steel_plant_index[normalised_name] = steel_plant
+
+    def resolve_steel_plant(self, steel_plant: str) -> str:
+        if steel_plant in self.steel_plant_composers:
+            return steel_plant
+        registered_steel_plant = self.normalised_steel_plant_index.get(
+            HullStructureSteelPlateLimits.normalise_steel_plant_name(steel_plant))
+        if registered_steel_plant is None:
+            raise ValueError(f"Could not find steel plant {steel_plant} in the hull structure steel plate limits.")
+        return registered_steel_plant
 
     def get_limits_by_steel_plant(self, steel_plant: str) -> HullStructureSteelPlateLimitsForSteelPlant:
-        return self.steel_plant_map[steel_plant]
+        registered_steel_plant = self.resolve_steel_plant(steel_plant)
+        if registered_steel_plant not in self.steel_plant_map:
+            self.steel_plant_composers[registered_steel_plant]()
+        return self.steel_plant_map[registered_steel_plant]
+
+    def load_all_steel_plants(self) -> Dict[str, HullStructureSteelPlateLimitsForSteelPlant]:
+        for steel_plant in self.steel_plant_composers:
+            self.get_limits_by_steel_plant(steel_plant)
+        return self.steel_plant_map
 
     def compose_bao_steel_limits(self):
         steel_plant = 'BAOSHAN IRON & STEEL CO., LTD.'
@@ -767,11 +1161,11 @@ class YieldStrengthLimit:
     def verify(self, value: int) -> Tuple[bool, str]:
         if value >= self.minimum:
             message = f"[PASS] Yield Strength value is {value}, meets the minimum limit {self.minimum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = f"[FAIL] Yield Strength value is {value}, violates the minimum limit {self.minimum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
@@ -782,6 +1176,19 @@ class TensileStrengthLimit:
         self.maximum = maximum
         self.limit_type = limit_type
         self.unit = unit
+        message_templates = MessageTemplates.get_singleton()
+        self.pass_template_id = message_templates.register(
+            f"[PASS] Tensile Strength value is {{}}, meets the valid range {minimum} - {maximum} {unit}."
+        )
+        self.fail_template_id = message_templates.register(
+            f"[FAIL] Tensile Strength value is {{}}, violates the valid range {minimum} - {maximum} {unit}."
+        )
+
+    def verify_compact(self, value: int) -> Tuple[bool, TemplatedMessage]:
+        if self.minimum <= value <= self.maximum:
+            return True, TemplatedMessage(self.pass_template_id, value)
+        else:
+            return False, TemplatedMessage(self.fail_template_id, value)
 
     def verify(self, value: int) -> Tuple[bool, str]:
         if self.minimum <= value <= self.maximum:
@@ -789,14 +1196,14 @@ class TensileStrengthLimit:
                 f"[PASS] Tensile Strength value is {value}, meets the valid range {self.minimum} - {self.maximum} "
                 f"{self.unit}."
             )
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = (
                 f"[FAIL] Tensile Strength value is {value}, violates the valid range {self.minimum} - {self.maximum} "
                 f"{self.unit}."
             )
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
@@ -810,11 +1217,11 @@ class ElongationLimit:
     def verify(self, value: int) -> Tuple[bool, str]:
         if value >= self.minimum:
             message = f"[PASS] Elongation value is {value}, meets the minimum limit {self.minimum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = f"[FAIL] Elongation value is {value}, violates the minimum limit {self.minimum} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
@@ -828,20 +1235,14 @@ class TemperatureLimit:
     def verify(self, value: int) -> Tuple[bool, str]:
         if value == self.unique_value:
             message = f"[PASS] Temperature value is {value}, meets the valid value {self.unique_value} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = f"[FAIL] Temperature value is {value}, violates the valid value {self.unique_value} {self.unit}."
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
-@unique
-class Direction(Enum):
-    TRANSVERSE = 'Transverse'  # 横向
-    LONGITUDINAL = 'Longitudinal'  # 纵向
-
-
 class ImpactEnergyLimit:
 
     def __init__(
@@ -857,6 +1258,19 @@ class ImpactEnergyLimit:
         self.minimum = minimum
         self.limit_type = limit_type
         self.unit = unit
+        message_templates = MessageTemplates.get_singleton()
+        self.pass_template_id = message_templates.register(
+            f"[PASS] Impact Energy value is {{}}, meets the minimum limit {minimum} {unit}."
+        )
+        self.fail_template_id = message_templates.register(
+            f"[FAIL] Impact Energy value is {{}}, meets the minimum limit {minimum} {unit}."
+        )
+
+    def verify_compact(self, value: int) -> Tuple[bool, TemplatedMessage]:
+        if value >= self.minimum:
+            return True, TemplatedMessage(self.pass_template_id, value)
+        else:
+            return False, TemplatedMessage(self.fail_template_id, value)
 
     def verify(self, value: int) -> Tuple[bool, str]:
         if value >= self.minimum:
@@ -864,14 +1278,14 @@ class ImpactEnergyLimit:
                 f"[PASS] Impact Energy value is {value}, meets the "
                 f"minimum limit {self.minimum} {self.unit}."
             )
-            print(message)
+            VerificationAuditLog.echo(message)
             return True, message
         else:
             message = (
                 f"[FAIL] Impact Energy value is {value}, meets the "
                 f"minimum limit {self.minimum} {self.unit}."
             )
-            print(message)
+            VerificationAuditLog.echo(message)
             return False, message
 
 
@@ -901,18 +1315,21 @@ class ImpactEnergyLimits:  # The impact energy limits belong to the same grade
     ):
         self.thickness_direction_map[thickness_range][direction] = impact_energy_limit
 
-    def get_limit(self, thickness: Union[float, int], direction: Direction) -> ImpactEnergyLimit:
-        # limit = None
+    @staticmethod
+    def get_thickness_range(thickness: Union[float, int]) -> Tuple[int, int]:
         if 0 <= thickness <= 50:
-            limit = self.thickness_direction_map[(0, 50)][direction]
+            return 0, 50
         elif 50 < thickness <= 70:
-            limit = self.thickness_direction_map[(50, 70)][direction]
+            return 50, 70
         elif 70 < thickness <= 150:
-            limit = self.thickness_direction_map[(70, 150)][direction]
+            return 70, 150
         else:
             raise ValueError(
                 f"The thickness value {thickness} is out of the predefined acceptable range 0 - 150 mm."
             )
+
+    def get_limit(self, thickness: Union[float, int], direction: Direction) -> ImpactEnergyLimit:
+        limit = self.thickness_direction_map[ImpactEnergyLimits.get_thickness_range(thickness)][direction]
         if limit is None:
             raise ValueError(
                 f"Could not impact energy limit for thickness {thickness}, direction {direction}."
@@ -1159,34 +1576,43 @@ class MechanicalLimits:
         tensile_strength: TensileStrength,
         elongation: Elongation,
         temperature: Temperature,
-        impact_energy_list: List[ImpactEnergy]
+        impact_energy_list: List[ImpactEnergy],
+        pdf_path: str = None,
+        serial_number: int = None,
+        compact_messages: bool = False,
+        short_circuit: bool = False
     ) -> bool:
-        all_pass_flag = True
         mechanical_limit = self.grade_mechanical_limits_map[grade]
-        # verify yield strength
-        yield_strength.valid_flag, yield_strength.message = mechanical_limit.yield_strength_limit.verify(
-            yield_strength.value)
-        all_pass_flag = all_pass_flag and yield_strength.valid_flag
-        # verify tensile strength
-        tensile_strength.valid_flag, tensile_strength.message = mechanical_limit.tensile_strength_limit.verify(
-            tensile_strength.value
-        )
-        all_pass_flag = all_pass_flag and tensile_strength.valid_flag
-        # verify elongation
-        elongation.valid_flag, elongation.message = mechanical_limit.elongation_limit.verify(
-            elongation.value
-        )
-        all_pass_flag = all_pass_flag and elongation.valid_flag
-        # verify temperature
-        temperature.valid_flag, temperature.message = mechanical_limit.temperature_limit.verify(
-            temperature.value
-        )
-        all_pass_flag = all_pass_flag and temperature.valid_flag
-        # verify impact energy
         impact_energy_limit = mechanical_limit.impact_energy_limits.get_limit(thickness=thickness, direction=direction)
-        for impact_energy in impact_energy_list:
-            impact_energy.valid_flag, impact_energy.message = impact_energy_limit.verify(impact_energy.value)
-            all_pass_flag = all_pass_flag and impact_energy.valid_flag
+        checks = [
+            ('yield_strength', yield_strength, mechanical_limit.yield_strength_limit),
+            ('tensile_strength', tensile_strength, mechanical_limit.tensile_strength_limit),
+            ('elongation', elongation, mechanical_limit.elongation_limit),
+            ('temperature', temperature, mechanical_limit.temperature_limit)
+        ]
+        checks += [('impact_energy', impact_energy, impact_energy_limit) for impact_energy in impact_energy_list]
+        failure_statistics = CheckFailureStatistics.get_singleton()
+        # short circuit stops at the first failing check, the most likely failures are checked first; sampled
+        # verifications evaluate every check and are the only ones feeding the failure statistics
+        record_checks = short_circuit and failure_statistics.sample()
+        if record_checks:
+            short_circuit = False
+        elif short_circuit:
+            checks = failure_statistics.order_by_failure_probability(checks)
+        all_pass_flag = True
+        for check, element, limit in checks:
+            # compact messages keep only the template id and the value, and are not printed
+            if compact_messages and hasattr(limit, 'verify_compact'):
+                element.valid_flag, element.message = limit.verify_compact(element.value)
+            else:
+                element.valid_flag, element.message = limit.verify(element.value)
+            VerificationAuditLog.submit(pdf_path, serial_number, element.name, limit, element.valid_flag,
+                                        element.message)
+            if record_checks:
+                failure_statistics.record(check, element.valid_flag)
+            all_pass_flag = all_pass_flag and element.valid_flag
+            if short_circuit and not all_pass_flag:
+                break
 
         return all_pass_flag
 
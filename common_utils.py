@@ -1,7 +1,9 @@
-from typing import List, Tuple, Union
+import sys
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 from enum import Enum, unique
+from collections import defaultdict
 
-from certificate_verification import Direction
+from direction import Direction
 
 
 @unique
@@ -10,6 +12,139 @@ class TableSearchType(Enum):
     SPLIT_LINE_BREAK_START = 2  # split by line break (\n) and check if the first element matches the keyword
     REMOVE_LINE_BREAK_CONTAIN = 3  # remove all line breaks (\n) and check if contains the keyword
     SPLIT_LINE_BREAK_ALL_DIGIT = 4  # split by line break (\n) and check if all the elements are integer.
+    FUZZY_NGRAM = 5  # ignore spaces and line breaks, find the closest cell text within an edit distance of the keyword
+
+
+class NormalisedCell:
+
+    __slots__ = ('text', 'lines', 'compact_lines', 'joined', 'all_digit')
+
+    def __init__(self, text: str):
+        # Every fragment is interned, equal texts of different cells (and tables) are the same string object.
+        self.text = text
+        # stripped lines, including empty ones, as split('\n') gives them
+        self.lines = tuple(sys.intern(line.strip()) for line in text.split('\n'))
+        # non-empty lines without spaces, the texts of the fuzzy search
+        self.compact_lines = tuple(
+            sys.intern(line) for line in (line.replace(' ', '') for line in self.lines) if line != '')
+        self.joined = sys.intern(text.replace('\n', '').replace(' ', ''))
+        self.all_digit = all(map(str.isdigit, self.lines))
+
+    def __repr__(self):
+        return repr(self.text)
+
+
+class NormalisedTable:
+
+    def __init__(self, table: List[List[Union[str, None]]]):
+        # One pass over an extracted table, None cells stay None. Rows can be indexed and iterated like the raw table.
+        self.rows: List[List[Union[NormalisedCell, None]]] = [
+            [None if cell is None else NormalisedCell(cell) for cell in row] for row in table
+        ]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, row_index: int) -> List[Union[NormalisedCell, None]]:
+        return self.rows[row_index]
+
+    def __iter__(self) -> Iterator[List[Union[NormalisedCell, None]]]:
+        return iter(self.rows)
+
+    @staticmethod
+    def normalise(table: Union[List[List[Union[str, None]]], 'NormalisedTable']) -> 'NormalisedTable':
+        return table if isinstance(table, NormalisedTable) else NormalisedTable(table)
+
+
+class TableNgramIndex:
+
+    def __init__(self, table: Union[List[List[Union[str, None]]], NormalisedTable], max_joined_lines: int = 3):
+        # Candidate texts of every cell: each line and each run of up to max_joined_lines consecutive lines, with
+        # spaces removed, e.g. 'Yield\nStrength\n屈服强度' gives 'YieldStrength' among others.
+        self.candidates: List[Tuple[str, int, int]] = []
+        # bigram -> indexes of the candidates containing it
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for row_index, row in enumerate(table):
+            for col_index, cell in enumerate(row):
+                if cell is None:
+                    continue
+                if isinstance(cell, NormalisedCell):
+                    lines = cell.compact_lines
+                else:
+                    lines = [line for line in (line.replace(' ', '') for line in cell.split('\n')) if line != '']
+                texts = dict.fromkeys(
+                    ''.join(lines[start:end])
+                    for start in range(len(lines))
+                    for end in range(start + 1, min(len(lines), start + max_joined_lines) + 1)
+                )
+                for text in texts:
+                    candidate_index = len(self.candidates)
+                    self.candidates.append((text, row_index, col_index))
+                    for bigram in set(TableNgramIndex.bigrams(text)):
+                        self.postings[bigram].append(candidate_index)
+
+    @staticmethod
+    def bigrams(text: str) -> List[str]:
+        padded = f"\x02{text}\x03"
+        return [padded[index:index + 2] for index in range(len(padded) - 1)]
+
+    @staticmethod
+    def bounded_edit_distance(source: str, target: str, max_distance: int) -> Union[int, None]:
+        # Levenshtein distance, None as soon as it must exceed max_distance.
+        if abs(len(source) - len(target)) > max_distance:
+            return None
+        previous_row = list(range(len(target) + 1))
+        for source_index, source_char in enumerate(source, 1):
+            current_row = [source_index]
+            for target_index, target_char in enumerate(target, 1):
+                current_row.append(min(
+                    previous_row[target_index] + 1,
+                    current_row[target_index - 1] + 1,
+                    previous_row[target_index - 1] + (source_char != target_char)
+                ))
+            if min(current_row) > max_distance:
+                return None
+            previous_row = current_row
+        return previous_row[-1] if previous_row[-1] <= max_distance else None
+
+    def search(
+        self,
+        keyword: str,
+        max_distance: int = None,
+        confirmed_row: int = None,
+        confirmed_col: int = None
+    ) -> Tuple[Union[Tuple[int, int], None], float]:
+        keyword = keyword.replace('\n', '').replace(' ', '')
+        # short keywords such as chemical elements only tolerate spaces and line breaks
+        max_distance = len(keyword) // 4 if max_distance is None else max_distance
+        keyword_bigrams = set(TableNgramIndex.bigrams(keyword))
+        # an edit removes at most two bigrams, so closer candidates share at least this many bigrams with the keyword
+        minimum_shared = len(keyword_bigrams) - 2 * max_distance
+        if minimum_shared > 0:
+            shared_counts: Dict[int, int] = defaultdict(int)
+            for bigram in keyword_bigrams:
+                for candidate_index in self.postings.get(bigram, ()):
+                    shared_counts[candidate_index] += 1
+            candidate_indexes = [index for index, count in shared_counts.items() if count >= minimum_shared]
+        else:
+            candidate_indexes = range(len(self.candidates))
+        best = None
+        for candidate_index in candidate_indexes:
+            text, row_index, col_index = self.candidates[candidate_index]
+            if (confirmed_row is not None and row_index != confirmed_row) or \
+                    (confirmed_col is not None and col_index != confirmed_col):
+                continue
+            distance = TableNgramIndex.bounded_edit_distance(keyword, text, max_distance)
+            if distance is None:
+                continue
+            # the closest text wins, then the first cell in reading order like the other search types
+            rank = (distance, row_index, col_index)
+            if best is None or rank < best[0]:
+                best = (rank, max(len(keyword), len(text)))
+        if best is None:
+            return None, 0.0
+        (distance, row_index, col_index), length = best
+        return (row_index, col_index), 1 - distance / length if length else 1.0
 
 
 class CommonUtils:
@@ -17,28 +152,55 @@ class CommonUtils:
     chemical_elements_table = [
         'C', 'Si', 'Mn', 'P', 'S', 'Cr', 'Mo', 'Ni', 'Cu', 'Al', 'Nb', 'V', 'Ti', 'N', 'Ceq', 'Als', 'Alt'
     ]
+    chemical_element_bits = {element: 1 << index for index, element in enumerate(chemical_elements_table)}
+    # position direction value -> Direction, certificates repeat a handful of values such as '1/4W-C'
+    vl_direction_cache: Dict[str, Direction] = dict()
+    vl_direction_cache_size = 1024
 
     @staticmethod
     def search_table(
-        table: List[List[Union[str, None]]],
+        table: Union[List[List[Union[str, None]]], NormalisedTable],
         keyword: Union[str, None],
         search_type: TableSearchType = TableSearchType.SPLIT_LINE_BREAK_END,
         confirmed_row: int = None,
-        confirmed_col: int = None
-    ) -> Union[Tuple[int, int], None]:
+        confirmed_col: int = None,
+        ngram_index: TableNgramIndex = None,
+        max_distance: int = None,
+        with_confidence: bool = False
+    ) -> Union[Tuple[int, int], Tuple[Union[Tuple[int, int], None], float], None]:
+        # With with_confidence the result is (coordinates, confidence), exact search types have a confidence of 1.0.
+        # The fuzzy search reuses ngram_index when given, build it once to search the same table for many keywords.
+        if search_type == TableSearchType.FUZZY_NGRAM:
+            ngram_index = TableNgramIndex(table) if ngram_index is None else ngram_index
+            coordinates, confidence = ngram_index.search(keyword, max_distance, confirmed_row, confirmed_col)
+            return (coordinates, confidence) if with_confidence else coordinates
 
         # Define search methods:
-        search_methods = {
-            TableSearchType.SPLIT_LINE_BREAK_END:
-                lambda table_cell: table_cell is not None and table_cell.split('\n')[-1].strip() == keyword,
-            TableSearchType.SPLIT_LINE_BREAK_START:
-                lambda table_cell: table_cell is not None and table_cell.split('\n')[0].strip() == keyword,
-            TableSearchType.REMOVE_LINE_BREAK_CONTAIN:
-                lambda table_cell: table_cell is not None and keyword in table_cell.replace('\n', '').replace(' ', ''),
-            TableSearchType.SPLIT_LINE_BREAK_ALL_DIGIT:
-                lambda table_cell: table_cell is not None and all(
-                    map(lambda x: x.strip().isdigit(), table_cell.split('\n')))
-        }
+        if isinstance(table, NormalisedTable):
+            # the cells have been split, stripped and interned once, nothing is allocated per comparison
+            search_methods = {
+                TableSearchType.SPLIT_LINE_BREAK_END:
+                    lambda table_cell: table_cell is not None and table_cell.lines[-1] == keyword,
+                TableSearchType.SPLIT_LINE_BREAK_START:
+                    lambda table_cell: table_cell is not None and table_cell.lines[0] == keyword,
+                TableSearchType.REMOVE_LINE_BREAK_CONTAIN:
+                    lambda table_cell: table_cell is not None and keyword in table_cell.joined,
+                TableSearchType.SPLIT_LINE_BREAK_ALL_DIGIT:
+                    lambda table_cell: table_cell is not None and table_cell.all_digit
+            }
+        else:
+            search_methods = {
+                TableSearchType.SPLIT_LINE_BREAK_END:
+                    lambda table_cell: table_cell is not None and table_cell.split('\n')[-1].strip() == keyword,
+                TableSearchType.SPLIT_LINE_BREAK_START:
+                    lambda table_cell: table_cell is not None and table_cell.split('\n')[0].strip() == keyword,
+                TableSearchType.REMOVE_LINE_BREAK_CONTAIN:
+                    lambda table_cell: table_cell is not None and keyword in table_cell.replace('\n', '').replace(
+                        ' ', ''),
+                TableSearchType.SPLIT_LINE_BREAK_ALL_DIGIT:
+                    lambda table_cell: table_cell is not None and all(
+                        map(lambda x: x.strip().isdigit(), table_cell.split('\n')))
+            }
 
         coordinates = None
 
@@ -69,8 +231,25 @@ class CommonUtils:
                 if search_methods[search_type](cell):
                     coordinates = (confirmed_row, confirmed_col)
 
+        if with_confidence:
+            return coordinates, 0.0 if coordinates is None else 1.0
         return coordinates
 
+    @staticmethod
+    def chemical_element_mask(elements: Iterable[str], strict: bool = False) -> int:
+        # Bitmask over chemical_elements_table, unknown elements are ignored unless strict is True.
+        mask = 0
+        for element in elements:
+            bit = CommonUtils.chemical_element_bits.get(element)
+            if bit is None:
+                if strict:
+                    raise ValueError(
+                        f"The chemical element {element} is not registered in the chemical elements table."
+                    )
+            else:
+                mask |= bit
+        return mask
+
     @staticmethod
     def verify_chemical_element_limit(element: str, chemical_composition_limit: dict, element_calculated_value: float):
         if chemical_composition_limit['type'] == 'maximum':
@@ -140,4 +319,30 @@ class CommonUtils:
             raise ValueError(
                 f"The position direction value {position_direction_value} contains neither C (Transverse) nor "
                 f"L (Longitudinal), it is invalid."
-            )
\ No newline at end of file
+            )
+
+    @staticmethod
+    def translate_to_vl_directions(position_direction_values: Iterable[str]) -> List[Direction]:
+        # Translates a whole column, each distinct value once. All invalid values are reported in a single error.
+        cache = CommonUtils.vl_direction_cache
+        directions = []
+        errors: Dict[str, str] = dict()
+        for position_direction_value in position_direction_values:
+            direction = cache.get(position_direction_value)
+            if direction is None:
+                if position_direction_value in errors:
+                    continue
+                try:
+                    direction = CommonUtils.translate_to_vl_direction(position_direction_value)
+                except ValueError as error:
+                    errors[position_direction_value] = str(error)
+                    continue
+                if len(cache) >= CommonUtils.vl_direction_cache_size:
+                    cache.clear()
+                cache[position_direction_value] = direction
+            directions.append(direction)
+        if errors:
+            raise ValueError(
+                f"{len(errors)} invalid position direction values:\n" + '\n'.join(errors.values())
+            )
+        return directions
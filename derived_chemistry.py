@@ -0,0 +1,188 @@
+import weakref
+from array import array
+from typing import Dict, List, Tuple, Union
+
+from certificate_element import ChemicalElementValue, SteelPlate
+from certificate_verification import ChemicalCompositionLimit
+
+
+class DerivedQuantity:
+
+    def __init__(
+        self,
+        name: str,
+        coefficients: Dict[str, float],
+        precision: int,
+        required_elements: Tuple[str, ...] = ()
+    ):
+        # Every derived quantity is linear in the element contents: sum(coefficient * content).
+        self.name = name
+        self.coefficients = coefficients
+        self.precision = precision
+        self.required_elements = required_elements
+
+    def __repr__(self):
+        formula = ' + '.join(f"{coefficient:g}*{element}" for element, coefficient in self.coefficients.items())
+        return f"{self.name} = {formula}"
+
+
+class DerivedChemistryEngine:
+
+    # ################################ Singleton ################################ #
+    _singleton = None
+
+    @classmethod
+    def get_singleton(cls):
+        if not isinstance(cls._singleton, cls):
+            cls._singleton = cls()
+        return cls._singleton
+    # ################################ Singleton ################################ #
+
+    def __init__(self):
+        self.quantities: Dict[str, DerivedQuantity] = dict()
+        # every element a registered quantity is derived from
+        self.input_elements: List[str] = []
+        # plate -> (the element inputs the values were derived from, {quantity name: value}), entries disappear
+        # together with the plates; a plate whose inputs changed since is derived again
+        self.plate_cache: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.compose_quantities()
+
+    def register(self, quantity: DerivedQuantity):
+        self.quantities[quantity.name] = quantity
+        self.input_elements = sorted(set(self.input_elements) | set(quantity.coefficients))
+
+    def compose_quantities(self):
+        # compose Ceq (IIW) = C + Mn/6 + (Cr+Mo+V)/5 + (Ni+Cu)/15
+        self.register(DerivedQuantity(
+            name='Ceq',
+            coefficients={'C': 1, 'Mn': 1 / 6, 'Cr': 1 / 5, 'Mo': 1 / 5, 'V': 1 / 5, 'Ni': 1 / 15, 'Cu': 1 / 15},
+            precision=3,
+            required_elements=('C', 'Mn')
+        ))
+        # compose Pcm = C + Si/30 + (Mn+Cu+Cr)/20 + Ni/60 + Mo/15 + V/10 (+5B, boron is not reported)
+        self.register(DerivedQuantity(
+            name='Pcm',
+            coefficients={'C': 1, 'Si': 1 / 30, 'Mn': 1 / 20, 'Cu': 1 / 20, 'Cr': 1 / 20, 'Ni': 1 / 60, 'Mo': 1 / 15,
+                          'V': 1 / 10},
+            precision=3,
+            required_elements=('C', 'Si', 'Mn')
+        ))
+        # compose Al+Ti, a sum is only derived when every element of it is reported
+        self.register(DerivedQuantity(name='Al+Ti', coefficients={'Al': 1, 'Ti': 1}, precision=3,
+                                      required_elements=('Al', 'Ti')))
+        # compose Nb+V+Ti
+        self.register(DerivedQuantity(name='Nb+V+Ti', coefficients={'Nb': 1, 'V': 1, 'Ti': 1}, precision=3,
+                                      required_elements=('Nb', 'V', 'Ti')))
+
+    def plate_inputs(self, steel_plate: SteelPlate) -> Tuple:
+        # the reported contents the derived values depend on, missing contents are None
+        chemical_compositions = steel_plate.chemical_compositions
+        inputs = []
+        for element in self.input_elements:
+            chemical_element_value = chemical_compositions.get(element)
+            inputs.append(None if chemical_element_value is None or chemical_element_value.value is None
+                          else (chemical_element_value.value, chemical_element_value.precision))
+        return tuple(inputs)
+
+    @staticmethod
+    def element_columns(steel_plates: List[SteelPlate], elements: List[str]) -> Dict[str, Tuple[array, array]]:
+        # element -> (content column, presence column), missing contents are 0.0 with presence 0
+        columns = {element: (array('d', bytes(8 * len(steel_plates))), array('b', bytes(len(steel_plates))))
+                   for element in elements}
+        for plate_index, steel_plate in enumerate(steel_plates):
+            chemical_compositions = steel_plate.chemical_compositions
+            for element in elements:
+                chemical_element_value = chemical_compositions.get(element)
+                if chemical_element_value is not None and chemical_element_value.value is not None:
+                    values, presence = columns[element]
+                    values[plate_index] = chemical_element_value.calculated_value()
+                    presence[plate_index] = 1
+        return columns
+
+    def compute(self, steel_plates: List[SteelPlate], names: List[str] = None) \
+            -> Dict[str, List[Union[float, None]]]:
+        names = list(self.quantities) if names is None else names
+        for name in names:
+            if name not in self.quantities:
+                raise ValueError(f"The derived quantity {name} hasn't been registered.")
+        results: Dict[str, List[Union[float, None]]] = {name: [None] * len(steel_plates) for name in names}
+        pending_indexes = []
+        pending_values: List[Dict[str, Union[float, None]]] = []
+        for plate_index, steel_plate in enumerate(steel_plates):
+            inputs = self.plate_inputs(steel_plate)
+            cached = self.plate_cache.get(steel_plate)
+            if cached is None or cached[0] != inputs:
+                cached = (inputs, dict())
+                self.plate_cache[steel_plate] = cached
+            cached_values = cached[1]
+            if all(name in cached_values for name in names):
+                for name in names:
+                    results[name][plate_index] = cached_values[name]
+            else:
+                pending_indexes.append(plate_index)
+                pending_values.append(cached_values)
+        if not pending_indexes:
+            return results
+
+        pending_plates = [steel_plates[plate_index] for plate_index in pending_indexes]
+        elements = sorted({element for name in names for element in self.quantities[name].coefficients})
+        columns = DerivedChemistryEngine.element_columns(pending_plates, elements)
+        for name in names:
+            quantity = self.quantities[name]
+            # one pass over the whole column per element of the formula
+            total = array('d', bytes(8 * len(pending_plates)))
+            present_count = array('b', bytes(len(pending_plates)))
+            for element, coefficient in quantity.coefficients.items():
+                values, presence = columns[element]
+                total = array('d', map(lambda subtotal, value: subtotal + coefficient * value, total, values))
+                present_count = array('b', map(lambda count, present: count + present, present_count, presence))
+            valid = [count > 0 for count in present_count]
+            for element in quantity.required_elements:
+                valid = list(map(lambda flag, present: flag and present == 1, valid, columns[element][1]))
+            for pending_index, plate_index in enumerate(pending_indexes):
+                value = round(total[pending_index], quantity.precision) if valid[pending_index] else None
+                results[name][plate_index] = value
+                pending_values[pending_index][name] = value
+        return results
+
+    def invalidate(self, steel_plate: SteelPlate):
+        self.plate_cache.pop(steel_plate, None)
+
+    def attach(self, steel_plates: List[SteelPlate], names: List[str] = None, overwrite: bool = False):
+        # Store derived values as ChemicalElementValue so that the ChemicalCompositionLimit checks can use them, values
+        # reported by the certificate itself (e.g. Ceq) are kept unless overwrite is True. Missing element records of a
+        # verification are not reported values, the derived value takes their place.
+        results = self.compute(steel_plates, names)
+        for name, values in results.items():
+            precision = self.quantities[name].precision
+            for steel_plate, value in zip(steel_plates, values):
+                reported_value = steel_plate.chemical_compositions.get(name)
+                if value is None or (not overwrite and reported_value is not None and reported_value.value is not None):
+                    continue
+                steel_plate.chemical_compositions[name] = ChemicalElementValue(
+                    table_index=None,
+                    x_coordinate=None,
+                    y_coordinate=None,
+                    value=int(round(value * 10 ** precision)),
+                    index=None,
+                    element=name,
+                    precision=precision
+                )
+
+    def verify(self, steel_plates: List[SteelPlate], limits: Dict[str, ChemicalCompositionLimit]) -> List[bool]:
+        # Checks the derived limits of a whole certificate, without printing every message.
+        self.attach(steel_plates, names=list(limits))
+        all_pass_flags = [True] * len(steel_plates)
+        for name, limit in limits.items():
+            for plate_index, steel_plate in enumerate(steel_plates):
+                chemical_element_value = steel_plate.chemical_compositions.get(name)
+                # neither reported nor derivable, missing element records are shared and stay untouched
+                if chemical_element_value is None or chemical_element_value.value is None:
+                    if limit.is_mandatory():
+                        all_pass_flags[plate_index] = False
+                    continue
+                chemical_element_value.valid_flag, chemical_element_value.message = limit.verify_compact(
+                    chemical_element_value.calculated_value())
+                if not chemical_element_value.valid_flag:
+                    all_pass_flags[plate_index] = False
+        return all_pass_flags
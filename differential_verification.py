@@ -0,0 +1,562 @@
+import os
+import random
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Tuple, Union
+
+from certificate_element import Thickness, ChemicalElementValue, YieldStrength, TensileStrength, Elongation, \
+    Temperature, ImpactEnergy, SteelPlate
+from certificate_parsing import IncrementalCertificateParser
+from certificate_verification import Direction, ChemicalCompositionLimitsForHighStrengthSteel, \
+    HullStructureSteelPlateLimit, HullStructureSteelPlateLimits, HullStructureSteelPlateLimitsForSteelPlant, \
+    MechanicalLimits, MissingChemicalElements
+from limit_simulation import HistoricalPlateData, LimitSet, LimitSimulation
+from plate_batch import PlateBatchBuilder
+from shared_limit_tables import SharedLimitTables
+
+# A verification path takes a generated case and returns (element, valid_flag, message) for every checked element.
+# Paths which do not build messages return None as message, only their valid_flag is compared then.
+VerificationOutcome = List[Tuple[str, bool, Union[str, None]]]
+VerificationPath = Callable[[dict], VerificationOutcome]
+
+CHEMICAL = 'chemical'
+STEEL_PLATE = 'steel_plate'
+MECHANICAL = 'mechanical'
+PARSING = 'parsing'
+# the chemical verdict of a whole plate, mandatory elements and the fine grain combination of its steel plant
+PLATE = 'plate'
+
+_THICKNESS_BAND_EDGES = (0, 50, 70, 150)
+_MECHANICAL_CHECKS = (
+    ('yield_strength', YieldStrength),
+    ('tensile_strength', TensileStrength),
+    ('elongation', Elongation),
+    ('temperature', Temperature)
+)
+_DELIVERY_CONDITIONS = ('N', 'NR', 'TM', 'AR')
+# (header, precision) of the generated chemical element columns
+_CHEMICAL_COLUMNS = (('C', 2), ('Mn', 2), ('N', 3))
+# Cases of past bugs, run ahead of the generated cases. Every path has to reach their expected verdict.
+_REGRESSION_CASES: Dict[str, List[dict]] = {
+    CHEMICAL: [
+        # Mn 1.90 violates both the normal range 0.90 - 1.60 and the alternative range 0.70 - 1.60 of t <= 12.5 mm
+        {'grade': 'VL D36', 'element': 'Mn', 'value': 190, 'precision': 2, 'thickness': 10, 'chemical_elements': [],
+         'expected_verdict': False},
+        {'grade': 'VL D36', 'element': 'Mn', 'value': 80, 'precision': 2, 'thickness': 10, 'chemical_elements': [],
+         'expected_verdict': True}
+    ],
+    PLATE: [
+        # the same Mn 1.90 plate, the object verification passed it while the limit simulation failed it
+        {'steel_plant': 'BAOSHAN IRON & STEEL CO., LTD.', 'grade': 'VL D36', 'delivery_condition': 'TM',
+         'thickness': 10, 'chemical_compositions': {
+             'C': (15, 2), 'Si': (30, 2), 'Mn': (190, 2), 'P': (15, 3), 'S': (5, 3), 'Cr': (2, 2), 'Mo': (1, 2),
+             'Ni': (1, 2), 'Cu': (1, 2), 'Al': (30, 3), 'Nb': (25, 3), 'Ti': (12, 3), 'N': (4, 3)
+         }, 'expected_verdict': False}
+    ]
+}
+
+
+class BoundaryCaseGenerator:
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+
+    def near(self, boundary: Union[float, int], step: Union[float, int]) -> Union[float, int]:
+        # Mostly exactly on or one/two steps around the boundary, sometimes further away.
+        offset = self.random.choice([-2, -1, 0, 0, 1, 2, self.random.randint(-20, 20)])
+        return boundary + offset * step
+
+    def chemical_cases(self, count: int) -> List[dict]:
+        # A third of the cases are around an alternative limit and its thickness maximum / required element.
+        chemical_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        grade_limit_map = chemical_limits.grade_chemical_element_normal_limit_map
+        limits = [(grade, element, limit) for grade, element_limit_map in grade_limit_map.items()
+                  for element, limit in element_limit_map.items()]
+        alternative_limit_map = chemical_limits.grade_chemical_element_alternative_limit_map
+        alternative_limits = [
+            (grade, element, alternative_limit)
+            for grade, element_alternative_limits in alternative_limit_map.items()
+            for element, element_alternatives in element_alternative_limits.items()
+            for alternative_limit in element_alternatives
+        ]
+        cases = []
+        for _ in range(count):
+            precision = 3
+            if alternative_limits and self.random.random() < 0.3:
+                grade, element, alternative_limit = self.random.choice(alternative_limits)
+                limit = grade_limit_map[grade][element]
+                candidate_limits = [limit, alternative_limit.limit]
+                thickness = self.random.choice([10, 30]) if alternative_limit.thickness_maximum is None \
+                    else self.near(alternative_limit.thickness_maximum, 0.5)
+                chemical_elements = [] if alternative_limit.required_element is None or self.random.random() < 0.3 \
+                    else [alternative_limit.required_element]
+            else:
+                grade, element, limit = self.random.choice(limits)
+                candidate_limits = [limit]
+                thickness = self.random.choice([10, 12.5, 13, 40])
+                chemical_elements = ['Al'] if self.random.random() < 0.5 else []
+            boundaries = [bound for candidate_limit in candidate_limits
+                          for bound in (candidate_limit.minimum, candidate_limit.maximum) if bound is not None]
+            units = max(0, int(round(self.near(self.random.choice(boundaries), 10 ** -precision) * 10 ** precision)))
+            cases.append({
+                'grade': grade,
+                'element': element,
+                'value': units,
+                'precision': precision,
+                'thickness': thickness,
+                'chemical_elements': chemical_elements
+            })
+        return cases
+
+    def steel_plate_cases(self, count: int) -> List[dict]:
+        steel_plate_limits = HullStructureSteelPlateLimits.get_singleton()
+        combinations = []
+        for steel_plant, plant_limits in steel_plate_limits.load_all_steel_plants().items():
+            for grade, delivery_condition_map in plant_limits.limits.items():
+                for delivery_condition, combination_map in delivery_condition_map.items():
+                    for combination, steel_plate_limit in combination_map.items():
+                        combinations.append((steel_plant, grade, delivery_condition, steel_plate_limit))
+        chemical_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        cases = []
+        for _ in range(count):
+            steel_plant, grade, delivery_condition, steel_plate_limit = self.random.choice(combinations)
+            thickness = self.near(steel_plate_limit.thickness_limit.maximum, self.random.choice([1, 0.5]))
+            chemical_compositions = dict()
+            for element, limit in chemical_limits.get_limits_by_specification(grade).items():
+                # randomly drop fine grain elements so every combination gets selected
+                if not limit.is_mandatory() and self.random.random() < 0.3:
+                    continue
+                boundaries = [bound for bound in (limit.minimum, limit.maximum) if bound is not None]
+                units = max(0, int(round(self.near(self.random.choice(boundaries), 0.001) * 1000)))
+                chemical_compositions[element] = (units, 3)
+            cases.append({
+                'steel_plant': steel_plant,
+                'grade': grade,
+                'delivery_condition': delivery_condition,
+                'thickness': thickness,
+                'chemical_compositions': chemical_compositions
+            })
+        return cases
+
+    def mechanical_cases(self, count: int) -> List[dict]:
+        mechanical_limits = MechanicalLimits.get_singleton()
+        grades = list(mechanical_limits.grade_mechanical_limits_map)
+        cases = []
+        for _ in range(count):
+            grade = self.random.choice(grades)
+            mechanical_limit = mechanical_limits.grade_mechanical_limits_map[grade]
+            band_edge = self.random.choice(_THICKNESS_BAND_EDGES)
+            thickness = min(150, max(0, self.near(band_edge, self.random.choice([1, 0.5]))))
+            direction = self.random.choice([Direction.TRANSVERSE, Direction.LONGITUDINAL])
+            impact_minimum = mechanical_limit.impact_energy_limits.get_limit(thickness, direction).minimum
+            cases.append({
+                'grade': grade,
+                'thickness': thickness,
+                'direction': direction,
+                'yield_strength': self.near(mechanical_limit.yield_strength_limit.minimum, 1),
+                'tensile_strength': self.near(self.random.choice([mechanical_limit.tensile_strength_limit.minimum,
+                                                                  mechanical_limit.tensile_strength_limit.maximum]), 1),
+                'elongation': self.near(mechanical_limit.elongation_limit.minimum, 1),
+                'temperature': self.near(mechanical_limit.temperature_limit.unique_value, 1),
+                'impact_energy_list': [self.near(impact_minimum, 1) for _ in range(3)]
+            })
+        return cases
+
+    def certificate_table_cases(self, count: int) -> List[dict]:
+        # Certificates with a delivery condition column, whose 'N' cells must not be taken for the nitrogen header,
+        # '-' for values that were not measured and, sometimes, the plate rows continued on a second page.
+        cases = []
+        for _ in range(count):
+            header_rows = [
+                ['No.', 'Delivery\nCondition', *(f"{element}\nx{10 ** precision}" for element, precision in
+                                                 _CHEMICAL_COLUMNS), 'Yield\nStrength', 'Impact\nEnergy', None, None],
+                ['', '', '', '', '', 'MPa', 'J', None, None]
+            ]
+            if self.random.random() < 0.5:
+                header_rows.insert(0, ['MILL TEST CERTIFICATE', None, None, None, None, None, None, None, None])
+            rows = []
+            plates = []
+            for serial_number in range(1, self.random.randint(1, 6) + 1):
+                delivery_condition = self.random.choice(_DELIVERY_CONDITIONS)
+                row = [str(serial_number), delivery_condition]
+                plate = {'serial_number': serial_number, 'delivery_condition': delivery_condition,
+                         'chemical_compositions': dict()}
+                for element, precision in _CHEMICAL_COLUMNS:
+                    if self.random.random() < 0.2:
+                        row.append('-')
+                        continue
+                    units = self.random.randint(1, 200)
+                    row.append(str(units))
+                    plate['chemical_compositions'][element] = round(units * (10 ** -precision), precision)
+                yield_strength = None if self.random.random() < 0.2 else self.random.randint(300, 500)
+                row.append('-' if yield_strength is None else str(yield_strength))
+                plate['yield_strength'] = yield_strength
+                impact_energies = [None if self.random.random() < 0.1 else self.random.randint(20, 200)
+                                   for _ in range(3)]
+                row.extend('-' if value is None else str(value) for value in impact_energies)
+                plate['impact_energies'] = [value for value in impact_energies if value is not None]
+                rows.append(row)
+                plates.append(plate)
+            split = self.random.randint(1, len(rows))
+            tables = [header_rows + rows[:split]]
+            if rows[split:]:
+                tables.append(rows[split:])
+            cases.append({'tables': tables, 'plates': plates})
+        return cases
+
+
+class DifferentialVerificationHarness:
+
+    def __init__(self, seed: int = 0):
+        self.generator = BoundaryCaseGenerator(seed)
+        self.reference_paths: Dict[str, VerificationPath] = {
+            CHEMICAL: DifferentialVerificationHarness.reference_chemical,
+            STEEL_PLATE: DifferentialVerificationHarness.reference_steel_plate,
+            MECHANICAL: DifferentialVerificationHarness.reference_mechanical,
+            PARSING: DifferentialVerificationHarness.reference_parsing,
+            PLATE: DifferentialVerificationHarness.reference_plate
+        }
+        self.optimised_paths: Dict[str, Dict[str, VerificationPath]] = {
+            CHEMICAL: dict(),
+            STEEL_PLATE: dict(),
+            MECHANICAL: dict(),
+            PARSING: dict(),
+            PLATE: dict()
+        }
+        self.case_generators = {
+            CHEMICAL: self.generator.chemical_cases,
+            STEEL_PLATE: self.generator.steel_plate_cases,
+            MECHANICAL: self.generator.mechanical_cases,
+            PARSING: self.generator.certificate_table_cases,
+            PLATE: self.generator.steel_plate_cases
+        }
+        self.register_default_paths()
+
+    def register(self, kind: str, name: str, path: VerificationPath):
+        if kind not in self.optimised_paths:
+            raise ValueError(f"The verification kind {kind} is invalid, expected one of {list(self.optimised_paths)}.")
+        self.optimised_paths[kind][name] = path
+
+    def register_default_paths(self):
+        self.register(STEEL_PLATE, 'fine_grain_bitsets', DifferentialVerificationHarness.bitset_steel_plate)
+        self.register(CHEMICAL, 'compact_messages', DifferentialVerificationHarness.compact_chemical)
+        self.register(MECHANICAL, 'compact_messages', DifferentialVerificationHarness.compact_mechanical)
+        shared_limit_tables = SharedLimitTables(SharedLimitTables.compile())
+        self.register(CHEMICAL, 'shared_limit_tables',
+                      lambda case: DifferentialVerificationHarness.shared_table_chemical(shared_limit_tables, case))
+        self.register(MECHANICAL, 'shared_limit_tables',
+                      lambda case: DifferentialVerificationHarness.shared_table_mechanical(shared_limit_tables, case))
+        self.register(PARSING, 'incremental_parser', DifferentialVerificationHarness.incremental_parsing)
+        self.register(PARSING, 'plate_batch', DifferentialVerificationHarness.plate_batch_parsing)
+        current_limit_set = LimitSet.current()
+        self.register(PLATE, 'limit_simulation',
+                      lambda case: DifferentialVerificationHarness.simulated_plate(current_limit_set, case))
+
+    # ################################ Reference paths ################################ #
+    @staticmethod
+    def verify_chemical_case(case: dict, compact_messages: bool = False) -> VerificationOutcome:
+        # only the element of the case is checked, the other reported elements select its alternative limits
+        chemical_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        chemical_compositions = {
+            element: ChemicalElementValue(None, None, None, 0, None, element, case['precision'])
+            for element in case['chemical_elements']
+        }
+        chemical_compositions[case['element']] = ChemicalElementValue(
+            None, None, None, case['value'], None, case['element'], case['precision'])
+        verdict = chemical_limits.verify(
+            specification=case['grade'],
+            thickness=case['thickness'],
+            chemical_compositions=chemical_compositions,
+            pdf_path='differential.pdf',
+            limits={case['element']: chemical_limits.locate(case['grade'], case['element'])},
+            only_mandatory=False,
+            compact_messages=compact_messages
+        )
+        chemical_element_value = chemical_compositions[case['element']]
+        message = chemical_element_value.message
+        # the verdict of the plate closes the outcome, as for the mechanical checks
+        return [(case['element'], chemical_element_value.valid_flag,
+                 message if message is None or not compact_messages else str(message)),
+                ('verdict', verdict, None)]
+
+    @staticmethod
+    def reference_chemical(case: dict) -> VerificationOutcome:
+        return DifferentialVerificationHarness.verify_chemical_case(case)
+
+    @staticmethod
+    def build_chemical_compositions(case: dict) -> Dict[str, ChemicalElementValue]:
+        return {
+            element: ChemicalElementValue(None, None, None, value, None, element, precision)
+            for element, (value, precision) in case['chemical_compositions'].items()
+        }
+
+    @staticmethod
+    def collect_steel_plate_outcome(thickness: Thickness, chemical_compositions: Dict[str, ChemicalElementValue]) \
+            -> VerificationOutcome:
+        outcome = [(thickness.name, thickness.valid_flag, thickness.message)]
+        for element in sorted(chemical_compositions):
+            chemical_element_value = chemical_compositions[element]
+            outcome.append((element, chemical_element_value.valid_flag, chemical_element_value.message))
+        return outcome
+
+    @staticmethod
+    def reference_select_limit(element_combinations: Dict[Tuple[str, ...], HullStructureSteelPlateLimit],
+                               chemical_compositions: Dict[str, ChemicalElementValue]) -> HullStructureSteelPlateLimit:
+        # The element by element combination selection the bitset selection replaced.
+        best_combination = None
+        minimum_standard_combination = None
+        for combination in element_combinations:
+            if minimum_standard_combination is None or len(combination) < len(minimum_standard_combination):
+                minimum_standard_combination = combination
+            if all(map(lambda x: x in chemical_compositions, combination)):
+                if best_combination is None or len(combination) > len(best_combination):
+                    best_combination = combination
+        return element_combinations[minimum_standard_combination if best_combination is None else best_combination]
+
+    @staticmethod
+    def reference_steel_plate(case: dict) -> VerificationOutcome:
+        plant_limits = HullStructureSteelPlateLimits.get_singleton().get_limits_by_steel_plant(case['steel_plant'])
+        chemical_compositions = DifferentialVerificationHarness.build_chemical_compositions(case)
+        thickness = Thickness(None, None, None, case['thickness'])
+        limit = DifferentialVerificationHarness.reference_select_limit(
+            plant_limits.limits[case['grade']][case['delivery_condition']], chemical_compositions)
+        limit.verify(
+            specification=case['grade'],
+            thickness=thickness,
+            chemical_compositions=chemical_compositions,
+            pdf_path='differential.pdf'
+        )
+        return DifferentialVerificationHarness.collect_steel_plate_outcome(thickness, chemical_compositions)
+
+    @staticmethod
+    def reference_plate(case: dict) -> VerificationOutcome:
+        # the chemistry of a plate as a batch run verifies it
+        steel_plate = SteelPlate(serial_number=1)
+        steel_plate.chemical_compositions = DifferentialVerificationHarness.build_chemical_compositions(case)
+        missing_elements = MissingChemicalElements('differential.pdf')
+        verdict = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton().verify(
+            specification=case['grade'],
+            thickness=case['thickness'],
+            chemical_compositions=steel_plate.chemical_compositions,
+            pdf_path='differential.pdf',
+            missing_elements=missing_elements
+        )
+        plant_limits = HullStructureSteelPlateLimits.get_singleton().get_limits_by_steel_plant(case['steel_plant'])
+        verdict = plant_limits.verify_plates(
+            specification=case['grade'],
+            delivery_condition=case['delivery_condition'],
+            thickness=Thickness(None, None, None, case['thickness']),
+            steel_plates=[steel_plate],
+            pdf_path='differential.pdf',
+            missing_elements=missing_elements
+        )[0] and verdict
+        return [('verdict', verdict, None)]
+
+    @staticmethod
+    def build_mechanical_arguments(case: dict) -> dict:
+        arguments = {'grade': case['grade'], 'thickness': case['thickness'], 'direction': case['direction']}
+        for check, element_class in _MECHANICAL_CHECKS:
+            arguments[check] = element_class(None, None, None, None, case[check])
+        arguments['impact_energy_list'] = [
+            ImpactEnergy(None, None, None, None, test_number, value)
+            for test_number, value in enumerate(case['impact_energy_list'], start=1)
+        ]
+        return arguments
+
+    @staticmethod
+    def collect_mechanical_outcome(arguments: dict, verdict: bool) -> VerificationOutcome:
+        # the verdict of the plate closes the outcome, paths deciding the plate as a whole are compared by it
+        outcome = [(check, arguments[check].valid_flag, arguments[check].message) for check, _ in _MECHANICAL_CHECKS]
+        for impact_energy in arguments['impact_energy_list']:
+            outcome.append((f"impact_energy_{impact_energy.test_number}", impact_energy.valid_flag,
+                            impact_energy.message))
+        outcome.append(('verdict', verdict, None))
+        return outcome
+
+    @staticmethod
+    def reference_mechanical(case: dict) -> VerificationOutcome:
+        arguments = DifferentialVerificationHarness.build_mechanical_arguments(case)
+        verdict = MechanicalLimits.get_singleton().verify(**arguments)
+        return DifferentialVerificationHarness.collect_mechanical_outcome(arguments, verdict)
+
+    @staticmethod
+    def reference_parsing(case: dict) -> VerificationOutcome:
+        # the parsed values are compared through the message, every parsed value is valid
+        outcome = []
+        for plate in case['plates']:
+            serial_number = plate['serial_number']
+            outcome.append((f"{serial_number} delivery_condition", True, repr(plate['delivery_condition'])))
+            for element in sorted(plate['chemical_compositions']):
+                outcome.append((f"{serial_number} {element}", True, repr(plate['chemical_compositions'][element])))
+            outcome.append((f"{serial_number} yield_strength", True, repr(plate['yield_strength'])))
+            outcome.append((f"{serial_number} impact_energy", True, repr(plate['impact_energies'])))
+        return outcome
+
+    @staticmethod
+    def collect_parsing_outcome(steel_plates: List[SteelPlate]) -> VerificationOutcome:
+        outcome = []
+        for steel_plate in steel_plates:
+            serial_number = steel_plate.serial_number
+            delivery_condition = None if steel_plate.delivery_condition is None \
+                else steel_plate.delivery_condition.value
+            outcome.append((f"{serial_number} delivery_condition", True, repr(delivery_condition)))
+            for element in sorted(steel_plate.chemical_compositions):
+                outcome.append((f"{serial_number} {element}", True,
+                                repr(steel_plate.chemical_compositions[element].calculated_value())))
+            yield_strength = None if steel_plate.yield_strength is None else steel_plate.yield_strength.value
+            outcome.append((f"{serial_number} yield_strength", True, repr(yield_strength)))
+            outcome.append((f"{serial_number} impact_energy", True,
+                            repr([impact_energy.value for impact_energy in steel_plate.impact_energy_list])))
+        return outcome
+
+    # ################################ Optimised paths ################################ #
+    @staticmethod
+    def bitset_steel_plate(case: dict) -> VerificationOutcome:
+        plant_limits: HullStructureSteelPlateLimitsForSteelPlant = \
+            HullStructureSteelPlateLimits.get_singleton().get_limits_by_steel_plant(case['steel_plant'])
+        steel_plate = SteelPlate(serial_number=1)
+        steel_plate.chemical_compositions = DifferentialVerificationHarness.build_chemical_compositions(case)
+        thickness = Thickness(None, None, None, case['thickness'])
+        plant_limits.verify_plates(
+            specification=case['grade'],
+            delivery_condition=case['delivery_condition'],
+            thickness=thickness,
+            steel_plates=[steel_plate],
+            pdf_path='differential.pdf'
+        )
+        return DifferentialVerificationHarness.collect_steel_plate_outcome(thickness, steel_plate.chemical_compositions)
+
+    @staticmethod
+    def compact_chemical(case: dict) -> VerificationOutcome:
+        return DifferentialVerificationHarness.verify_chemical_case(case, compact_messages=True)
+
+    @staticmethod
+    def compact_mechanical(case: dict) -> VerificationOutcome:
+        arguments = DifferentialVerificationHarness.build_mechanical_arguments(case)
+        verdict = MechanicalLimits.get_singleton().verify(**arguments, compact_messages=True)
+        outcome = DifferentialVerificationHarness.collect_mechanical_outcome(arguments, verdict)
+        return [(element, valid_flag, None if message is None else str(message))
+                for element, valid_flag, message in outcome]
+
+    @staticmethod
+    def shared_table_chemical(shared_limit_tables: SharedLimitTables, case: dict) -> VerificationOutcome:
+        value = round(case['value'] * (10 ** -case['precision']), case['precision'])
+        valid_flag = shared_limit_tables.verify_chemical_element(case['grade'], case['element'], value,
+                                                                 case['thickness'], case['chemical_elements'])
+        return [(case['element'], valid_flag, None), ('verdict', valid_flag, None)]
+
+    @staticmethod
+    def shared_table_mechanical(shared_limit_tables: SharedLimitTables, case: dict) -> VerificationOutcome:
+        limits = shared_limit_tables.get_mechanical_limits(case['grade'])
+        impact_minimum = shared_limit_tables.get_impact_energy_minimum(case['grade'], case['thickness'],
+                                                                       case['direction'])
+        outcome = [
+            ('yield_strength', case['yield_strength'] >= limits['yield_strength_minimum'], None),
+            ('tensile_strength', limits['tensile_strength_minimum'] <= case['tensile_strength'] <=
+             limits['tensile_strength_maximum'], None),
+            ('elongation', case['elongation'] >= limits['elongation_minimum'], None),
+            ('temperature', case['temperature'] == limits['temperature'], None)
+        ]
+        for test_number, value in enumerate(case['impact_energy_list'], start=1):
+            outcome.append((f"impact_energy_{test_number}", value >= impact_minimum, None))
+        outcome.append(('verdict', all(valid_flag for _, valid_flag, _ in outcome), None))
+        return outcome
+
+    @staticmethod
+    def simulated_plate(limit_set: LimitSet, case: dict) -> VerificationOutcome:
+        historical_plate_data = HistoricalPlateData()
+        element_values = {
+            element: round(value * (10 ** -precision), precision)
+            for element, (value, precision) in case['chemical_compositions'].items()
+        }
+        historical_plate_data.append(case['steel_plant'], case['grade'], case['delivery_condition'], case['thickness'],
+                                     element_values)
+        return [('verdict', LimitSimulation(historical_plate_data).evaluate(limit_set)[0], None)]
+
+    @staticmethod
+    def incremental_parsing(case: dict) -> VerificationOutcome:
+        return DifferentialVerificationHarness.collect_parsing_outcome(
+            list(IncrementalCertificateParser().parse(case['tables'])))
+
+    @staticmethod
+    def plate_batch_parsing(case: dict) -> VerificationOutcome:
+        return DifferentialVerificationHarness.collect_parsing_outcome(
+            list(PlateBatchBuilder().build(case['tables']).plates()))
+
+    # ################################ Run ################################ #
+    @staticmethod
+    def timed_run(path: VerificationPath, cases: List[dict]) -> Tuple[List[VerificationOutcome], float]:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            outcomes = [path(case) for case in cases]
+            elapsed = time.perf_counter() - start
+        return outcomes, elapsed
+
+    @staticmethod
+    def check_expected_verdict(case: dict, outcome: VerificationOutcome) -> List[str]:
+        if 'expected_verdict' not in case:
+            return []
+        verdicts = [valid_flag for element, valid_flag, _ in outcome if element == 'verdict']
+        if verdicts != [case['expected_verdict']]:
+            return [f"verdict: expected {case['expected_verdict']}, got {verdicts}"]
+        return []
+
+    @staticmethod
+    def diff(reference: VerificationOutcome, optimised: VerificationOutcome) -> List[str]:
+        differences = []
+        if [element for element, _, _ in reference] != [element for element, _, _ in optimised]:
+            return [f"checked elements differ: {[e for e, _, _ in reference]} vs {[e for e, _, _ in optimised]}"]
+        for (element, reference_flag, reference_message), (_, optimised_flag, optimised_message) in \
+                zip(reference, optimised):
+            if bool(reference_flag) != bool(optimised_flag):
+                differences.append(f"{element} valid_flag: {reference_flag} vs {optimised_flag}")
+            if optimised_message is not None and reference_message != optimised_message:
+                differences.append(f"{element} message: {reference_message!r} vs {optimised_message!r}")
+        return differences
+
+    def run(self, case_count: int = 1000, kinds: List[str] = None) -> 'DifferentialReport':
+        report = DifferentialReport()
+        for kind in kinds or list(self.reference_paths):
+            cases = _REGRESSION_CASES.get(kind, []) + self.case_generators[kind](case_count)
+            reference_outcomes, reference_elapsed = self.timed_run(self.reference_paths[kind], cases)
+            report.add_throughput(kind, 'reference', len(cases), reference_elapsed)
+            for case, reference_outcome in zip(cases, reference_outcomes):
+                for difference in self.check_expected_verdict(case, reference_outcome):
+                    report.mismatches.append((kind, 'reference', case, difference))
+            for name, path in self.optimised_paths[kind].items():
+                optimised_outcomes, optimised_elapsed = self.timed_run(path, cases)
+                report.add_throughput(kind, name, len(cases), optimised_elapsed, reference_elapsed)
+                for case, reference_outcome, optimised_outcome in zip(cases, reference_outcomes, optimised_outcomes):
+                    for difference in self.diff(reference_outcome, optimised_outcome) + \
+                            self.check_expected_verdict(case, optimised_outcome):
+                        report.mismatches.append((kind, name, case, difference))
+        return report
+
+
+class DifferentialReport:
+
+    def __init__(self):
+        self.throughput: List[Tuple[str, str, int, float, Union[float, None]]] = []
+        self.mismatches: List[Tuple[str, str, dict, str]] = []
+
+    def add_throughput(self, kind: str, name: str, case_count: int, elapsed: float, reference_elapsed: float = None):
+        speedup = None if reference_elapsed is None or elapsed == 0 else reference_elapsed / elapsed
+        self.throughput.append((kind, name, case_count, elapsed, speedup))
+
+    def is_consistent(self) -> bool:
+        return not self.mismatches
+
+    def __repr__(self):
+        lines = [f"{'kind':<12} {'path':<24} {'cases':>7} {'cases/s':>12} {'speedup':>8}"]
+        for kind, name, case_count, elapsed, speedup in self.throughput:
+            cases_per_second = case_count / elapsed if elapsed else float('inf')
+            speedup_repr = '-' if speedup is None else f"{speedup:.2f}x"
+            lines.append(f"{kind:<12} {name:<24} {case_count:>7} {cases_per_second:>12.0f} {speedup_repr:>8}")
+        lines.append(f"mismatches: {len(self.mismatches)}")
+        for kind, name, case, difference in self.mismatches[:20]:
+            lines.append(f"[{kind}/{name}] {difference} case={case}")
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    print(DifferentialVerificationHarness().run())
@@ -0,0 +1,7 @@
+from enum import Enum, unique
+
+
+@unique
+class Direction(Enum):
+    TRANSVERSE = 'Transverse'  # 横向
+    LONGITUDINAL = 'Longitudinal'  # 纵向
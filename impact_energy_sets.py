@@ -0,0 +1,145 @@
+from typing import Dict, List, Union
+
+from certificate_element import SteelPlate
+from certificate_verification import MechanicalLimits
+from common_utils import CommonUtils
+from direction import Direction
+
+Matrix = List[List[Union[int, float, None]]]
+
+
+class ImpactEnergySetResult:
+
+    def __init__(self, averages: List[Union[float, None]], minima: List[Union[int, float, None]],
+                 below_average_counts: List[int], below_single_counts: List[int], valid_flags: List[bool]):
+        # one entry per plate (row of the energy matrix)
+        self.averages = averages
+        self.minima = minima
+        self.below_average_counts = below_average_counts
+        self.below_single_counts = below_single_counts
+        self.valid_flags = valid_flags
+
+    def __repr__(self):
+        return f"ImpactEnergySetResult: plates: {len(self.valid_flags)}, failed: {self.valid_flags.count(False)}"
+
+
+class ImpactEnergySetEvaluator:
+
+    def __init__(self, test_count: int = 3, single_minimum_ratio: float = 0.7, maximum_below_average: int = 1):
+        # A set of test_count tests passes when its average meets the minimum, no single value is below
+        # single_minimum_ratio * minimum and at most maximum_below_average values are below the minimum.
+        self.test_count = test_count
+        self.single_minimum_ratio = single_minimum_ratio
+        self.maximum_below_average = maximum_below_average
+
+    def single_minimum(self, minimum: Union[int, float]) -> float:
+        return round(minimum * self.single_minimum_ratio, 1)
+
+    def evaluate(self, matrix: Matrix, minimums: List[Union[int, float]]) -> ImpactEnergySetResult:
+        # matrix is plates x test_number, missing tests are None; every step runs over whole test columns
+        plate_count = len(matrix)
+        if len(minimums) != plate_count:
+            raise ValueError(f"Got {len(minimums)} impact energy minimums for {plate_count} plates.")
+        columns = [
+            [row[test_index] if test_index < len(row) else None for row in matrix]
+            for test_index in range(self.test_count)
+        ]
+        single_minimums = [self.single_minimum(minimum) for minimum in minimums]
+        totals = [0] * plate_count
+        counts = [0] * plate_count
+        minima: List[Union[int, float, None]] = [None] * plate_count
+        below_average_counts = [0] * plate_count
+        below_single_counts = [0] * plate_count
+        for column in columns:
+            totals = [total if value is None else total + value for total, value in zip(totals, column)]
+            counts = [count if value is None else count + 1 for count, value in zip(counts, column)]
+            minima = [
+                minimum_value if value is None else value if minimum_value is None else min(minimum_value, value)
+                for minimum_value, value in zip(minima, column)
+            ]
+            below_average_counts = [
+                count + (value is not None and value < minimum)
+                for count, value, minimum in zip(below_average_counts, column, minimums)
+            ]
+            below_single_counts = [
+                count + (value is not None and value < single_minimum)
+                for count, value, single_minimum in zip(below_single_counts, column, single_minimums)
+            ]
+        averages = [round(total / count, 1) if count else None for total, count in zip(totals, counts)]
+        # an incomplete set can not be accepted
+        valid_flags = [
+            count == self.test_count and average >= minimum and below_single == 0
+            and below_average <= self.maximum_below_average
+            for count, average, minimum, below_single, below_average in zip(
+                counts, averages, minimums, below_single_counts, below_average_counts)
+        ]
+        return ImpactEnergySetResult(averages, minima, below_average_counts, below_single_counts, valid_flags)
+
+    def test_message(self, value: Union[int, float], average: Union[float, None], set_minimum: Union[int, float],
+                     minimum: Union[int, float], test_count: int, below_average_count: int, unit: str) -> str:
+        single_minimum = self.single_minimum(minimum)
+        if value < single_minimum:
+            return (
+                f"[FAIL] Impact Energy value is {value}, violates the single value minimum {single_minimum} {unit}."
+            )
+        if set_minimum < single_minimum:
+            return (
+                f"[FAIL] Impact Energy value is {value}, but the value {set_minimum} of the set violates the single "
+                f"value minimum {single_minimum} {unit}."
+            )
+        if test_count < self.test_count:
+            return (
+                f"[FAIL] Impact Energy value is {value}, but the set has {test_count} of the required "
+                f"{self.test_count} tests."
+            )
+        if average < minimum:
+            return (
+                f"[FAIL] Impact Energy value is {value}, the average {average} of the set violates the minimum "
+                f"average limit {minimum} {unit}."
+            )
+        if below_average_count > self.maximum_below_average:
+            return (
+                f"[FAIL] Impact Energy value is {value}, {below_average_count} values of the set are below the "
+                f"minimum average limit {minimum} {unit}, only {self.maximum_below_average} is allowed."
+            )
+        return (
+            f"[PASS] Impact Energy value is {value}, the average {average} of the set meets the minimum average "
+            f"limit {minimum} {unit} and the single value minimum {single_minimum} {unit}."
+        )
+
+    def evaluate_plates(self, grade: str, thickness: Union[float, int], steel_plates: List[SteelPlate],
+                        direction: Direction = None) -> List[bool]:
+        # Evaluates the impact test sets of a whole certificate and writes the outcome of its set into every
+        # ImpactEnergy of the plates. Without a direction it is translated from each plate's position direction.
+        impact_energy_limits = MechanicalLimits.get_singleton().grade_mechanical_limits_map[grade].impact_energy_limits
+        if direction is None:
+            for steel_plate in steel_plates:
+                if steel_plate.position_direction_impact is None:
+                    raise ValueError(
+                        f"The impact test direction of plate {steel_plate.serial_number} is unknown."
+                    )
+            directions = CommonUtils.translate_to_vl_directions(
+                [steel_plate.position_direction_impact.value for steel_plate in steel_plates])
+        else:
+            directions = [direction] * len(steel_plates)
+        matrix = []
+        limits = []
+        for steel_plate, plate_direction in zip(steel_plates, directions):
+            limits.append(impact_energy_limits.get_limit(thickness=thickness, direction=plate_direction))
+            impact_energies: Dict[int, Union[int, float]] = {
+                impact_energy.test_number: impact_energy.value for impact_energy in steel_plate.impact_energy_list
+            }
+            matrix.append([impact_energies[test_number] for test_number in sorted(impact_energies)])
+        result = self.evaluate(matrix, [limit.minimum for limit in limits])
+        for plate_index, steel_plate in enumerate(steel_plates):
+            valid_flag = result.valid_flags[plate_index]
+            limit = limits[plate_index]
+            test_count = len(matrix[plate_index])
+            for impact_energy in steel_plate.impact_energy_list:
+                impact_energy.message = self.test_message(
+                    impact_energy.value, result.averages[plate_index], result.minima[plate_index], limit.minimum,
+                    test_count, result.below_average_counts[plate_index], limit.unit
+                )
+                # the tests of a set are accepted or rejected together
+                impact_energy.valid_flag = valid_flag
+        return result.valid_flags
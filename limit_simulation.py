@@ -0,0 +1,291 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple, Union
+
+from certificate_element import SteelPlate
+from certificate_verification import LimitType, ChemicalCompositionLimitsForHighStrengthSteel, \
+    HullStructureSteelPlateLimits
+from common_utils import CommonUtils
+from result_store import VerificationResultStore
+
+# (steel plant, grade)
+GroupKey = Tuple[str, str]
+# (limit type, minimum, maximum, mandatory)
+ChemicalLimitTuple = Tuple[LimitType, float, float, bool]
+# (limit, thickness maximum, required element), see AlternativeChemicalCompositionLimit
+AlternativeLimitTuple = Tuple[ChemicalLimitTuple, Union[float, None], Union[str, None]]
+
+
+class HistoricalPlateData:
+
+    def __init__(self):
+        # one entry per plate
+        self.steel_plants: List[str] = []
+        self.grades: List[str] = []
+        self.delivery_conditions: List[str] = []
+        self.thicknesses: List[Union[float, int]] = []
+        # chemical element -> calculated content per plate, None when not reported
+        self.element_values: Dict[str, List[Union[float, None]]] = defaultdict(list)
+        # fine grain combination the verification selects for the plate, None when the plant has no limit for it
+        self.fine_grain_elements: List[Union[Tuple[str, ...], None]] = []
+
+    def __len__(self):
+        return len(self.grades)
+
+    def append(self, steel_plant: str, grade: str, delivery_condition: str, thickness: Union[float, int],
+               element_values: Dict[str, float]):
+        plate_index = len(self.grades)
+        hull_structure_steel_plate_limits = HullStructureSteelPlateLimits.get_singleton()
+        try:
+            # plates are grouped under the registered name of their steel plant, whatever alias the data uses
+            steel_plant = hull_structure_steel_plate_limits.resolve_steel_plant(steel_plant)
+        except ValueError:
+            pass
+        self.steel_plants.append(steel_plant)
+        self.grades.append(grade)
+        self.delivery_conditions.append(delivery_condition)
+        self.thicknesses.append(thickness)
+        for element, values in self.element_values.items():
+            values.append(element_values.get(element))
+        for element, value in element_values.items():
+            if element not in self.element_values:
+                self.element_values[element] = [None] * plate_index + [value]
+        # the combination only depends on the plate itself, so it is selected once when the data is loaded
+        try:
+            steel_plant_limits = hull_structure_steel_plate_limits.get_limits_by_steel_plant(steel_plant)
+            limit = steel_plant_limits.select_limit(
+                grade, delivery_condition, CommonUtils.chemical_element_mask(element_values))
+            self.fine_grain_elements.append(tuple(limit.fine_grain_elements))
+        except (ValueError, KeyError):
+            self.fine_grain_elements.append(None)
+
+    def add_plates(self, steel_plant: str, grade: str, delivery_condition: str, thickness: Union[float, int],
+                   steel_plates: Iterable[SteelPlate]):
+        for steel_plate in steel_plates:
+            plate_delivery_condition = delivery_condition if steel_plate.delivery_condition is None \
+                else steel_plate.delivery_condition.value
+            self.append(steel_plant, grade, plate_delivery_condition, thickness, {
+                element: chemical_element_value.calculated_value()
+                for element, chemical_element_value in steel_plate.chemical_compositions.items()
+                if chemical_element_value.value is not None
+            })
+
+    @staticmethod
+    def from_result_store(result_store: VerificationResultStore) -> 'HistoricalPlateData':
+        # A single ordered scan of the stored chemical element verdicts, pivoted into columns.
+        result_store.flush()
+        historical_plate_data = HistoricalPlateData()
+        cursor = result_store.connection.execute(
+            'SELECT plates.id, plates.steel_plant, plates.grade, plates.delivery_condition, certificates.thickness, '
+            'element_verdicts.element, element_verdicts.value FROM plates '
+            'JOIN certificates ON certificates.id = plates.certificate_id '
+            'LEFT JOIN element_verdicts ON element_verdicts.plate_id = plates.id '
+            'ORDER BY plates.id'
+        )
+        current_plate_id = None
+        current_plate = None
+        element_values: Dict[str, float] = dict()
+        for plate_id, steel_plant, grade, delivery_condition, thickness, element, value in cursor:
+            if plate_id != current_plate_id:
+                if current_plate is not None:
+                    historical_plate_data.append(*current_plate, element_values)
+                current_plate_id = plate_id
+                current_plate = (steel_plant, grade, delivery_condition, thickness)
+                element_values = dict()
+            if element in CommonUtils.chemical_element_bits and value is not None:
+                element_values[element] = value
+        if current_plate is not None:
+            historical_plate_data.append(*current_plate, element_values)
+        return historical_plate_data
+
+
+class LimitSet:
+
+    def __init__(self, name: str):
+        self.name = name
+        # grade -> element -> (limit type, minimum, maximum, mandatory)
+        self.chemical_limits: Dict[str, Dict[str, ChemicalLimitTuple]] = defaultdict(dict)
+        # grade -> element -> alternative limits, in the order they are tried
+        self.alternative_limits: Dict[str, Dict[str, List[AlternativeLimitTuple]]] = defaultdict(dict)
+        # (steel plant, grade, delivery condition, fine grain elements) -> maximum thickness
+        self.thickness_maximums: Dict[Tuple[str, str, str, Tuple[str, ...]], Union[float, int]] = dict()
+
+    def __repr__(self):
+        return f"LimitSet: {self.name}"
+
+    @staticmethod
+    def current() -> 'LimitSet':
+        # The limits composed by the verification singletons.
+        limit_set = LimitSet('current')
+        chemical_composition_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        for grade, element_limits in chemical_composition_limits.grade_chemical_element_normal_limit_map.items():
+            for element, limit in element_limits.items():
+                limit_set.chemical_limits[grade][element] = (limit.limit_type, limit.minimum, limit.maximum,
+                                                             limit.is_mandatory())
+        for grade, element_alternative_limits in \
+                chemical_composition_limits.grade_chemical_element_alternative_limit_map.items():
+            for element, alternative_limits in element_alternative_limits.items():
+                limit_set.alternative_limits[grade][element] = [
+                    ((alternative_limit.limit.limit_type, alternative_limit.limit.minimum,
+                      alternative_limit.limit.maximum, alternative_limit.limit.is_mandatory()),
+                     alternative_limit.thickness_maximum, alternative_limit.required_element)
+                    for alternative_limit in alternative_limits
+                ]
+        for steel_plant, steel_plant_limits in HullStructureSteelPlateLimits.get_singleton() \
+                .load_all_steel_plants().items():
+            for grade, delivery_condition_map in steel_plant_limits.limits.items():
+                for delivery_condition, combination_map in delivery_condition_map.items():
+                    for fine_grain_elements, limit in combination_map.items():
+                        limit_set.thickness_maximums[(steel_plant, grade, delivery_condition,
+                                                      tuple(fine_grain_elements))] = limit.thickness_limit.maximum
+        return limit_set
+
+    def copy(self, name: str) -> 'LimitSet':
+        limit_set = LimitSet(name)
+        for grade, element_limits in self.chemical_limits.items():
+            limit_set.chemical_limits[grade] = dict(element_limits)
+        for grade, element_alternative_limits in self.alternative_limits.items():
+            limit_set.alternative_limits[grade] = {
+                element: list(alternative_limits) for element, alternative_limits in element_alternative_limits.items()
+            }
+        limit_set.thickness_maximums = dict(self.thickness_maximums)
+        return limit_set
+
+    @staticmethod
+    def limit_type(element: str, minimum: float = None, maximum: float = None) -> LimitType:
+        if minimum is not None and maximum is not None:
+            return LimitType.RANGE
+        elif maximum is not None:
+            return LimitType.MAXIMUM
+        elif minimum is not None:
+            return LimitType.MINIMUM
+        else:
+            raise ValueError(f"Neither minimum nor maximum is given for the chemical element {element}.")
+
+    def set_chemical_limit(self, grades: Iterable[str], element: str, minimum: float = None, maximum: float = None):
+        # e.g. set_chemical_limit(grade_clusters[2], 'N', maximum=0.010), the mandatory flag is kept
+        limit_type = LimitSet.limit_type(element, minimum, maximum)
+        for grade in grades:
+            _, _, _, mandatory = self.chemical_limits[grade].get(element, (None, None, None, True))
+            self.chemical_limits[grade][element] = (limit_type, minimum, maximum, mandatory)
+
+    def set_alternative_limit(self, grades: Iterable[str], element: str, minimum: float = None, maximum: float = None,
+                              thickness_maximum: float = None, required_element: str = None):
+        # e.g. set_alternative_limit(grade_clusters[1], 'Mn', 0.70, 1.80, thickness_maximum=12.5), replaces the
+        # alternative limit with the same conditions, or adds one
+        limit_type = LimitSet.limit_type(element, minimum, maximum)
+        for grade in grades:
+            _, _, _, mandatory = self.chemical_limits[grade].get(element, (None, None, None, True))
+            alternative_limit = ((limit_type, minimum, maximum, mandatory), thickness_maximum, required_element)
+            alternative_limits = self.alternative_limits[grade].setdefault(element, [])
+            for index, (_, key_thickness_maximum, key_required_element) in enumerate(alternative_limits):
+                if key_thickness_maximum == thickness_maximum and key_required_element == required_element:
+                    alternative_limits[index] = alternative_limit
+                    break
+            else:
+                alternative_limits.append(alternative_limit)
+
+    def remove_alternative_limits(self, grades: Iterable[str], element: str):
+        for grade in grades:
+            self.alternative_limits[grade].pop(element, None)
+
+    def set_thickness_maximum(self, maximum: Union[float, int], steel_plant: str = None, grades: Iterable[str] = None,
+                              delivery_condition: str = None, fine_grain_elements: Tuple[str, ...] = None):
+        # Every matching thickness limit is moved, e.g. set_thickness_maximum(25, delivery_condition='AR').
+        grades = None if grades is None else set(grades)
+        if steel_plant is not None:
+            steel_plant = HullStructureSteelPlateLimits.get_singleton().resolve_steel_plant(steel_plant)
+        matched = False
+        for key in self.thickness_maximums:
+            key_steel_plant, key_grade, key_delivery_condition, key_fine_grain_elements = key
+            if (steel_plant is None or steel_plant == key_steel_plant) and (grades is None or key_grade in grades) \
+                    and (delivery_condition is None or delivery_condition == key_delivery_condition) \
+                    and (fine_grain_elements is None or tuple(fine_grain_elements) == key_fine_grain_elements):
+                self.thickness_maximums[key] = maximum
+                matched = True
+        if not matched:
+            raise ValueError("No thickness limit matches the given steel plant, grades and delivery condition.")
+
+
+class LimitSimulation:
+
+    def __init__(self, historical_plate_data: HistoricalPlateData):
+        self.data = historical_plate_data
+        self.plate_indexes_by_grade: Dict[str, List[int]] = defaultdict(list)
+        for plate_index, grade in enumerate(historical_plate_data.grades):
+            self.plate_indexes_by_grade[grade].append(plate_index)
+
+    @staticmethod
+    def check_column(values: List[Union[float, None]], limit: ChemicalLimitTuple) -> List[bool]:
+        limit_type, minimum, maximum, _ = limit
+        if limit_type == LimitType.MAXIMUM:
+            return [value is not None and value <= maximum for value in values]
+        elif limit_type == LimitType.MINIMUM:
+            return [value is not None and value >= minimum for value in values]
+        else:
+            return [value is not None and minimum <= value <= maximum for value in values]
+
+    def evaluate(self, limit_set: LimitSet) -> List[bool]:
+        # Per plate verdict of the mandatory elements of its grade, the fine grain elements of its combination and
+        # the thickness limit of the combination. Each element limit is applied to a whole grade column at once.
+        data = self.data
+        verdicts = [data.fine_grain_elements[plate_index] is not None for plate_index in range(len(data))]
+        for grade, plate_indexes in self.plate_indexes_by_grade.items():
+            element_alternative_limits = limit_set.alternative_limits.get(grade, dict())
+            for element, limit in limit_set.chemical_limits.get(grade, dict()).items():
+                alternative_limits = element_alternative_limits.get(element, ())
+                if limit[3]:
+                    checked_indexes = plate_indexes
+                else:
+                    checked_indexes = [
+                        plate_index for plate_index in plate_indexes
+                        if data.fine_grain_elements[plate_index] is not None
+                        and element in data.fine_grain_elements[plate_index]
+                    ]
+                if not checked_indexes:
+                    continue
+                element_values = data.element_values.get(element)
+                values = [None] * len(checked_indexes) if element_values is None \
+                    else [element_values[plate_index] for plate_index in checked_indexes]
+                for plate_index, value, flag in zip(checked_indexes, values, self.check_column(values, limit)):
+                    if flag or not verdicts[plate_index]:
+                        continue
+                    # the alternative limits only apply to the few violating plates, the first applying one is used
+                    verdicts[plate_index] = False
+                    if value is None or not alternative_limits:
+                        continue
+                    thickness = data.thicknesses[plate_index]
+                    for alternative_limit, thickness_maximum, required_element in alternative_limits:
+                        if (thickness_maximum is None or thickness <= thickness_maximum) and \
+                                (required_element is None or (required_element in data.element_values and
+                                                              data.element_values[required_element][plate_index]
+                                                              is not None)):
+                            verdicts[plate_index] = LimitSimulation.check_column([value], alternative_limit)[0]
+                            break
+        thickness_maximums = limit_set.thickness_maximums
+        for plate_index in range(len(data)):
+            fine_grain_elements = data.fine_grain_elements[plate_index]
+            if verdicts[plate_index] and fine_grain_elements is not None:
+                maximum = thickness_maximums.get((data.steel_plants[plate_index], data.grades[plate_index],
+                                                  data.delivery_conditions[plate_index], fine_grain_elements))
+                verdicts[plate_index] = maximum is not None and data.thicknesses[plate_index] <= maximum
+        return verdicts
+
+    def compare(self, baseline: LimitSet, alternative: LimitSet) -> Dict[GroupKey, Dict[str, int]]:
+        # (steel plant, grade) -> plates, passes under each limit set and the plates flipping either way
+        baseline_verdicts = self.evaluate(baseline)
+        alternative_verdicts = self.evaluate(alternative)
+        report: Dict[GroupKey, Dict[str, int]] = dict()
+        for plate_index, (baseline_verdict, alternative_verdict) in enumerate(
+                zip(baseline_verdicts, alternative_verdicts)):
+            key = (self.data.steel_plants[plate_index], self.data.grades[plate_index])
+            counts = report.get(key)
+            if counts is None:
+                counts = report[key] = {
+                    'plates': 0, 'baseline_passed': 0, 'alternative_passed': 0, 'pass_to_fail': 0, 'fail_to_pass': 0
+                }
+            counts['plates'] += 1
+            counts['baseline_passed'] += baseline_verdict
+            counts['alternative_passed'] += alternative_verdict
+            counts['pass_to_fail'] += baseline_verdict and not alternative_verdict
+            counts['fail_to_pass'] += alternative_verdict and not baseline_verdict
+        return report
@@ -0,0 +1,200 @@
+from array import array
+from typing import Dict, Iterator, List, Tuple, Union
+
+from certificate_element import SteelPlate, ChemicalElementValue, ImpactEnergy
+from certificate_parsing import Table, CertificateTableLayout, CertificateValueParser, IncrementalCertificateParser
+from common_utils import CommonUtils, TableSearchType, NormalisedTable
+
+# (table_index, row_index, col_index, line_index) of a value in the extracted tables
+Source = Tuple[int, int, int, int]
+
+
+class PlateBatch:
+
+    def __init__(self):
+        # one entry per serial number, in certificate order
+        self.serial_numbers = array('q')
+        self.table_indexes = array('l')
+        self.row_indexes = array('l')
+        self.line_indexes = array('l')
+        self.layout_indexes = array('l')
+        self.layouts: List[CertificateTableLayout] = []
+        # field -> value per plate, None when the certificate has no value for the plate
+        self.values: Dict[str, List[Union[int, float, str, None]]] = dict()
+        # chemical element -> precision per plate
+        self.precisions: Dict[str, List[Union[int, None]]] = dict()
+        # per plate (table_index, row_index, col_index, line_index, value) of every impact test, in test order
+        self.impact_energies: List[List[Tuple[int, int, int, int, Union[int, float]]]] = []
+        # values filled from rows without serial number are not located at the row of their plate
+        self.sources: Dict[Tuple[str, int], Source] = dict()
+        self.plate_cache: Dict[int, SteelPlate] = dict()
+
+    def __len__(self):
+        return len(self.serial_numbers)
+
+    def __repr__(self):
+        return f"PlateBatch: plates: {len(self)}, fields: {list(self.values)}"
+
+    def add_layout(self, layout: CertificateTableLayout) -> int:
+        if not self.layouts or self.layouts[-1] is not layout:
+            self.layouts.append(layout)
+        return len(self.layouts) - 1
+
+    def append_plate(self, serial_number: int, table_index: int, row_index: int, line_index: int,
+                     layout_index: int) -> int:
+        self.serial_numbers.append(serial_number)
+        self.table_indexes.append(table_index)
+        self.row_indexes.append(row_index)
+        self.line_indexes.append(line_index)
+        self.layout_indexes.append(layout_index)
+        for column in self.values.values():
+            column.append(None)
+        for column in self.precisions.values():
+            column.append(None)
+        self.impact_energies.append([])
+        return len(self.serial_numbers) - 1
+
+    def set_value(self, field: str, plate_index: int, value, precision: Union[int, None] = None):
+        column = self.values.get(field)
+        if column is None:
+            column = self.values[field] = [None] * len(self)
+            if field in CommonUtils.chemical_element_bits:
+                self.precisions[field] = [None] * len(self)
+        column[plate_index] = value
+        if field in self.precisions:
+            self.precisions[field][plate_index] = precision
+
+    # ################################ Columns ################################ #
+    def column(self, field: str) -> List[Union[int, float, str, None]]:
+        return self.values.get(field, [None] * len(self))
+
+    def chemical_column(self, element: str) -> List[Union[float, None]]:
+        # calculated contents, e.g. 15 with precision 2 -> 0.15
+        values = self.values.get(element)
+        if values is None:
+            return [None] * len(self)
+        return [
+            None if value is None else value / 10 ** precision
+            for value, precision in zip(values, self.precisions[element])
+        ]
+
+    def impact_energy_matrix(self, test_count: int = None) -> List[List[Union[int, float, None]]]:
+        # plates x test_number, missing tests are None
+        test_count = max(map(len, self.impact_energies), default=0) if test_count is None else test_count
+        return [
+            [test[4] for test in tests[:test_count]] + [None] * (test_count - len(tests[:test_count]))
+            for tests in self.impact_energies
+        ]
+
+    # ################################ Plates ################################ #
+    def source(self, field: str, plate_index: int) -> Source:
+        source = self.sources.get((field, plate_index))
+        if source is not None:
+            return source
+        layout = self.layouts[self.layout_indexes[plate_index]]
+        return (self.table_indexes[plate_index], self.row_indexes[plate_index], layout.columns[field][0],
+                self.line_indexes[plate_index])
+
+    def plate(self, plate_index: int) -> SteelPlate:
+        # The per value objects are only created when a plate is asked for, then reused.
+        steel_plate = self.plate_cache.get(plate_index)
+        if steel_plate is not None:
+            return steel_plate
+        steel_plate = SteelPlate(serial_number=self.serial_numbers[plate_index])
+        for field, column in self.values.items():
+            value = column[plate_index]
+            if value is None:
+                continue
+            table_index, row_index, col_index, line_index = self.source(field, plate_index)
+            if field in self.precisions:
+                steel_plate.chemical_compositions[field] = ChemicalElementValue(
+                    table_index, row_index, col_index, value, line_index, field, self.precisions[field][plate_index])
+            else:
+                element_class = IncrementalCertificateParser.single_value_fields[field]
+                setattr(steel_plate, field, element_class(table_index, row_index, col_index, line_index, value))
+        for test_number, (table_index, row_index, col_index, line_index, value) in enumerate(
+                self.impact_energies[plate_index], 1):
+            steel_plate.impact_energy_list.append(
+                ImpactEnergy(table_index, row_index, col_index, line_index, test_number, value))
+        self.plate_cache[plate_index] = steel_plate
+        return steel_plate
+
+    def plates(self) -> Iterator[SteelPlate]:
+        for plate_index in range(len(self)):
+            yield self.plate(plate_index)
+
+
+class PlateBatchBuilder:
+
+    def __init__(self, header_keywords: Dict[str, Tuple[str, TableSearchType]] = None, fuzzy_headers: bool = False):
+        self.header_keywords = header_keywords
+        self.fuzzy_headers = fuzzy_headers
+        self.layout: Union[CertificateTableLayout, None] = None
+        self.batch = PlateBatch()
+
+    @staticmethod
+    def slice_column(rows: NormalisedTable, col_index: int) -> List[List[str]]:
+        # every cell of the column is split once, the lines are then shared by all plates of the row
+        return [CertificateValueParser.split_cell(row[col_index] if col_index < len(row) else None) for row in rows]
+
+    def fill(self, plate_index: int, layout: CertificateTableLayout, column_lines: Dict[str, List[List[List[str]]]],
+             offset: int, table_index: int, row_index: int, line_index: int, line_count: int, continuation: bool):
+        batch = self.batch
+        for field, col_indexes in layout.columns.items():
+            if field == 'serial_number':
+                continue
+            if field == 'impact_energy':
+                for col_index, lines_list in zip(col_indexes, column_lines[field]):
+                    value = CertificateValueParser.parse_number(
+                        CertificateValueParser.line_value(lines_list[offset], line_index, line_count))
+                    if value is not None:
+                        batch.impact_energies[plate_index].append(
+                            (table_index, row_index, col_index, line_index, value))
+                continue
+            text = CertificateValueParser.line_value(column_lines[field][0][offset], line_index, line_count)
+            if CertificateValueParser.is_missing(text):
+                continue
+            if field in CommonUtils.chemical_element_bits:
+                value, precision = CertificateValueParser.parse_chemical_value(text, layout.precisions.get(field))
+                batch.set_value(field, plate_index, value, precision)
+            elif field in IncrementalCertificateParser.text_fields:
+                batch.set_value(field, plate_index, text)
+            else:
+                batch.set_value(field, plate_index, CertificateValueParser.parse_number(text))
+            if continuation:
+                batch.sources[(field, plate_index)] = (table_index, row_index, col_indexes[0], line_index)
+
+    def add_table(self, table_index: int, table: Table):
+        table = NormalisedTable.normalise(table)
+        layout = CertificateTableLayout.locate(table, table_index, self.header_keywords, self.fuzzy_headers)
+        if layout is None:
+            if self.layout is None:
+                return
+            layout = self.layout.continued_by(table_index)
+        self.layout = layout
+        layout_index = self.batch.add_layout(layout)
+        rows = table.rows[layout.first_data_row:]
+        column_lines = {
+            field: [PlateBatchBuilder.slice_column(rows, col_index) for col_index in col_indexes]
+            for field, col_indexes in layout.columns.items()
+        }
+        for offset, serial_number_lines in enumerate(column_lines['serial_number'][0]):
+            row_index = layout.first_data_row + offset
+            serial_number_lines = [line for line in serial_number_lines if line != '']
+            if not serial_number_lines:
+                # rows without serial number continue the last plate, e.g. further impact tests
+                if len(self.batch) > 0:
+                    self.fill(len(self.batch) - 1, layout, column_lines, offset, table_index, row_index, 0, 1, True)
+                continue
+            if not all(line.isdigit() for line in serial_number_lines):
+                continue
+            for line_index, serial_number in enumerate(serial_number_lines):
+                plate_index = self.batch.append_plate(int(serial_number), table_index, row_index, line_index,
+                                                      layout_index)
+                self.fill(plate_index, layout, column_lines, offset, table_index, row_index, line_index,
+                          len(serial_number_lines), False)
+
+    def build(self, tables: List[Table]) -> PlateBatch:
+        for table_index, table in enumerate(tables):
+            self.add_table(table_index, table)
+        return self.batch
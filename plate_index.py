@@ -0,0 +1,191 @@
+import hashlib
+import mmap
+import os
+import struct
+from enum import Enum, unique
+from typing import List, Tuple, Union
+
+from certificate_element import SteelPlate, SerialNumber
+from certificate_verification import HullStructureSteelPlateLimits
+
+
+# On-disk open addressing hash table, the file is mmap'd so a lookup touches one or a few slots only.
+#   header: magic | capacity | count
+#   slot:   plate key digest (16 bytes) | heat data hash | verdict | state
+# version 2 hashes normalised plant names and values, version 1 files are rejected instead of giving false conflicts
+_MAGIC = b'CMCPIDX2'
+_HEADER = struct.Struct('<8sQQ')
+_SLOT = struct.Struct('<16sQBB6x')
+_EMPTY_SLOT = 0
+_USED_SLOT = 1
+_MAXIMUM_LOAD_FACTOR = 0.7
+
+
+@unique
+class PlateLookupStatus(Enum):
+    NEW = 1  # the plate has never been verified
+    DUPLICATE = 2  # the plate has been verified with the same heat data, the stored verdict can be reused
+    CONFLICT = 3  # the plate has been verified before, but with different heat data
+
+
+class VerifiedPlateIndex:
+
+    def __init__(self, path: str, initial_capacity: int = 1 << 16):
+        self.path = path
+        if not os.path.exists(path):
+            capacity = 1
+            while capacity < initial_capacity:
+                capacity <<= 1
+            VerifiedPlateIndex.create_file(path, capacity)
+        self.file = None
+        self.data = None
+        self.capacity = 0
+        self.count = 0
+        self.open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def create_file(path: str, capacity: int):
+        with open(path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, capacity, 0))
+            file.truncate(_HEADER.size + capacity * _SLOT.size)
+
+    def open(self):
+        self.file = open(self.path, 'r+b')
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        magic, self.capacity, self.count = _HEADER.unpack_from(self.data, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"The file {self.path} is not a verified plate index of version {_MAGIC.decode()}.")
+
+    def close(self):
+        if self.data is not None:
+            self.data.flush()
+            self.data.close()
+            self.file.close()
+            self.data = None
+
+    # ################################ Hashing ################################ #
+    @staticmethod
+    def normalise_steel_plant(steel_plant: str) -> str:
+        # aliases of a registered steel plant share its plates, other names are compared in their normalised form
+        try:
+            return HullStructureSteelPlateLimits.get_singleton().resolve_steel_plant(steel_plant)
+        except ValueError:
+            return HullStructureSteelPlateLimits.normalise_steel_plant_name(steel_plant)
+
+    @staticmethod
+    def normalise_value(value) -> str:
+        # 400 and 400.0 are the same measurement, texts are compared without surrounding spaces
+        if isinstance(value, (int, float)):
+            return repr(float(value))
+        return str(value).strip()
+
+    @staticmethod
+    def plate_key(steel_plant: str, serial_number: int) -> bytes:
+        steel_plant = VerifiedPlateIndex.normalise_steel_plant(steel_plant)
+        return hashlib.blake2b(f"{steel_plant}\x00{int(serial_number)}".encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def heat_data_hash(steel_plate: SteelPlate) -> int:
+        parts = []
+        for element in sorted(steel_plate.chemical_compositions):
+            chemical_element_value = steel_plate.chemical_compositions[element]
+            # placeholders inserted for missing elements during verification are not part of the heat data; the
+            # calculated content is hashed, so 15e-2 and 150e-3 are the same heat data
+            if chemical_element_value.value is not None:
+                parts.append(
+                    f"{element}={VerifiedPlateIndex.normalise_value(chemical_element_value.calculated_value())}")
+        for certificate_element in (steel_plate.delivery_condition, steel_plate.yield_strength,
+                                    steel_plate.tensile_strength, steel_plate.elongation,
+                                    steel_plate.position_direction_impact, steel_plate.temperature):
+            if certificate_element is not None:
+                parts.append(
+                    f"{certificate_element.name}={VerifiedPlateIndex.normalise_value(certificate_element.value)}")
+        for impact_energy in steel_plate.impact_energy_list:
+            parts.append(f"{impact_energy.name}#{impact_energy.test_number}="
+                         f"{VerifiedPlateIndex.normalise_value(impact_energy.value)}")
+        digest = hashlib.blake2b('\n'.join(parts).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    # ################################ Hash table ################################ #
+    def find_slot(self, plate_key: bytes) -> Tuple[int, bool]:
+        # linear probing, returns the slot holding the key or the first empty slot
+        mask = self.capacity - 1
+        slot_index = int.from_bytes(plate_key[:8], 'little') & mask
+        while True:
+            slot_offset = _HEADER.size + slot_index * _SLOT.size
+            stored_key, _, _, state = _SLOT.unpack_from(self.data, slot_offset)
+            if state == _EMPTY_SLOT:
+                return slot_offset, False
+            if stored_key == plate_key:
+                return slot_offset, True
+            slot_index = (slot_index + 1) & mask
+
+    def grow(self):
+        old_data = self.data
+        old_capacity = self.capacity
+        new_path = self.path + '.grow'
+        VerifiedPlateIndex.create_file(new_path, old_capacity * 2)
+        with open(new_path, 'r+b') as new_file:
+            new_data = mmap.mmap(new_file.fileno(), 0)
+            new_mask = old_capacity * 2 - 1
+            for slot_index in range(old_capacity):
+                slot = old_data[_HEADER.size + slot_index * _SLOT.size:_HEADER.size + (slot_index + 1) * _SLOT.size]
+                if slot[_SLOT.size - 7] != _USED_SLOT:
+                    continue
+                new_slot_index = int.from_bytes(slot[:8], 'little') & new_mask
+                while new_data[_HEADER.size + new_slot_index * _SLOT.size + _SLOT.size - 7] == _USED_SLOT:
+                    new_slot_index = (new_slot_index + 1) & new_mask
+                new_offset = _HEADER.size + new_slot_index * _SLOT.size
+                new_data[new_offset:new_offset + _SLOT.size] = slot
+            _HEADER.pack_into(new_data, 0, _MAGIC, old_capacity * 2, self.count)
+            new_data.flush()
+            new_data.close()
+        self.close()
+        os.replace(new_path, self.path)
+        self.open()
+
+    def lookup(self, steel_plant: str, serial_number: int, heat_data_hash: int) \
+            -> Tuple[PlateLookupStatus, Union[bool, None]]:
+        slot_offset, found = self.find_slot(VerifiedPlateIndex.plate_key(steel_plant, serial_number))
+        if not found:
+            return PlateLookupStatus.NEW, None
+        _, stored_heat_data_hash, verdict, _ = _SLOT.unpack_from(self.data, slot_offset)
+        if stored_heat_data_hash != heat_data_hash:
+            return PlateLookupStatus.CONFLICT, verdict == 1
+        return PlateLookupStatus.DUPLICATE, verdict == 1
+
+    def record(self, steel_plant: str, serial_number: int, heat_data_hash: int, verdict: bool):
+        plate_key = VerifiedPlateIndex.plate_key(steel_plant, serial_number)
+        slot_offset, found = self.find_slot(plate_key)
+        if not found:
+            if self.count + 1 > self.capacity * _MAXIMUM_LOAD_FACTOR:
+                self.grow()
+                slot_offset, _ = self.find_slot(plate_key)
+            self.count += 1
+            _HEADER.pack_into(self.data, 0, _MAGIC, self.capacity, self.count)
+        _SLOT.pack_into(self.data, slot_offset, plate_key, heat_data_hash, 1 if verdict else 0, _USED_SLOT)
+
+    # ################################ Certificates ################################ #
+    def lookup_plates(self, steel_plant: str, steel_plates: List[SteelPlate]) \
+            -> List[Tuple[PlateLookupStatus, Union[bool, None]]]:
+        return [
+            self.lookup(steel_plant, steel_plate.serial_number, VerifiedPlateIndex.heat_data_hash(steel_plate))
+            for steel_plate in steel_plates
+        ]
+
+    def lookup_serial_numbers(self, steel_plant: str, serial_number: SerialNumber) -> List[bool]:
+        # Only tells whether each serial number of a certificate has been verified before, without heat data.
+        return [self.find_slot(VerifiedPlateIndex.plate_key(steel_plant, value))[1] for value in serial_number.value]
+
+    def record_plates(self, steel_plant: str, steel_plates: List[SteelPlate], verdicts: List[bool]):
+        for steel_plate, verdict in zip(steel_plates, verdicts):
+            self.record(steel_plant, steel_plate.serial_number, VerifiedPlateIndex.heat_data_hash(steel_plate), verdict)
@@ -0,0 +1,176 @@
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from certificate_element import SteelPlate
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS certificates ('
+    'id INTEGER PRIMARY KEY, pdf_path TEXT NOT NULL, steel_plant TEXT, grade TEXT, delivery_condition TEXT, '
+    'thickness REAL, verified_at REAL NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS plates ('
+    'id INTEGER PRIMARY KEY, certificate_id INTEGER NOT NULL REFERENCES certificates(id), serial_number INTEGER, '
+    'steel_plant TEXT, grade TEXT, delivery_condition TEXT, position_direction TEXT, verdict INTEGER)',
+    # the plate context is repeated on every element verdict, so the queries below need no join to be filtered
+    'CREATE TABLE IF NOT EXISTS element_verdicts ('
+    'plate_id INTEGER NOT NULL REFERENCES plates(id), steel_plant TEXT, grade TEXT, delivery_condition TEXT, '
+    'element TEXT NOT NULL, test_number INTEGER, value REAL, outcome INTEGER, message TEXT, '
+    'table_index INTEGER, x_coordinate INTEGER, y_coordinate INTEGER)',
+    'CREATE INDEX IF NOT EXISTS element_verdicts_by_plant ON element_verdicts '
+    '(steel_plant, grade, delivery_condition, element, outcome)',
+    'CREATE INDEX IF NOT EXISTS element_verdicts_by_grade ON element_verdicts (grade, element, outcome)',
+    'CREATE INDEX IF NOT EXISTS element_verdicts_by_outcome ON element_verdicts (steel_plant, outcome)',
+    'CREATE INDEX IF NOT EXISTS element_verdicts_by_plate ON element_verdicts (plate_id)',
+    'CREATE INDEX IF NOT EXISTS plates_by_certificate ON plates (certificate_id)',
+    'CREATE INDEX IF NOT EXISTS certificates_by_pdf_path ON certificates (pdf_path)'
+)
+_INSERT_CERTIFICATE = (
+    'INSERT INTO certificates (pdf_path, steel_plant, grade, delivery_condition, thickness, verified_at) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+_INSERT_PLATE = (
+    'INSERT INTO plates (certificate_id, serial_number, steel_plant, grade, delivery_condition, position_direction, '
+    'verdict) VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+_INSERT_ELEMENT_VERDICT = 'INSERT INTO element_verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+_QUERY_FIELDS = ('steel_plant', 'grade', 'delivery_condition', 'element', 'outcome')
+_MECHANICAL_FIELDS = ('yield_strength', 'tensile_strength', 'elongation', 'temperature')
+
+
+class VerificationResultStore:
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.batch_size = batch_size
+        # element verdicts waiting for the next batched transaction, their certificate and plate rows are already
+        # inserted in it
+        self.element_verdict_rows: List[tuple] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    @staticmethod
+    def outcome(certificate_element) -> Union[int, None]:
+        return None if certificate_element.message is None else int(bool(certificate_element.valid_flag))
+
+    @staticmethod
+    def element_rows(plate_id: int, context: Tuple[str, str, str], steel_plate: SteelPlate) -> Iterator[tuple]:
+        # Elements the verification has not checked hold no message, their values are kept with a NULL outcome.
+        for element, chemical_element_value in steel_plate.chemical_compositions.items():
+            value = None if chemical_element_value.value is None else chemical_element_value.calculated_value()
+            yield (plate_id, *context, element, None, value,
+                   VerificationResultStore.outcome(chemical_element_value),
+                   None if chemical_element_value.message is None else str(chemical_element_value.message),
+                   chemical_element_value.table_index, chemical_element_value.x_coordinate,
+                   chemical_element_value.y_coordinate)
+        for field in _MECHANICAL_FIELDS:
+            certificate_element = getattr(steel_plate, field)
+            if certificate_element is not None:
+                yield (plate_id, *context, field, None, certificate_element.value,
+                       VerificationResultStore.outcome(certificate_element),
+                       None if certificate_element.message is None else str(certificate_element.message),
+                       certificate_element.table_index, certificate_element.x_coordinate,
+                       certificate_element.y_coordinate)
+        for impact_energy in steel_plate.impact_energy_list:
+            yield (plate_id, *context, 'impact_energy', impact_energy.test_number, impact_energy.value,
+                   VerificationResultStore.outcome(impact_energy),
+                   None if impact_energy.message is None else str(impact_energy.message),
+                   impact_energy.table_index, impact_energy.x_coordinate, impact_energy.y_coordinate)
+
+    def add_certificate(
+        self,
+        pdf_path: str,
+        steel_plant: str,
+        grade: str,
+        delivery_condition: str,
+        thickness: Union[float, int],
+        steel_plates: List[SteelPlate],
+        verdicts: List[bool]
+    ) -> int:
+        # The certificate and plate rows are inserted right away, so SQLite assigns their ids, the element verdicts
+        # are buffered. Both are committed batch_size element verdicts at a time.
+        if len(steel_plates) != len(verdicts):
+            raise ValueError(
+                f"Could not store the results of {pdf_path}, it has {len(steel_plates)} plates, but "
+                f"{len(verdicts)} verdicts."
+            )
+        certificate_id = self.connection.execute(
+            _INSERT_CERTIFICATE, (pdf_path, steel_plant, grade, delivery_condition, thickness, time.time())
+        ).lastrowid
+        for steel_plate, verdict in zip(steel_plates, verdicts):
+            plate_delivery_condition = delivery_condition if steel_plate.delivery_condition is None \
+                else steel_plate.delivery_condition.value
+            position_direction = None if steel_plate.position_direction_impact is None \
+                else steel_plate.position_direction_impact.value
+            plate_id = self.connection.execute(_INSERT_PLATE, (
+                certificate_id, steel_plate.serial_number, steel_plant, grade, plate_delivery_condition,
+                position_direction, int(verdict))
+            ).lastrowid
+            self.element_verdict_rows.extend(VerificationResultStore.element_rows(
+                plate_id, (steel_plant, grade, plate_delivery_condition), steel_plate))
+        if len(self.element_verdict_rows) >= self.batch_size:
+            self.flush()
+        return certificate_id
+
+    def flush(self):
+        if not self.connection.in_transaction:
+            return
+        # one transaction per batch, executemany reuses the prepared statement for every row
+        with self.connection:
+            self.connection.executemany(_INSERT_ELEMENT_VERDICT, self.element_verdict_rows)
+        self.element_verdict_rows = []
+
+    # ################################ Queries ################################ #
+    @staticmethod
+    def where_clause(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        for field in filters:
+            if field not in _QUERY_FIELDS:
+                raise ValueError(f"Could not filter verification results by {field}, valid fields are {_QUERY_FIELDS}.")
+        if not filters:
+            return '', []
+        clause = ' WHERE ' + ' AND '.join(f'element_verdicts.{field} = ?' for field in filters)
+        return clause, [int(value) if field == 'outcome' else value for field, value in filters.items()]
+
+    def element_verdicts(self, **filters) -> List[Dict[str, Any]]:
+        # e.g. element_verdicts(grade='VL E36', element='Nb', outcome=False)
+        self.flush()
+        clause, parameters = VerificationResultStore.where_clause(filters)
+        cursor = self.connection.execute(
+            'SELECT certificates.pdf_path, plates.serial_number, element_verdicts.* FROM element_verdicts '
+            'JOIN plates ON plates.id = element_verdicts.plate_id '
+            'JOIN certificates ON certificates.id = plates.certificate_id' + clause,
+            parameters
+        )
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def plates(self, **filters) -> List[Tuple[str, int]]:
+        # (pdf path, serial number) of the plates having at least one element verdict matching the filters
+        self.flush()
+        clause, parameters = VerificationResultStore.where_clause(filters)
+        return self.connection.execute(
+            'SELECT DISTINCT certificates.pdf_path, plates.serial_number FROM plates '
+            'JOIN certificates ON certificates.id = plates.certificate_id '
+            'WHERE plates.id IN (SELECT plate_id FROM element_verdicts' + clause + ') '
+            'ORDER BY certificates.pdf_path, plates.serial_number',
+            parameters
+        ).fetchall()
+
+    def count(self, **filters) -> int:
+        self.flush()
+        clause, parameters = VerificationResultStore.where_clause(filters)
+        return self.connection.execute('SELECT COUNT(*) FROM element_verdicts' + clause, parameters).fetchone()[0]
@@ -0,0 +1,333 @@
+import math
+import mmap
+import struct
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Tuple, Union
+
+from certificate_verification import LimitType, Direction, ChemicalCompositionLimitsForHighStrengthSteel, \
+    HullStructureSteelPlateLimits, MechanicalLimits, ImpactEnergyLimits
+
+
+# Flat binary layout (little endian, no padding):
+#   header | string directory | string bytes | chemical records | alternative chemical records | fine grain records |
+#   mechanical records | steel plant alias records
+# Every name (grade, element, steel plant, delivery condition) is stored once in the string section and referenced
+# by its index from the fixed width records.
+_MAGIC = b'CMCLIM02'
+_HEADER = struct.Struct('<8s14I')
+_STRING_ENTRY = struct.Struct('<IH')  # offset into the string bytes, length
+_CHEMICAL_RECORD = struct.Struct('<HHBBdd')  # grade, element, limit type, mandatory, minimum, maximum
+# grade, element, thickness maximum, required element, limit type, mandatory, minimum, maximum
+_ALTERNATIVE_CHEMICAL_RECORD = struct.Struct('<HHdHBBdd')
+_FINE_GRAIN_RECORD = struct.Struct('<HHHB4Hd')  # plant, grade, delivery condition, element count, elements, thickness
+_MECHANICAL_RECORD = struct.Struct('<H5i6i')  # grade, yield, tensile min/max, elongation, temperature, impact minima
+_ALIAS_RECORD = struct.Struct('<HH')  # normalised steel plant name, registered steel plant name
+
+_MISSING = -2 ** 31
+_NO_ELEMENT = 0xFFFF
+_MAX_FINE_GRAIN_ELEMENTS = 4
+_THICKNESS_RANGES = ((0, 50), (50, 70), (70, 150))
+_DIRECTIONS = (Direction.TRANSVERSE, Direction.LONGITUDINAL)
+
+
+class SharedLimitTables:
+
+    def __init__(self, buffer, owner=None):
+        # buffer is a bytes / mmap / shared memory buffer, it is never copied.
+        self.buffer = memoryview(buffer)
+        self.owner = owner
+        (magic, string_directory_offset, string_count, string_bytes_offset, chemical_offset, chemical_count,
+         alternative_offset, alternative_count, fine_grain_offset, fine_grain_count, mechanical_offset,
+         mechanical_count, alias_offset, alias_count, _) = _HEADER.unpack_from(self.buffer, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"The buffer does not contain compiled limit tables, magic is {magic}.")
+        # Only the small name directory is materialised per process, all limit data is read from the buffer.
+        self.names: List[str] = []
+        for index in range(string_count):
+            offset, length = _STRING_ENTRY.unpack_from(
+                self.buffer, string_directory_offset + index * _STRING_ENTRY.size)
+            start = string_bytes_offset + offset
+            self.names.append(bytes(self.buffer[start:start + length]).decode('utf-8'))
+        self.name_ids: Dict[str, int] = {name: index for index, name in enumerate(self.names)}
+        self.chemical_index: Dict[Tuple[int, int], int] = dict()
+        for index in range(chemical_count):
+            record_offset = chemical_offset + index * _CHEMICAL_RECORD.size
+            grade_id, element_id = struct.unpack_from('<HH', self.buffer, record_offset)
+            self.chemical_index[(grade_id, element_id)] = record_offset
+        # (grade, element) -> alternative records, in the order they are tried
+        self.alternative_index: Dict[Tuple[int, int], List[int]] = dict()
+        for index in range(alternative_count):
+            record_offset = alternative_offset + index * _ALTERNATIVE_CHEMICAL_RECORD.size
+            key = struct.unpack_from('<HH', self.buffer, record_offset)
+            self.alternative_index.setdefault(key, []).append(record_offset)
+        self.fine_grain_index: Dict[Tuple[int, int, int], List[int]] = dict()
+        for index in range(fine_grain_count):
+            record_offset = fine_grain_offset + index * _FINE_GRAIN_RECORD.size
+            key = struct.unpack_from('<HHH', self.buffer, record_offset)
+            self.fine_grain_index.setdefault(key, []).append(record_offset)
+        self.mechanical_index: Dict[int, int] = dict()
+        for index in range(mechanical_count):
+            record_offset = mechanical_offset + index * _MECHANICAL_RECORD.size
+            self.mechanical_index[struct.unpack_from('<H', self.buffer, record_offset)[0]] = record_offset
+        # normalised steel plant name -> registered steel plant name, see HullStructureSteelPlateLimits
+        self.steel_plant_aliases: Dict[str, str] = dict()
+        for index in range(alias_count):
+            normalised_id, steel_plant_id = _ALIAS_RECORD.unpack_from(
+                self.buffer, alias_offset + index * _ALIAS_RECORD.size)
+            self.steel_plant_aliases[self.names[normalised_id]] = self.names[steel_plant_id]
+
+    # ################################ Compilation ################################ #
+    @staticmethod
+    def compile() -> bytes:
+        names: Dict[str, int] = dict()
+
+        def name_id(name: str) -> int:
+            if name not in names:
+                names[name] = len(names)
+            return names[name]
+
+        chemical_records = []
+        chemical_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        for grade, element_limit_map in chemical_limits.grade_chemical_element_normal_limit_map.items():
+            for element, limit in element_limit_map.items():
+                chemical_records.append(_CHEMICAL_RECORD.pack(
+                    name_id(grade),
+                    name_id(element),
+                    limit.limit_type.value,
+                    1 if limit.is_mandatory() else 0,
+                    limit.minimum if limit.minimum is not None else float('nan'),
+                    limit.maximum if limit.maximum is not None else float('nan')
+                ))
+
+        alternative_records = []
+        for grade, element_alternative_limits in chemical_limits.grade_chemical_element_alternative_limit_map.items():
+            for element, alternative_limits in element_alternative_limits.items():
+                for alternative_limit in alternative_limits:
+                    limit = alternative_limit.limit
+                    alternative_records.append(_ALTERNATIVE_CHEMICAL_RECORD.pack(
+                        name_id(grade),
+                        name_id(element),
+                        float('nan') if alternative_limit.thickness_maximum is None
+                        else alternative_limit.thickness_maximum,
+                        _NO_ELEMENT if alternative_limit.required_element is None
+                        else name_id(alternative_limit.required_element),
+                        limit.limit_type.value,
+                        1 if limit.is_mandatory() else 0,
+                        limit.minimum if limit.minimum is not None else float('nan'),
+                        limit.maximum if limit.maximum is not None else float('nan')
+                    ))
+
+        fine_grain_records = []
+        steel_plate_limits = HullStructureSteelPlateLimits.get_singleton()
+        for steel_plant, plant_limits in steel_plate_limits.load_all_steel_plants().items():
+            for grade, delivery_condition_map in plant_limits.limits.items():
+                for delivery_condition, combination_map in delivery_condition_map.items():
+                    for combination, steel_plate_limit in combination_map.items():
+                        if len(combination) > _MAX_FINE_GRAIN_ELEMENTS:
+                            raise ValueError(
+                                f"The fine grain combination {combination} has more than "
+                                f"{_MAX_FINE_GRAIN_ELEMENTS} elements and can not be compiled."
+                            )
+                        element_ids = [name_id(element) for element in combination]
+                        element_ids += [0] * (_MAX_FINE_GRAIN_ELEMENTS - len(element_ids))
+                        fine_grain_records.append(_FINE_GRAIN_RECORD.pack(
+                            name_id(steel_plant),
+                            name_id(grade),
+                            name_id(delivery_condition),
+                            len(combination),
+                            *element_ids,
+                            steel_plate_limit.thickness_limit.maximum
+                        ))
+
+        mechanical_records = []
+        mechanical_limits = MechanicalLimits.get_singleton()
+        for grade, mechanical_limit in mechanical_limits.grade_mechanical_limits_map.items():
+            impact_minima = []
+            for thickness_range in _THICKNESS_RANGES:
+                for direction in _DIRECTIONS:
+                    impact_energy_limit = \
+                        mechanical_limit.impact_energy_limits.thickness_direction_map[thickness_range][direction]
+                    impact_minima.append(_MISSING if impact_energy_limit is None else impact_energy_limit.minimum)
+            mechanical_records.append(_MECHANICAL_RECORD.pack(
+                name_id(grade),
+                mechanical_limit.yield_strength_limit.minimum,
+                mechanical_limit.tensile_strength_limit.minimum,
+                mechanical_limit.tensile_strength_limit.maximum,
+                mechanical_limit.elongation_limit.minimum,
+                mechanical_limit.temperature_limit.unique_value,
+                *impact_minima
+            ))
+
+        alias_records = [
+            _ALIAS_RECORD.pack(name_id(normalised_name), name_id(steel_plant))
+            for normalised_name, steel_plant in steel_plate_limits.normalised_steel_plant_index.items()
+        ]
+
+        encoded_names = [name.encode('utf-8') for name in names]
+        string_directory = bytearray()
+        string_bytes = bytearray()
+        for encoded_name in encoded_names:
+            string_directory += _STRING_ENTRY.pack(len(string_bytes), len(encoded_name))
+            string_bytes += encoded_name
+
+        string_directory_offset = _HEADER.size
+        string_bytes_offset = string_directory_offset + len(string_directory)
+        chemical_offset = string_bytes_offset + len(string_bytes)
+        alternative_offset = chemical_offset + len(chemical_records) * _CHEMICAL_RECORD.size
+        fine_grain_offset = alternative_offset + len(alternative_records) * _ALTERNATIVE_CHEMICAL_RECORD.size
+        mechanical_offset = fine_grain_offset + len(fine_grain_records) * _FINE_GRAIN_RECORD.size
+        alias_offset = mechanical_offset + len(mechanical_records) * _MECHANICAL_RECORD.size
+        total_size = alias_offset + len(alias_records) * _ALIAS_RECORD.size
+        header = _HEADER.pack(
+            _MAGIC,
+            string_directory_offset, len(encoded_names), string_bytes_offset,
+            chemical_offset, len(chemical_records),
+            alternative_offset, len(alternative_records),
+            fine_grain_offset, len(fine_grain_records),
+            mechanical_offset, len(mechanical_records),
+            alias_offset, len(alias_records),
+            total_size
+        )
+        return b''.join([header, string_directory, string_bytes] + chemical_records + alternative_records +
+                        fine_grain_records + mechanical_records + alias_records)
+
+    # ################################ Shared memory / mmap ################################ #
+    @classmethod
+    def create_shared_memory(cls, name: str = None) -> 'SharedLimitTables':
+        data = cls.compile()
+        segment = shared_memory.SharedMemory(name=name, create=True, size=len(data))
+        segment.buf[:len(data)] = data
+        return cls(segment.buf[:len(data)], owner=segment)
+
+    @classmethod
+    def attach_shared_memory(cls, name: str) -> 'SharedLimitTables':
+        segment = shared_memory.SharedMemory(name=name)
+        total_size = _HEADER.unpack_from(segment.buf, 0)[-1]
+        return cls(segment.buf[:total_size], owner=segment)
+
+    @classmethod
+    def write_file(cls, path: str):
+        with open(path, 'wb') as file:
+            file.write(cls.compile())
+
+    @classmethod
+    def open_file(cls, path: str) -> 'SharedLimitTables':
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, owner=mapped)
+
+    @property
+    def shared_memory_name(self) -> Union[str, None]:
+        if isinstance(self.owner, shared_memory.SharedMemory):
+            return self.owner.name
+        return None
+
+    def close(self):
+        self.buffer.release()
+        if self.owner is not None:
+            self.owner.close()
+
+    def unlink(self):
+        if isinstance(self.owner, shared_memory.SharedMemory):
+            self.owner.unlink()
+
+    # ################################ Lookups ################################ #
+    def get_chemical_limit(
+        self,
+        grade: str,
+        chemical_element: str
+    ) -> Union[Tuple[LimitType, float, float, bool], None]:
+        record_offset = self.chemical_index.get((self.name_ids.get(grade), self.name_ids.get(chemical_element)))
+        if record_offset is None:
+            return None
+        _, _, limit_type, mandatory, minimum, maximum = _CHEMICAL_RECORD.unpack_from(self.buffer, record_offset)
+        return LimitType(limit_type), minimum, maximum, mandatory == 1
+
+    def get_alternative_chemical_limit(
+        self,
+        grade: str,
+        chemical_element: str,
+        thickness: Union[float, int] = None,
+        chemical_elements: Iterable[str] = ()
+    ) -> Union[Tuple[LimitType, float, float, bool], None]:
+        # The first alternative whose thickness maximum and required element are met, as find_alternative_limit.
+        for record_offset in self.alternative_index.get(
+                (self.name_ids.get(grade), self.name_ids.get(chemical_element)), []):
+            _, _, thickness_maximum, required_element_id, limit_type, mandatory, minimum, maximum = \
+                _ALTERNATIVE_CHEMICAL_RECORD.unpack_from(self.buffer, record_offset)
+            if not math.isnan(thickness_maximum) and (thickness is None or thickness > thickness_maximum):
+                continue
+            if required_element_id != _NO_ELEMENT and self.names[required_element_id] not in chemical_elements:
+                continue
+            return LimitType(limit_type), minimum, maximum, mandatory == 1
+        return None
+
+    @staticmethod
+    def check_limit(limit: Tuple[LimitType, float, float, bool], value: float) -> bool:
+        limit_type, minimum, maximum, _ = limit
+        if limit_type == LimitType.MAXIMUM:
+            return value <= maximum
+        elif limit_type == LimitType.MINIMUM:
+            return value >= minimum
+        else:
+            return minimum <= value <= maximum
+
+    def verify_chemical_element(self, grade: str, chemical_element: str, value: float,
+                                thickness: Union[float, int] = None, chemical_elements: Iterable[str] = ()) -> bool:
+        # A value violating the normal limit is checked against the alternative limit for the plate thickness and
+        # the elements the plate reports, the same as the chemical composition verification does.
+        limit = self.get_chemical_limit(grade=grade, chemical_element=chemical_element)
+        if limit is None:
+            raise ValueError(
+                f"Could not find chemical composition limit for grade {grade} and chemical element {chemical_element}."
+            )
+        if SharedLimitTables.check_limit(limit, value):
+            return True
+        alternative_limit = self.get_alternative_chemical_limit(grade, chemical_element, thickness, chemical_elements)
+        return alternative_limit is not None and SharedLimitTables.check_limit(alternative_limit, value)
+
+    def resolve_steel_plant(self, steel_plant: str) -> Union[str, None]:
+        # registered names and aliases are all indexed by their normalised name
+        return self.steel_plant_aliases.get(HullStructureSteelPlateLimits.normalise_steel_plant_name(steel_plant))
+
+    def get_fine_grain_combinations(
+        self,
+        steel_plant: str,
+        grade: str,
+        delivery_condition: str
+    ) -> List[Tuple[Tuple[str, ...], float]]:
+        steel_plant = self.resolve_steel_plant(steel_plant)
+        key = (self.name_ids.get(steel_plant), self.name_ids.get(grade), self.name_ids.get(delivery_condition))
+        combinations = []
+        for record_offset in self.fine_grain_index.get(key, []):
+            record = _FINE_GRAIN_RECORD.unpack_from(self.buffer, record_offset)
+            element_count = record[3]
+            combination = tuple(self.names[element_id] for element_id in record[4:4 + element_count])
+            combinations.append((combination, record[-1]))
+        return combinations
+
+    def get_mechanical_limits(self, grade: str) -> Dict[str, int]:
+        record_offset = self.mechanical_index.get(self.name_ids.get(grade))
+        if record_offset is None:
+            raise ValueError(f"Could not find mechanical limits for grade {grade}.")
+        record = _MECHANICAL_RECORD.unpack_from(self.buffer, record_offset)
+        return {
+            'yield_strength_minimum': record[1],
+            'tensile_strength_minimum': record[2],
+            'tensile_strength_maximum': record[3],
+            'elongation_minimum': record[4],
+            'temperature': record[5]
+        }
+
+    def get_impact_energy_minimum(self, grade: str, thickness: Union[float, int], direction: Direction) -> int:
+        record_offset = self.mechanical_index.get(self.name_ids.get(grade))
+        if record_offset is None:
+            raise ValueError(f"Could not find mechanical limits for grade {grade}.")
+        band = _THICKNESS_RANGES.index(ImpactEnergyLimits.get_thickness_range(thickness))
+        field_index = 6 + band * len(_DIRECTIONS) + _DIRECTIONS.index(direction)
+        minimum = _MECHANICAL_RECORD.unpack_from(self.buffer, record_offset)[field_index]
+        if minimum == _MISSING:
+            raise ValueError(
+                f"Could not impact energy limit for thickness {thickness}, direction {direction}."
+            )
+        return minimum
@@ -0,0 +1,286 @@
+from bisect import bisect_left
+from typing import Dict, List, Tuple, Union
+
+from certificate_element import SteelPlate
+from certificate_verification import LimitType, ChemicalCompositionLimitsForHighStrengthSteel, MechanicalLimits
+from common_utils import CommonUtils
+
+# (steel plant, grade, delivery condition, element)
+StatisticsKey = Tuple[str, str, str, str]
+_KEY_FIELDS = ('steel_plant', 'grade', 'delivery_condition', 'element')
+
+
+class QuantileSketch:
+
+    def __init__(self, compression: int = 100):
+        # Merging t-digest: the number of centroids grows with the compression and only logarithmically with the
+        # number of values.
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.buffer: List[Tuple[float, float]] = []
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value: float, weight: float = 1):
+        self.buffer.append((value, weight))
+        self.count += weight
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if len(self.buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.count == 0:
+            return
+        self.buffer.extend(zip(other.means, other.weights))
+        self.buffer.extend(other.buffer)
+        self.count += other.count
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.compress()
+
+    def compress(self):
+        if not self.buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self.buffer)
+        total = self.count
+        means, weights = [], []
+        cumulative = 0
+        current_mean, current_weight = points[0]
+        for mean, weight in points[1:]:
+            quantile = (cumulative + current_weight + weight) / total
+            # centroids near the tails stay small, so extreme quantiles remain accurate
+            if current_weight + weight <= max(1.0, 4 * total * quantile * (1 - quantile) / self.compression):
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                means.append(current_mean)
+                weights.append(current_weight)
+                cumulative += current_weight
+                current_mean, current_weight = mean, weight
+        means.append(current_mean)
+        weights.append(current_weight)
+        self.means, self.weights, self.buffer = means, weights, []
+
+    def quantile(self, quantile: float) -> Union[float, None]:
+        if not 0 <= quantile <= 1:
+            raise ValueError(f"The quantile {quantile} is out of the range 0 - 1.")
+        self.compress()
+        if self.count == 0:
+            return None
+        # centroid i is taken to be centred at the cumulative weight before it plus half its own weight
+        target = quantile * self.count
+        centres = []
+        cumulative = 0
+        for weight in self.weights:
+            centres.append(cumulative + weight / 2)
+            cumulative += weight
+        index = bisect_left(centres, target)
+        if index == 0:
+            if centres[0] == 0:
+                return self.means[0]
+            return self.minimum + (self.means[0] - self.minimum) * target / centres[0]
+        if index == len(centres):
+            tail = self.count - centres[-1]
+            if tail == 0:
+                return self.means[-1]
+            return self.means[-1] + (self.maximum - self.means[-1]) * (target - centres[-1]) / tail
+        fraction = (target - centres[index - 1]) / (centres[index] - centres[index - 1])
+        return self.means[index - 1] + (self.means[index] - self.means[index - 1]) * fraction
+
+
+class StreamingStatistics:
+
+    def __init__(self, compression: int = 100):
+        self.count = 0
+        self.failure_count = 0
+        # margins are positive inside the limit and negative outside, in the unit of the limit
+        self.margin_minimum = None
+        self.margin_maximum = None
+        self.margin_mean = 0.0
+        self.margin_sketch = QuantileSketch(compression)
+
+    def __repr__(self):
+        return (
+            f"StreamingStatistics: count: {self.count}, failure_rate: {self.failure_rate():.4f}, "
+            f"margin: [{self.margin_minimum}, {self.margin_maximum}] mean {self.margin_mean:.4f}"
+        )
+
+    def add(self, outcome: bool, margin: Union[float, None]):
+        self.count += 1
+        if not outcome:
+            self.failure_count += 1
+        if margin is None:
+            return
+        self.margin_minimum = margin if self.margin_minimum is None else min(self.margin_minimum, margin)
+        self.margin_maximum = margin if self.margin_maximum is None else max(self.margin_maximum, margin)
+        self.margin_sketch.add(margin)
+        self.margin_mean += (margin - self.margin_mean) / self.margin_sketch.count
+
+    def merge(self, other: 'StreamingStatistics'):
+        margin_count = self.margin_sketch.count + other.margin_sketch.count
+        if margin_count > 0:
+            self.margin_mean = (self.margin_mean * self.margin_sketch.count
+                                + other.margin_mean * other.margin_sketch.count) / margin_count
+        self.count += other.count
+        self.failure_count += other.failure_count
+        for margin in (other.margin_minimum, other.margin_maximum):
+            if margin is not None:
+                self.margin_minimum = margin if self.margin_minimum is None else min(self.margin_minimum, margin)
+                self.margin_maximum = margin if self.margin_maximum is None else max(self.margin_maximum, margin)
+        self.margin_sketch.merge(other.margin_sketch)
+
+    def failure_rate(self) -> float:
+        return self.failure_count / self.count if self.count else 0.0
+
+    def summary(self, quantiles: Tuple[float, ...] = (0.05, 0.5, 0.95)) -> Dict[str, Union[int, float, None]]:
+        summary = {
+            'count': self.count,
+            'failure_count': self.failure_count,
+            'failure_rate': self.failure_rate(),
+            'margin_minimum': self.margin_minimum,
+            'margin_maximum': self.margin_maximum,
+            'margin_mean': self.margin_mean if self.margin_sketch.count else None
+        }
+        for quantile in quantiles:
+            summary[f"margin_p{quantile * 100:g}"] = self.margin_sketch.quantile(quantile)
+        return summary
+
+
+class VerdictStatistics:
+
+    # ################################ Singleton ################################ #
+    _singleton = None
+
+    @classmethod
+    def get_singleton(cls):
+        if not isinstance(cls._singleton, cls):
+            cls._singleton = cls()
+        return cls._singleton
+    # ################################ Singleton ################################ #
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.statistics: Dict[StatisticsKey, StreamingStatistics] = dict()
+        # plates whose impact energies could not be matched to a limit, e.g. an invalid position direction
+        self.skipped_impact_plate_count = 0
+
+    @staticmethod
+    def margin_to_limit(limit, value: Union[int, float]) -> Union[float, None]:
+        # Distance to the closest threshold of the limit, negative when the value violates it.
+        if value is None:
+            return None
+        if limit.limit_type == LimitType.MAXIMUM:
+            return limit.maximum - value
+        elif limit.limit_type == LimitType.MINIMUM:
+            return value - limit.minimum
+        elif limit.limit_type == LimitType.RANGE:
+            return min(value - limit.minimum, limit.maximum - value)
+        else:
+            return -abs(value - limit.unique_value)
+
+    def record(self, steel_plant: str, grade: str, delivery_condition: str, element: str, limit,
+               value: Union[int, float, None], outcome: bool):
+        key = (steel_plant, grade, delivery_condition, element)
+        statistics = self.statistics.get(key)
+        if statistics is None:
+            statistics = self.statistics[key] = StreamingStatistics(self.compression)
+        statistics.add(outcome, None if limit is None else VerdictStatistics.margin_to_limit(limit, value))
+
+    def record_chemical_compositions(self, steel_plant: str, grade: str, delivery_condition: str,
+                                     thickness: Union[float, int], steel_plate: SteelPlate):
+        chemical_composition_limits = ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()
+        grade_limits = chemical_composition_limits.grade_chemical_element_normal_limit_map.get(grade, dict())
+        for element, chemical_element_value in steel_plate.chemical_compositions.items():
+            limit = grade_limits.get(element)
+            # elements the verification has not checked, or has reset, hold no message and no verdict
+            if limit is None or chemical_element_value.message is None:
+                continue
+            if chemical_element_value.value is None:
+                # the element is missing on the certificate, there is no margin
+                self.record(steel_plant, grade, delivery_condition, element, None, None,
+                            chemical_element_value.is_valid())
+                continue
+            value = chemical_element_value.calculated_value()
+            # the margin is measured to the limit the verification has applied, i.e. the alternative limit when the
+            # normal one is violated and an alternative exists
+            if not limit.verify_compact(value)[0]:
+                alternative_limit = chemical_composition_limits.find_alternative_limit(
+                    specification=grade,
+                    chemical_element=element,
+                    thickness=thickness,
+                    chemical_compositions=steel_plate.chemical_compositions
+                )
+                if alternative_limit is not None:
+                    limit = alternative_limit
+            self.record(steel_plant, grade, delivery_condition, element, limit, value,
+                        chemical_element_value.is_valid())
+
+    def record_mechanical_properties(self, steel_plant: str, grade: str, delivery_condition: str,
+                                     thickness: Union[float, int], steel_plate: SteelPlate):
+        mechanical_limit = MechanicalLimits.get_singleton().grade_mechanical_limits_map.get(grade)
+        if mechanical_limit is None:
+            return
+        for element, certificate_element, limit in (
+            ('yield_strength', steel_plate.yield_strength, mechanical_limit.yield_strength_limit),
+            ('tensile_strength', steel_plate.tensile_strength, mechanical_limit.tensile_strength_limit),
+            ('elongation', steel_plate.elongation, mechanical_limit.elongation_limit),
+            ('temperature', steel_plate.temperature, mechanical_limit.temperature_limit)
+        ):
+            if certificate_element is not None and certificate_element.message is not None and limit is not None:
+                self.record(steel_plant, grade, delivery_condition, element, limit, certificate_element.value,
+                            bool(certificate_element.valid_flag))
+        if steel_plate.position_direction_impact is None or mechanical_limit.impact_energy_limits is None:
+            return
+        try:
+            direction = CommonUtils.translate_to_vl_direction(steel_plate.position_direction_impact.value)
+            impact_energy_limit = mechanical_limit.impact_energy_limits.get_limit(
+                thickness=thickness, direction=direction)
+        except ValueError:
+            self.skipped_impact_plate_count += 1
+            return
+        for impact_energy in steel_plate.impact_energy_list:
+            if impact_energy.message is None:
+                continue
+            self.record(steel_plant, grade, delivery_condition, 'impact_energy', impact_energy_limit,
+                        impact_energy.value, bool(impact_energy.valid_flag))
+
+    def record_plates(self, steel_plant: str, grade: str, delivery_condition: str, thickness: Union[float, int],
+                      steel_plates: List[SteelPlate]):
+        # Consumes the plates of a certificate once they have been verified, the verdicts are read from their elements.
+        for steel_plate in steel_plates:
+            plate_delivery_condition = delivery_condition if steel_plate.delivery_condition is None \
+                else steel_plate.delivery_condition.value
+            self.record_chemical_compositions(steel_plant, grade, plate_delivery_condition, thickness, steel_plate)
+            self.record_mechanical_properties(steel_plant, grade, plate_delivery_condition, thickness, steel_plate)
+
+    # ################################ Queries ################################ #
+    def query(self, **filters: str) -> StreamingStatistics:
+        # e.g. query(steel_plant='BAOSHAN', element='Nb'), only the aggregated statistics are merged
+        for field in filters:
+            if field not in _KEY_FIELDS:
+                raise ValueError(f"Could not filter verdict statistics by {field}, valid fields are {_KEY_FIELDS}.")
+        merged = StreamingStatistics(self.compression)
+        for key, statistics in self.statistics.items():
+            if all(key[_KEY_FIELDS.index(field)] == value for field, value in filters.items()):
+                merged.merge(statistics)
+        return merged
+
+    def group_by(self, *fields: str, **filters: str) -> Dict[Tuple[str, ...], StreamingStatistics]:
+        # e.g. group_by('steel_plant', 'grade') gives the pass rates per plant and grade
+        for field in fields + tuple(filters):
+            if field not in _KEY_FIELDS:
+                raise ValueError(f"Could not group verdict statistics by {field}, valid fields are {_KEY_FIELDS}.")
+        field_indexes = [_KEY_FIELDS.index(field) for field in fields]
+        groups: Dict[Tuple[str, ...], StreamingStatistics] = dict()
+        for key, statistics in self.statistics.items():
+            if not all(key[_KEY_FIELDS.index(field)] == value for field, value in filters.items()):
+                continue
+            group_key = tuple(key[field_index] for field_index in field_indexes)
+            group = groups.get(group_key)
+            if group is None:
+                group = groups[group_key] = StreamingStatistics(self.compression)
+            group.merge(statistics)
+        return groups
@@ -0,0 +1,218 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from enum import Enum, unique
+from typing import Any, Dict, List, Union
+
+
+@unique
+class QueueFullPolicy(Enum):
+    DROP = 1  # discard the new record and count it as dropped, the verification never waits
+    BLOCK = 2  # wait until the writer thread has made room in the queue
+
+
+# limit attributes that only serve the message rendering, they are left out of the audit payload
+_UNDESCRIBED_LIMIT_ATTRIBUTES = ('pass_template_id', 'fail_template_id')
+# queued by close, the writer thread stops once it has written every record queued before it
+_STOP = object()
+
+
+class AuditRecord:
+
+    __slots__ = ('timestamp', 'pdf_path', 'serial_number', 'element', 'limit', 'outcome', 'message')
+
+    def __init__(self, pdf_path: Union[str, None], serial_number: Union[int, None], element: str, limit,
+                 outcome: bool, message: str):
+        self.timestamp = time.time()
+        self.pdf_path = pdf_path
+        self.serial_number = serial_number
+        self.element = element
+        self.limit = limit
+        self.outcome = outcome
+        self.message = message
+
+    def __repr__(self):
+        return (
+            f"AuditRecord: {self.element} [pdf_path: {self.pdf_path}, serial_number: {self.serial_number}, "
+            f"outcome: {'PASS' if self.outcome else 'FAIL'}]"
+        )
+
+    @staticmethod
+    def describe_limit(limit) -> Union[Dict[str, Any], None]:
+        if limit is None:
+            return None
+        description = {'type': type(limit).__name__}
+        for attribute, value in vars(limit).items():
+            if attribute in _UNDESCRIBED_LIMIT_ATTRIBUTES:
+                continue
+            description[attribute] = value.name if isinstance(value, Enum) else value
+        return description
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'timestamp': self.timestamp,
+            'pdf_path': self.pdf_path,
+            'serial_number': self.serial_number,
+            'element': self.element,
+            'limit': self.describe_limit(self.limit),
+            'outcome': 'PASS' if self.outcome else 'FAIL',
+            'message': None if self.message is None else str(self.message)
+        }
+
+
+class VerificationAuditLog:
+
+    # ################################ Active audit log ################################ #
+    _active = None
+
+    @classmethod
+    def install(cls, audit_log: Union['VerificationAuditLog', None]):
+        cls._active = audit_log
+
+    @classmethod
+    def get_active(cls) -> Union['VerificationAuditLog', None]:
+        return cls._active
+
+    @classmethod
+    def submit(cls, pdf_path: Union[str, None], serial_number: Union[int, None], element: str, limit,
+               outcome: bool, message: str):
+        # Called from the verify hot paths, it is a no-op unless an audit log has been installed.
+        audit_log = cls._active
+        if audit_log is not None:
+            audit_log.record(AuditRecord(pdf_path, serial_number, element, limit, outcome, message))
+
+    @classmethod
+    def echo(cls, message):
+        # The per check messages are printed unless an audit log keeps them, printing blocks the verification on
+        # terminal or pipe I/O.
+        if cls._active is None:
+            print(message)
+    # ################################ Active audit log ################################ #
+
+    def __init__(
+        self,
+        directory: str,
+        file_prefix: str = 'verification_audit',
+        max_records_per_file: int = 100000,
+        max_queue_size: int = 10000,
+        policy: QueueFullPolicy = QueueFullPolicy.BLOCK,
+        batch_size: int = 500
+    ):
+        self.directory = directory
+        self.file_prefix = file_prefix
+        self.max_records_per_file = max_records_per_file
+        self.policy = policy
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        # the verification threads drop records concurrently
+        self.dropped_count = 0
+        self.dropped_count_lock = threading.Lock()
+        self.written_count = 0
+        # records of batches the writer thread could not write, the last error is kept for the caller
+        self.failed_count = 0
+        self.last_error: Union[Exception, None] = None
+        # file names are unique across processes and audit logs sharing the directory
+        self.file_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self.file_paths: List[str] = []
+        self.current_file = None
+        self.current_file_record_count = 0
+        self.writer_thread = threading.Thread(target=self.run, name='verification-audit-writer', daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self.writer_thread.start()
+
+    def __enter__(self):
+        VerificationAuditLog.install(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def record(self, audit_record: AuditRecord):
+        if self.policy == QueueFullPolicy.BLOCK:
+            self.queue.put(audit_record)
+        else:
+            try:
+                self.queue.put_nowait(audit_record)
+            except queue.Full:
+                with self.dropped_count_lock:
+                    self.dropped_count += 1
+
+    def rotate(self):
+        # gzip and json are only needed once an audit log writes, not when the verification modules are imported
+        import gzip
+        if self.current_file is not None:
+            self.current_file.close()
+        file_path = os.path.join(
+            self.directory,
+            f"{self.file_prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{self.file_id}-{len(self.file_paths):05d}.jsonl.gz"
+        )
+        # exclusive creation, an existing audit file is never overwritten
+        self.current_file = gzip.open(file_path, 'xt', encoding='utf-8')
+        self.current_file_record_count = 0
+        self.file_paths.append(file_path)
+
+    def write_batch(self, batch: List[AuditRecord]):
+        import json
+        written_count = 0
+        for audit_record in batch:
+            try:
+                line = json.dumps(audit_record.to_dict(), ensure_ascii=False) + '\n'
+            except (TypeError, ValueError) as error:
+                # a record that can not be serialised is counted and skipped, the rest of the batch is written
+                self.failed_count += 1
+                self.last_error = error
+                continue
+            if self.current_file is None or self.current_file_record_count >= self.max_records_per_file:
+                self.rotate()
+            self.current_file.write(line)
+            self.current_file_record_count += 1
+            written_count += 1
+        if self.current_file is not None:
+            self.current_file.flush()
+        self.written_count += written_count
+
+    def run(self):
+        stopped = False
+        while not stopped:
+            audit_record = self.queue.get()
+            if audit_record is _STOP:
+                break
+            batch = [audit_record]
+            while len(batch) < self.batch_size:
+                try:
+                    audit_record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if audit_record is _STOP:
+                    stopped = True
+                    break
+                batch.append(audit_record)
+            try:
+                self.write_batch(batch)
+            except Exception as error:
+                # the thread has to keep draining the queue, otherwise the BLOCK policy stalls the verification once
+                # the queue is full; the next batch starts a new file
+                self.failed_count += len(batch)
+                self.last_error = error
+                self.abandon_current_file()
+
+    def abandon_current_file(self):
+        if self.current_file is not None:
+            try:
+                self.current_file.close()
+            except Exception:
+                pass
+            self.current_file = None
+
+    def close(self):
+        if VerificationAuditLog.get_active() is self:
+            VerificationAuditLog.install(None)
+        # a blocking put, the stop marker must not be dropped when the queue is full
+        self.queue.put(_STOP)
+        self.writer_thread.join()
+        if self.current_file is not None:
+            self.current_file.close()
+            self.current_file = None
@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from certificate_verification import ChemicalCompositionLimitsForHighStrengthSteel, HullStructureSteelPlateLimits, \
+    MechanicalLimits
+from common_utils import CommonUtils
+from differential_verification import BoundaryCaseGenerator, DifferentialVerificationHarness
+
+# module -> cumulative import time budget in microseconds, measured in a fresh interpreter with `-X importtime`
+import_time_budgets = {
+    'certificate_element': 30000,
+    'common_utils': 40000,
+    'certificate_parsing': 60000,
+    'certificate_verification': 80000
+}
+# the table search utilities and the element models must not pull in the limit definitions
+light_modules = ('certificate_element', 'common_utils', 'certificate_parsing')
+verification_modules = ('certificate_verification', 'verification_audit', 'verification_messages')
+# every limit singleton, including the lazily loaded steel plants and their fine grain masks
+_COMPOSE_CODE = (
+    "from certificate_verification import ChemicalCompositionLimitsForHighStrengthSteel, "
+    "HullStructureSteelPlateLimits, MechanicalLimits\n"
+    "ChemicalCompositionLimitsForHighStrengthSteel.get_singleton()\n"
+    "MechanicalLimits.get_singleton()\n"
+    "for plant_limits in HullStructureSteelPlateLimits.get_singleton().load_all_steel_plants().values():\n"
+    "    for grade, delivery_condition_map in plant_limits.limits.items():\n"
+    "        for delivery_condition in delivery_condition_map:\n"
+    "            plant_limits.get_combination_masks(grade, delivery_condition)\n"
+)
+
+
+def benchmark_fine_grain_selection(plate_count: int = 100000, seed: int = 0) -> Dict[str, float]:
+    # Per plate cost of selecting the fine grain combination: the element by element loop, the bitset selection one
+    # plate at a time and for a whole certificate at once.
+    hull_structure_steel_plate_limits = HullStructureSteelPlateLimits.get_singleton()
+    cases = BoundaryCaseGenerator(seed).steel_plate_cases(plate_count)
+    plates = [
+        (hull_structure_steel_plate_limits.get_limits_by_steel_plant(case['steel_plant']), case['grade'],
+         case['delivery_condition'], DifferentialVerificationHarness.build_chemical_compositions(case))
+        for case in cases
+    ]
+    for plant_limits, grade, delivery_condition, chemical_compositions in plates:
+        plant_limits.select_limits(grade, delivery_condition, [chemical_compositions])
+    start = time.perf_counter()
+    loop_limits = [
+        DifferentialVerificationHarness.reference_select_limit(plant_limits.limits[grade][delivery_condition],
+                                                               chemical_compositions)
+        for plant_limits, grade, delivery_condition, chemical_compositions in plates
+    ]
+    loop_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    single_limits = [
+        plant_limits.select_limit(grade, delivery_condition, CommonUtils.chemical_element_mask(chemical_compositions))
+        for plant_limits, grade, delivery_condition, chemical_compositions in plates
+    ]
+    single_elapsed = time.perf_counter() - start
+    # certificates of 20 plates of the same grade and delivery condition
+    certificates: Dict[tuple, List[Dict[str, object]]] = dict()
+    for plant_limits, grade, delivery_condition, chemical_compositions in plates:
+        certificates.setdefault((plant_limits, grade, delivery_condition), []).append(chemical_compositions)
+    start = time.perf_counter()
+    for (plant_limits, grade, delivery_condition), chemical_compositions_list in certificates.items():
+        for index in range(0, len(chemical_compositions_list), 20):
+            plant_limits.select_limits(grade, delivery_condition, chemical_compositions_list[index:index + 20])
+    batch_elapsed = time.perf_counter() - start
+    if loop_limits != single_limits:
+        raise ValueError("The bitset selection does not select the same fine grain combinations as the loop.")
+    return {
+        'plates': plate_count,
+        'loop_microseconds_per_plate': loop_elapsed / plate_count * 1e6,
+        'single_microseconds_per_plate': single_elapsed / plate_count * 1e6,
+        'batch_microseconds_per_plate': batch_elapsed / plate_count * 1e6,
+        'single_speedup': loop_elapsed / single_elapsed,
+        'batch_speedup': loop_elapsed / batch_elapsed
+    }
+
+
+def benchmark_worker_startup(repeat: int = 10) -> Dict[str, float]:
+    # Worker startup: composing the limits in process, and a fresh interpreter importing the limits with and without
+    # composing them. Composing takes about 1 ms of the 70 - 90 ms of a fresh worker, within the noise of the
+    # interpreter start. A pickled snapshot of the composed limits restored in 0.94 ms against 1.05 ms composed, and
+    # was dropped for that reason.
+    compose_elapsed = 0.0
+    for _ in range(repeat):
+        for singleton_class in (ChemicalCompositionLimitsForHighStrengthSteel, HullStructureSteelPlateLimits,
+                                MechanicalLimits):
+            singleton_class._singleton = None
+        start = time.perf_counter()
+        exec(_COMPOSE_CODE, dict())
+        compose_elapsed += time.perf_counter() - start
+    package_directory = os.path.dirname(os.path.abspath(__file__))
+    process_elapsed = dict()
+    for name, code in (('import', 'import certificate_verification'), ('compose', _COMPOSE_CODE)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            subprocess.run([sys.executable, '-c', code], cwd=package_directory, check=True)
+        process_elapsed[name] = (time.perf_counter() - start) / repeat
+    return {
+        'compose_milliseconds': compose_elapsed / repeat * 1e3,
+        'import_process_milliseconds': process_elapsed['import'] * 1e3,
+        'compose_process_milliseconds': process_elapsed['compose'] * 1e3
+    }
+
+
+def measure_import_time(module_name: str, repeat: int = 3) -> Dict[str, object]:
+    # Best of several runs, together with the package modules the import has loaded.
+    package_directory = os.path.dirname(os.path.abspath(__file__))
+    package_modules = sorted(
+        file_name[:-3] for file_name in os.listdir(package_directory) if file_name.endswith('.py')
+    )
+    code = f"import sys, {module_name}; print(','.join(m for m in {package_modules!r} if m in sys.modules))"
+    best_microseconds = None
+    loaded_modules: List[str] = []
+    for _ in range(repeat):
+        completed_process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code], cwd=package_directory, capture_output=True, text=True,
+            check=True
+        )
+        for line in completed_process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module_name:
+                microseconds = int(fields[1])
+                best_microseconds = microseconds if best_microseconds is None \
+                    else min(best_microseconds, microseconds)
+        loaded_modules = completed_process.stdout.strip().split(',')
+    return {'microseconds': best_microseconds, 'loaded_modules': loaded_modules}
+
+
+def check_import_budgets(budgets: Dict[str, int] = None) -> Dict[str, int]:
+    budgets = import_time_budgets if budgets is None else budgets
+    import_times = dict()
+    for module_name, budget in budgets.items():
+        measurement = measure_import_time(module_name)
+        import_times[module_name] = measurement['microseconds']
+        if measurement['microseconds'] > budget:
+            raise ValueError(
+                f"Importing {module_name} takes {measurement['microseconds']} us, over its budget of {budget} us."
+            )
+        if module_name in light_modules:
+            loaded_verification_modules = [
+                loaded_module for loaded_module in measurement['loaded_modules']
+                if loaded_module in verification_modules
+            ]
+            if loaded_verification_modules:
+                raise ValueError(f"Importing {module_name} also loads {', '.join(loaded_verification_modules)}.")
+    return import_times
+
+
+if __name__ == '__main__':
+    print('check_import_budgets')
+    for name, value in check_import_budgets().items():
+        print(f"    {name}: {value} us")
+    for benchmark in (benchmark_fine_grain_selection, benchmark_worker_startup):
+        print(benchmark.__name__)
+        for name, value in benchmark().items():
+            print(f"    {name}: {value:.2f}" if isinstance(value, float) else f"    {name}: {value}")
@@ -0,0 +1,60 @@
+from typing import Dict, List, Union
+
+
+class MessageTemplates:
+
+    # ################################ Singleton ################################ #
+    _singleton = None
+
+    @classmethod
+    def get_singleton(cls):
+        if not isinstance(cls._singleton, cls):
+            cls._singleton = cls()
+        return cls._singleton
+    # ################################ Singleton ################################ #
+
+    def __init__(self):
+        # Identical templates share one id, e.g. alternative limits created on the fly reuse the templates of the
+        # equal limits created before them.
+        self.templates: List[str] = []
+        self.template_ids: Dict[str, int] = dict()
+
+    def register(self, template: str) -> int:
+        template_id = self.template_ids.get(template)
+        if template_id is None:
+            template_id = len(self.templates)
+            self.templates.append(template)
+            self.template_ids[template] = template_id
+        return template_id
+
+    def get_template(self, template_id: int) -> str:
+        return self.templates[template_id]
+
+    def render(self, template_id: int, value) -> str:
+        return self.templates[template_id].format(value)
+
+
+class TemplatedMessage:
+
+    # Only the template id and the verified value are stored, the text is rendered on demand.
+    __slots__ = ('template_id', 'value')
+
+    def __init__(self, template_id: int, value):
+        self.template_id = template_id
+        self.value = value
+
+    def __str__(self):
+        return MessageTemplates.get_singleton().render(self.template_id, self.value)
+
+    def __repr__(self):
+        return str(self)
+
+    def __eq__(self, other: Union['TemplatedMessage', str]):
+        if isinstance(other, TemplatedMessage):
+            return self.template_id == other.template_id and self.value == other.value
+        if isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))